@@ -0,0 +1,392 @@
+"""Асинхронные представления для самых нагруженных эндпоинтов чтения.
+
+Подключаются при ASYNC_API=True и работают поверх ASGI. GET-запросы
+обрабатываются асинхронным ORM, все остальные методы (и случаи, которые
+проще отдать DRF, например ошибки) уходят в синхронные представления.
+Кэш ответов, сериализация рецептов и валидаторы — те же, что у
+синхронных представлений (api.cache, api.flat_serializers,
+api.conditional); их синхронные функции вызываются через sync_to_async.
+"""
+import asyncio
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import Http404, HttpResponseRedirect, JsonResponse
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import ValidationError
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from recipes.models import Ingredient, Recipe, Tag
+from .cache import (
+    CATALOG_PARAMS,
+    CATALOG_VERSION_KEY,
+    RECIPE_PARAMS,
+    RECIPES_VERSION_KEY,
+    background_request,
+    cached_entry,
+    claim_entry,
+    failed_entry,
+    finish_entry,
+    finish_refresh,
+    release,
+    response_key,
+    short_link_key
+)
+from .conditional import (
+    ROW_FIELDS,
+    aget_versions,
+    cached_not_modified,
+    not_modified,
+    remember_etag,
+    set_validators,
+    validators
+)
+from .facets import (
+    afacet_counts,
+    facets_variant,
+    filter_recipes,
+    requested_facets
+)
+from .fieldsets import fields_variant, recipe_fields
+from .flat_serializers import render_recipes
+from .metrics import record_cache, record_event
+from .ranking import order_recipes
+from .throttling import throttle
+from .view_counts import count_views
+from .views import IngredientViewSet, RecipeViewSet, TagViewSet
+
+logger = logging.getLogger(__name__)
+
+JSON_DUMPS_PARAMS = {'ensure_ascii': False, 'separators': (',', ':')}
+# Фоновые обновления кэша; ссылки хранятся, чтобы задачи не собрал GC.
+refreshes = set()
+
+
+def read_path(async_view, sync_view):
+    """Отдает GET асинхронному представлению, остальное — синхронному.
+
+    Асинхронное представление может вернуть None, тогда запрос тоже
+    обрабатывается синхронным представлением.
+    """
+    sync_view = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method == 'GET':
+            response = await async_view(request, *args, **kwargs)
+            if response is not None:
+                return response
+        return await sync_view(request, *args, **kwargs)
+
+    view.csrf_exempt = True
+    return view
+
+
+async def refresh_entry(compute, key, version):
+    """Фоновое обновление устаревшей записи; снимает блокировку."""
+    try:
+        await sync_to_async(finish_refresh)(key, version, await compute())
+    except Exception:
+        logger.exception('Не удалось обновить ответ %s в кэше', key)
+    finally:
+        await sync_to_async(release)(key)
+
+
+async def fill_entry(compute, request, key, version, entry):
+    """api.cache.fill_entry для асинхронного представления."""
+    acquired, stored = await sync_to_async(claim_entry)(request, key)
+    if stored is not None:
+        return stored
+    try:
+        response = await compute()
+    except Exception as error:
+        return await sync_to_async(failed_entry)(
+            error, request, key, entry, acquired)
+    record_cache('miss')
+    await sync_to_async(finish_entry)(response, key, version, acquired)
+    return response
+
+
+def cache_response(version_key=RECIPES_VERSION_KEY, params=RECIPE_PARAMS,
+                   anonymous_only=True):
+    """api.cache.cache_response для асинхронного представления."""
+    def decorator(view):
+        async def wrapper(request, *args, **kwargs):
+            if 'Authorization' in request.headers and (
+                    anonymous_only or await get_user(request) is None):
+                return await view(request, *args, **kwargs)
+            key = response_key(request, params)
+            response, version, entry, refresh = await sync_to_async(
+                cached_entry)(request, key, version_key)
+            if refresh:
+                fresh = background_request(request)
+                task = asyncio.create_task(refresh_entry(
+                    lambda: view(fresh, *args, **kwargs), key, version))
+                refreshes.add(task)
+                task.add_done_callback(refreshes.discard)
+            if response is not None:
+                return response
+            return await fill_entry(
+                lambda: view(request, *args, **kwargs),
+                request, key, version, entry)
+
+        return wrapper
+
+    return decorator
+
+
+cache_anonymous = cache_response()
+cache_catalog = cache_response(
+    CATALOG_VERSION_KEY, CATALOG_PARAMS, anonymous_only=False)
+
+
+def json_response(data):
+    return JsonResponse(data, safe=False, json_dumps_params=JSON_DUMPS_PARAMS)
+
+
+async def get_user(request):
+    """Аутентификация по токену, как в TokenAuthentication.
+
+    Возвращает None, если токен передан, но недействителен: такой запрос
+    отдается DRF, чтобы ответ об ошибке был тем же самым. Результат
+    запоминается в запросе: его уже получил декоратор throttle.
+    """
+    if not hasattr(request, 'token_user'):
+        request.token_user = await authenticate(request)
+    return request.token_user
+
+
+async def authenticate(request):
+    auth = request.headers.get('Authorization', '').split()
+    if not auth or auth[0].lower() != 'token':
+        return AnonymousUser()
+    if len(auth) != 2:
+        return None
+    try:
+        token = await Token.objects.select_related('user').aget(key=auth[1])
+    except Token.DoesNotExist:
+        return None
+    if not token.user.is_active:
+        return None
+    return token.user
+
+
+async def all_of(queryset):
+    return [obj async for obj in queryset]
+
+
+def tag_data(tag):
+    return {'id': tag.id, 'name': tag.name, 'slug': tag.slug}
+
+
+def ingredient_data(ingredient):
+    return {'id': ingredient.id, 'name': ingredient.name,
+            'measurement_unit': ingredient.measurement_unit}
+
+
+def list_queryset(params, user):
+    """Тот же запрос, что и в RecipeViewSet.get_queryset."""
+    return order_recipes(
+        filter_recipes(Recipe.visible.all(), params, user),
+        params.get('ordering'))
+
+
+async def render(request, user, rows, fields):
+    """Данные рецептов через кэш фрагментов, как в синхронном ответе."""
+    request.user = user
+    return await sync_to_async(render_recipes)(rows, request, fields)
+
+
+def page_bounds(request, paginator):
+    """Номер и размер страницы по правилам пагинатора DRF."""
+    page_size = paginator.page_size
+    if paginator.page_size_query_param:
+        try:
+            page_size = int(
+                request.GET[paginator.page_size_query_param])
+        except (KeyError, ValueError):
+            pass
+        else:
+            if page_size <= 0:
+                page_size = paginator.page_size
+            elif paginator.max_page_size:
+                page_size = min(page_size, paginator.max_page_size)
+    page = request.GET.get(paginator.page_query_param) or 1
+    if page in paginator.last_page_strings:
+        return None
+    try:
+        page = int(page)
+    except ValueError:
+        return None
+    return page, page_size
+
+
+def page_link(request, paginator, number):
+    url = request.build_absolute_uri()
+    if number == 1:
+        return remove_query_param(url, paginator.page_query_param)
+    return replace_query_param(url, paginator.page_query_param, number)
+
+
+@throttle(get_user=get_user)
+@cache_anonymous
+async def recipe_list(request):
+    user = await get_user(request)
+    if user is None:
+        return None
+    paginator = RecipeViewSet.pagination_class()
+    bounds = page_bounds(request, paginator)
+    if bounds is None:
+        return None
+    page, page_size = bounds
+    if page < 1:
+        return None
+    try:
+        fields = recipe_fields(request.GET, compact=True)
+        queryset = list_queryset(request.GET, user)
+        names = requested_facets(request.GET)
+    except ValidationError:
+        # Ответ об ошибке в параметрах формирует DRF.
+        return None
+    versions = await aget_versions(user, recipes=True)
+    variant = fields_variant('json', fields)
+    response = await sync_to_async(cached_not_modified)(
+        request, user, versions, variant)
+    if response is not None:
+        return response
+    page_qs = queryset.values_list(*ROW_FIELDS)[
+        (page - 1) * page_size:page * page_size]
+    facets, count, rows = await asyncio.gather(
+        afacet_counts(Recipe.visible.all(), request.GET, user, names),
+        queryset.acount(),
+        all_of(page_qs),
+    )
+    if page > 1 and not rows:
+        # Ответ «Неправильная страница» формирует DRF.
+        return None
+    etag, _ = validators(
+        rows, versions, facets_variant(variant, facets), count)
+    await sync_to_async(remember_etag)(request, user, versions, variant, etag)
+    response = not_modified(request, etag)
+    if response is not None:
+        return response
+    data = {
+        'count': count,
+        'next': (page_link(request, paginator, page + 1)
+                 if page * page_size < count else None),
+        'previous': (page_link(request, paginator, page - 1)
+                     if page > 1 else None),
+        'results': await render(request, user, rows, fields),
+    }
+    if facets:
+        data['facets'] = facets
+    return set_validators(json_response(data), etag)
+
+
+@throttle(get_user=get_user)
+@count_views
+@cache_anonymous
+async def recipe_detail(request, pk):
+    user = await get_user(request)
+    if user is None:
+        return None
+    try:
+        fields = recipe_fields(request.GET)
+    except ValidationError:
+        return None
+    versions, row = await asyncio.gather(
+        aget_versions(user),
+        Recipe.visible.filter(pk=pk).values_list(*ROW_FIELDS).afirst())
+    if row is None:
+        return None
+    etag, last_modified = validators(
+        [row], versions, fields_variant('json', fields))
+    response = not_modified(request, etag, last_modified)
+    if response is not None:
+        return response
+    data = await render(request, user, [row], fields)
+    return set_validators(json_response(data[0]), etag, last_modified)
+
+
+@throttle(get_user=get_user)
+@cache_catalog
+async def tag_list(request):
+    if await get_user(request) is None:
+        return None
+    return json_response([tag_data(tag) async for tag in Tag.objects.all()])
+
+
+@throttle(get_user=get_user)
+async def tag_detail(request, pk):
+    if await get_user(request) is None:
+        return None
+    try:
+        tag = await Tag.objects.aget(pk=pk)
+    except Tag.DoesNotExist:
+        return None
+    return json_response(tag_data(tag))
+
+
+@throttle(get_user=get_user)
+@cache_catalog
+async def ingredient_list(request):
+    if await get_user(request) is None:
+        return None
+    queryset = Ingredient.objects.all()
+    name = request.GET.get('name')
+    if name:
+        queryset = queryset.filter(name__istartswith=name)
+    return json_response([
+        item async for item in queryset.values(
+            'id', 'name', 'measurement_unit')
+    ])
+
+
+@throttle(get_user=get_user)
+async def ingredient_detail(request, pk):
+    if await get_user(request) is None:
+        return None
+    try:
+        ingredient = await Ingredient.objects.aget(pk=pk)
+    except Ingredient.DoesNotExist:
+        return None
+    return json_response(ingredient_data(ingredient))
+
+
+@throttle(get_user=get_user)
+async def recipe_by_short_link(request, short_link):
+    key = short_link_key(short_link)
+    recipe_id = await cache.aget(key)
+    if recipe_id is None:
+        try:
+            recipe_id = await Recipe.visible.values_list(
+                'pk', flat=True).aget(short_link=short_link)
+        except Recipe.DoesNotExist:
+            raise Http404
+        await cache.aset(key, recipe_id, settings.SHORT_LINK_CACHE_TIMEOUT)
+    record_event('short_link_redirect')
+    return HttpResponseRedirect(f'/recipes/{recipe_id}/')
+
+
+recipes_list_view = read_path(
+    recipe_list,
+    RecipeViewSet.as_view({'get': 'list', 'post': 'create'}),
+)
+recipes_detail_view = read_path(
+    recipe_detail,
+    RecipeViewSet.as_view({
+        'get': 'retrieve',
+        'put': 'update',
+        'patch': 'partial_update',
+        'delete': 'destroy',
+    }),
+)
+tags_list_view = read_path(tag_list, TagViewSet.as_view({'get': 'list'}))
+tags_detail_view = read_path(
+    tag_detail, TagViewSet.as_view({'get': 'retrieve'}))
+ingredients_list_view = read_path(
+    ingredient_list, IngredientViewSet.as_view({'get': 'list'}))
+ingredients_detail_view = read_path(
+    ingredient_detail, IngredientViewSet.as_view({'get': 'retrieve'}))
@@ -0,0 +1,387 @@
+"""Кэш готовых ответов API.
+
+Для анонимов флаги is_favorited, is_in_shopping_cart и is_subscribed
+всегда ложны, поэтому их ответы одинаковы и кэшируются целиком; ответы
+каталогов (теги, ингредиенты) одинаковы для всех. Записи помечаются
+версией данных; любое изменение рецептов, тегов, ингредиентов или авторов
+меняет версию, и старые записи перестают использоваться. Попадание в кэш —
+одно обращение get_many без запросов к базе. Вместе с ответом хранятся
+его сжатые варианты, так что повторные запросы не тратят CPU на сжатие.
+
+Запись свежая RESPONSE_CACHE_TIMEOUT секунд. После этого и до
+RESPONSE_CACHE_HARD_TIMEOUT она отдается устаревшей, а обновляет ее в фоне
+один запрос — тот, что взял блокировку в кэше. Запись со старой версией
+не отдается: ответ считается сразу, как без записи. Без записи ответ тоже
+считает один запрос, остальные ждут его результат до
+RESPONSE_CACHE_LOCK_WAIT секунд. Если при пересчете база недоступна
+(OperationalError), отдается запись, которой не больше
+RESPONSE_CACHE_HARD_TIMEOUT + RESPONSE_CACHE_STALE_IF_ERROR секунд.
+"""
+import io
+import logging
+import threading
+import time
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import OperationalError, connections
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+from recipes.models import Recipe
+from .compression import precompress
+from .metrics import record_cache
+
+logger = logging.getLogger(__name__)
+
+SHORT_LINK_KEY = 'api:short-link:{}'
+LOCK_KEY = 'api:lock:{}'
+RECIPES_VERSION_KEY = 'api:version:recipes'
+CATALOG_VERSION_KEY = 'api:version:catalog'
+# Параметры запроса, от которых зависят закэшированные ответы.
+RECIPE_PARAMS = ('author', 'cooking_time_max', 'cooking_time_min', 'expand',
+                 'facets', 'fields', 'limit', 'omit', 'ordering', 'page',
+                 'tags')
+CATALOG_PARAMS = ('name',)
+# Заголовки ответа, которые хранятся вместе с ним (см. api.conditional).
+STORED_HEADERS = ('ETag', 'Last-Modified', 'Vary')
+FRESH, STALE, EXPIRED = 'fresh', 'stale', 'expired'
+# Ответы, после которых запись удаляется, а не обновляется.
+GONE_STATUSES = (404, 410)
+LOCK_POLL_INTERVAL = 0.05
+
+
+def bump_version(key=RECIPES_VERSION_KEY):
+    cache.set(key, time.time_ns(), None)
+
+
+def normalized_query(params, names=RECIPE_PARAMS):
+    return urlencode([
+        (name, value)
+        for name in names
+        for value in sorted(params.getlist(name))
+    ])
+
+
+def response_key(request, names=RECIPE_PARAMS):
+    return (
+        f'api:response:{request.get_host()}:{request.path}:'
+        f'{normalized_query(request.GET, names)}'
+    )
+
+
+def is_conditional(request):
+    return ('HTTP_IF_NONE_MATCH' in request.META
+            or 'HTTP_IF_MODIFIED_SINCE' in request.META)
+
+
+def entry_state(entry, version):
+    """FRESH, STALE или EXPIRED; запись старой версии — EXPIRED.
+
+    EXPIRED-запись отдается только вместо ошибки базы данных.
+    """
+    if entry is None:
+        return None
+    age = time.time() - entry['stored_at']
+    if entry['version'] != version:
+        return EXPIRED
+    if age < settings.RESPONSE_CACHE_TIMEOUT:
+        return FRESH
+    if age < settings.RESPONSE_CACHE_HARD_TIMEOUT:
+        return STALE
+    return EXPIRED
+
+
+def get_entry(key, version_key=RECIPES_VERSION_KEY):
+    """Текущая версия, запись и ее состояние: FRESH, STALE или EXPIRED."""
+    values = cache.get_many([version_key, key])
+    version = values.get(version_key)
+    if version is None:
+        version = time.time_ns()
+        cache.add(version_key, version, None)
+    entry = values.get(key)
+    return version, entry, entry_state(entry, version)
+
+
+def lock_key(key):
+    return LOCK_KEY.format(key)
+
+
+def acquire(key):
+    """Блокировка пересчета записи; True, если взята этим запросом."""
+    return cache.add(
+        lock_key(key), True, settings.RESPONSE_CACHE_LOCK_TIMEOUT)
+
+
+def release(key):
+    cache.delete(lock_key(key))
+
+
+def wait_entry(key, since):
+    """Запись, сохраненная после since запросом с блокировкой, или None."""
+    deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(LOCK_POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry['stored_at'] >= since:
+            return entry
+    return None
+
+
+def store_entry(key, version, response, best=False):
+    cache.set(key, {
+        'version': version,
+        'stored_at': time.time(),
+        'content': response.content,
+        'content_type': response['Content-Type'],
+        'headers': {
+            name: response[name]
+            for name in STORED_HEADERS if response.has_header(name)
+        },
+        'compressed': precompress(response.content, best),
+    }, settings.RESPONSE_CACHE_HARD_TIMEOUT
+        + settings.RESPONSE_CACHE_STALE_IF_ERROR)
+
+
+def background_request(request):
+    """GET-запрос для фонового пересчета с адресом и заголовками request.
+
+    Исходный запрос к этому времени уже обработан, и его нельзя
+    использовать из другого потока. У копии нет тела, cookies,
+    авторизации и условных заголовков: в кэш попадают ответы анонимам.
+    """
+    environ = {
+        name: value for name, value in request.META.items()
+        if isinstance(value, str) and not name.startswith('HTTP_IF_')
+        and name not in ('HTTP_AUTHORIZATION', 'HTTP_COOKIE')
+    }
+    environ.update({
+        'REQUEST_METHOD': 'GET',
+        'CONTENT_LENGTH': '0',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.url_scheme': request.scheme,
+    })
+    return WSGIRequest(environ)
+
+
+def finish_refresh(key, version, response):
+    """Сохраняет обновленный ответ или удаляет запись пропавшего объекта.
+
+    response None — представление отдало запрос DRF, ответ неизвестен.
+    """
+    if response is not None and response.status_code == 200:
+        # Клиент уже получил ответ, поэтому сжатие максимальное.
+        store_entry(key, version, response, best=True)
+    elif response is None or response.status_code in GONE_STATUSES:
+        cache.delete(key)
+
+
+def refresh_in_background(key, version, render):
+    """Пересчитывает запись в потоке; render() возвращает готовый ответ.
+
+    Представление для render строится заново (см. background_view).
+    Вызывается только запросом, взявшим блокировку, и снимает ее.
+    """
+    def run():
+        try:
+            finish_refresh(key, version, render())
+        except Exception:
+            logger.exception('Не удалось обновить ответ %s в кэше', key)
+        finally:
+            release(key)
+            connections.close_all()
+
+    threading.Thread(target=run, name='cache-refresh', daemon=True).start()
+
+
+def entry_response(request, entry):
+    """Ответ из записи кэша или 304, если его валидаторы совпали."""
+    response = HttpResponse(
+        entry['content'], content_type=entry['content_type'])
+    for name, value in entry.get('headers', {}).items():
+        response[name] = value
+    response.compressed_variants = entry['compressed']
+    return get_conditional_response(
+        request,
+        etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified')),
+        response=response
+    )
+
+
+def short_link_key(short_link):
+    return SHORT_LINK_KEY.format(short_link)
+
+
+def short_link_target(short_link):
+    """id рецепта по короткой ссылке; без обращения к базе при попадании."""
+    key = short_link_key(short_link)
+    recipe_id = cache.get(key)
+    if recipe_id is None:
+        recipe_id = get_object_or_404(
+            Recipe.visible.values_list('pk', flat=True),
+            short_link=short_link
+        )
+        cache.set(key, recipe_id, settings.SHORT_LINK_CACHE_TIMEOUT)
+    return recipe_id
+
+
+def cached_entry(request, key, version_key):
+    """Ответ из кэша, если его можно отдать без пересчета.
+
+    Возвращает (ответ или None, версия, запись, обновить ли запись
+    в фоне). Обновлять должен тот, кто получил True: блокировка уже
+    взята, и ее нужно снять.
+    """
+    version, entry, state = get_entry(key, version_key)
+    if state == FRESH:
+        record_cache('hit')
+        return entry_response(request, entry), version, entry, False
+    if state == STALE:
+        refresh = not is_conditional(request) and acquire(key)
+        record_cache('stale')
+        return entry_response(request, entry), version, entry, refresh
+    return None, version, entry, False
+
+
+def claim_entry(request, key):
+    """Берет блокировку пересчета или ждет ответ того, кто ее взял.
+
+    Возвращает (взята ли блокировка, ответ из кэша или None).
+    """
+    if acquire(key):
+        return True, None
+    stored = wait_entry(key, time.time())
+    if stored is None:
+        return False, None
+    record_cache('hit')
+    return False, entry_response(request, stored)
+
+
+def failed_entry(error, request, key, entry, acquired):
+    """Ответ из записи вместо ошибки базы; другие ошибки пробрасываются.
+
+    entry — запись старше жесткого срока или другой версии, или None.
+    """
+    if acquired:
+        release(key)
+    if entry is None or not isinstance(error, OperationalError):
+        raise error
+    record_cache('error')
+    return entry_response(request, entry)
+
+
+def finish_entry(response, key, version, acquired):
+    """Сохраняет посчитанный ответ и снимает блокировку.
+
+    response None — представление отдало запрос DRF.
+    """
+    if response is not None and response.status_code == 200:
+        store_entry(key, version, response)
+    if acquired:
+        release(key)
+
+
+def fill_entry(compute, request, key, version, entry):
+    """Считает ответ, не давая пересчитывать запись параллельно."""
+    acquired, stored = claim_entry(request, key)
+    if stored is not None:
+        return stored
+    try:
+        response = compute()
+    except Exception as error:
+        return failed_entry(error, request, key, entry, acquired)
+    record_cache('miss')
+    if hasattr(response, 'add_post_render_callback'):
+        response.add_post_render_callback(
+            lambda response: finish_entry(response, key, version, acquired))
+    else:
+        finish_entry(response, key, version, acquired)
+    return response
+
+
+def background_view(view_class, action_map, http_request, args, kwargs):
+    """Новое представление DRF для запроса из background_request.
+
+    Повторяет APIView.initial без проверок доступа и троттлинга:
+    фоновый пересчет — не запрос клиента.
+    """
+    view = view_class()
+    if action_map is not None:
+        view.action_map = action_map
+        view.action = action_map.get('get')
+    view.args, view.kwargs = args, kwargs
+    view.format_kwarg = view.get_format_suffix(**kwargs)
+    request = view.initialize_request(http_request, *args, **kwargs)
+    view.request = request
+    view.headers = view.default_response_headers
+    request.accepted_renderer, request.accepted_media_type = (
+        view.perform_content_negotiation(request))
+    request.version, request.versioning_scheme = view.determine_version(
+        request, *args, **kwargs)
+    return view
+
+
+def render(method, view, args, kwargs):
+    """Готовый ответ метода представления, как после dispatch."""
+    request = view.request
+    try:
+        response = method(view, request, *args, **kwargs)
+    except Exception as error:
+        response = view.handle_exception(error)
+    response = view.finalize_response(request, response, *args, **kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+def refresh_view(view, method, request, key, version, args, kwargs):
+    """Обновляет запись в фоне новым экземпляром класса view."""
+    http_request = background_request(request)
+    view_class = type(view)
+    action_map = getattr(view, 'action_map', None)
+    refresh_in_background(key, version, lambda: render(
+        method,
+        background_view(view_class, action_map, http_request, args, kwargs),
+        args, kwargs))
+
+
+def cache_response(version_key=RECIPES_VERSION_KEY, params=RECIPE_PARAMS,
+                   anonymous_only=True):
+    """Кэширует успешные JSON-ответы метода представления.
+
+    При anonymous_only ответы для авторизованных пользователей
+    не кэшируются: в них есть флаги, зависящие от пользователя.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if ((anonymous_only and request.user.is_authenticated)
+                    or request.accepted_renderer.format != 'json'):
+                return method(self, request, *args, **kwargs)
+            key = response_key(request, params)
+            response, version, entry, refresh = cached_entry(
+                request, key, version_key)
+            if refresh:
+                refresh_view(self, method, request, key, version,
+                             args, kwargs)
+            if response is not None:
+                return response
+            return fill_entry(
+                lambda: method(self, request, *args, **kwargs),
+                request, key, version, entry
+            )
+
+        return wrapper
+
+    return decorator
+
+
+cache_anonymous = cache_response()
+cache_catalog = cache_response(
+    CATALOG_VERSION_KEY, CATALOG_PARAMS, anonymous_only=False)
@@ -0,0 +1,61 @@
+"""Сжатие ответов API с выбором кодировки по Accept-Encoding."""
+import gzip
+
+import brotli
+from django.conf import settings
+
+# Порядок задает предпочтение при равных q.
+ENCODINGS = ('br', 'gzip')
+
+# Сжатие «на лету» и при заполнении кэша в запросе — быстрые уровни,
+# фоновое обновление записей кэша — максимальные: brotli 11 в десятки раз
+# медленнее и стоило бы запросу больше, чем экономит кэш.
+FAST = {
+    'br': lambda content: brotli.compress(content, quality=5),
+    'gzip': lambda content: gzip.compress(content, 6, mtime=0),
+}
+BEST = {
+    'br': lambda content: brotli.compress(content, quality=11),
+    'gzip': lambda content: gzip.compress(content, 9, mtime=0),
+}
+
+
+def is_compressible(content):
+    return len(content) >= settings.COMPRESSION_MIN_SIZE
+
+
+def compress(content, encoding):
+    return FAST[encoding](content)
+
+
+def precompress(content, best=False):
+    """Все варианты сжатия для ответа, который будет отдаваться много раз.
+
+    best — максимальное сжатие, только вне потока запроса.
+    """
+    if not is_compressible(content):
+        return {}
+    levels = BEST if best else FAST
+    return {encoding: levels[encoding](content) for encoding in ENCODINGS}
+
+
+def negotiate(accept_encoding):
+    """Выбирает кодировку из заголовка Accept-Encoding или None."""
+    weights = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip().lower()] = quality
+    default = weights.get('*', 0.0)
+    best, best_quality = None, 0.0
+    for encoding in ENCODINGS:
+        quality = weights.get(encoding, default)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
@@ -0,0 +1,126 @@
+"""Условные запросы к рецептам: ETag и Last-Modified.
+
+Валидаторы считаются по строкам (id, updated_at, views) рецептов ответа,
+версии каталога (теги, ингредиенты) и версии флагов пользователя, которая
+меняется вместе с его избранным, корзиной и подписками. Сам рецепт для
+этого не загружается и не сериализуется, поэтому ответ 304 на совпавший
+If-None-Match или If-Modified-Since стоит одного запроса по первичному
+ключу. Last-Modified отдается только для одного рецепта: состав страницы
+списка может измениться без изменения чьего-либо updated_at.
+
+ETag страницы списка зависит еще от числа рецептов и фасетов, поэтому
+посчитанный ETag запоминается в кэше по запросу и версиям данных
+(cached_not_modified): совпавший If-None-Match отвечается 304 без
+запросов к базе. Версия рецептов меняется при любом их изменении, кроме
+просмотров; новые просмотры попадут в ETag списка не позже чем через
+RESPONSE_CACHE_TIMEOUT.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .cache import (
+    CATALOG_VERSION_KEY,
+    RECIPES_VERSION_KEY,
+    is_conditional,
+    response_key
+)
+
+FLAGS_VERSION_KEY = 'api:version:flags:{}'
+ETAG_KEY = 'api:etag:{}'
+ROW_FIELDS = ('id', 'updated_at', 'views')
+
+
+def bump_flags(user_id):
+    cache.set(FLAGS_VERSION_KEY.format(user_id), time.time_ns(), None)
+
+
+def version_keys(user, recipes=False):
+    keys = [RECIPES_VERSION_KEY] if recipes else []
+    keys.append(CATALOG_VERSION_KEY)
+    if user.is_authenticated:
+        keys.append(FLAGS_VERSION_KEY.format(user.pk))
+    return keys
+
+
+def fill_versions(values, keys):
+    # Вытесненная из кэша версия заменяется новой, а не нулем, чтобы
+    # старый ETag не совпал случайно.
+    versions = []
+    for key in keys:
+        version = values.get(key)
+        if version is None:
+            version = time.time_ns()
+            cache.add(key, version, None)
+        versions.append(version)
+    return versions
+
+
+def get_versions(user, recipes=False):
+    """Версии для validators; recipes — и версия всех рецептов."""
+    keys = version_keys(user, recipes)
+    return fill_versions(cache.get_many(keys), keys)
+
+
+async def aget_versions(user, recipes=False):
+    keys = version_keys(user, recipes)
+    return fill_versions(await cache.aget_many(keys), keys)
+
+
+def validators(rows, versions, variant='json', count=None):
+    """Слабый ETag и Last-Modified для строк (id, updated_at, views)."""
+    parts = [variant, str(count), *map(str, versions)]
+    parts += [
+        f'{pk}.{updated_at.timestamp()}.{views}'
+        for pk, updated_at, views in rows
+    ]
+    digest = hashlib.blake2b(
+        '|'.join(parts).encode(), digest_size=12).hexdigest()
+    last_modified = max(
+        [updated_at.timestamp() for _, updated_at, _ in rows]
+        + [version / 1e9 for version in versions]
+    )
+    return f'W/"{digest}"', int(last_modified)
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_vary_headers(response, ('Authorization',))
+    return response
+
+
+def etag_key(request, user, versions, variant):
+    digest = hashlib.blake2b(
+        f'{response_key(request)}|{user.pk}|{variant}|{versions}'.encode(),
+        digest_size=12).hexdigest()
+    return ETAG_KEY.format(digest)
+
+
+def cached_not_modified(request, user, versions, variant):
+    """304 по ETag, запомненному для того же запроса и тех же версий."""
+    if not is_conditional(request):
+        return None
+    etag = cache.get(etag_key(request, user, versions, variant))
+    if etag is None:
+        return None
+    return not_modified(request, etag)
+
+
+def remember_etag(request, user, versions, variant, etag):
+    cache.set(etag_key(request, user, versions, variant), etag,
+              settings.RESPONSE_CACHE_TIMEOUT)
+
+
+def not_modified(request, etag, last_modified=None):
+    """Ответ 304 (или 412), если валидаторы запроса совпали, иначе None."""
+    response = get_conditional_response(
+        request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        set_validators(response, etag, last_modified)
+    return response
@@ -1,4 +1,6 @@
 """Контстаты приложения foodgram."""
+from decimal import Decimal
+
 MAX_LENGTH_NAME = 256
 MAX_LENGTH_SLUG = 50
 MAX_LENGTH_USERNAME = 150
@@ -25,6 +27,10 @@ COOKING_TIME_MAX = 32000
 RECIPE_INGREDIENT_AMOUT_MIN = 1
 RECIPE_INGREDIENT_AMOUT_MAX = 32000
 
+MEAL_PLAN_SERVINGS_MIN = Decimal('0.25')
+MEAL_PLAN_SERVINGS_MAX = Decimal('100')
+MEAL_PLAN_BULK_MAX = 100
+
 RANDOM_HASH_LENGTH_MIN = 15
 RANDOM_HASH_LENGTH_MAX = 32
 
@@ -0,0 +1,159 @@
+"""Фоновое каскадное удаление пользователей и рецептов.
+
+Удаление через ORM собирает все зависимые строки в памяти и удаляет их
+в транзакции запроса. Вместо этого объект сразу скрывается (рецепт —
+is_hidden, пользователь — is_active=False вместе со своими рецептами)
+и ставится в очередь DeletionJob. Команда process_deletions удаляет
+зависимые строки пачками по первичному ключу, каждую пачку в своей
+транзакции, а затем файлы, на которые больше никто не ссылается.
+Прерванное удаление можно запустить снова: оно продолжит с оставшихся
+строк.
+"""
+from django.contrib.contenttypes.models import ContentType
+from django.db import models, transaction
+from django.utils import timezone
+
+from recipes.models import DeletionJob, Recipe, User
+from .cache import bump_version
+from .sync import record_hidden
+
+DELETION_BATCH_SIZE = 1000
+
+
+def schedule_deletion(obj):
+    """Скрывает пользователя или рецепт и ставит его в очередь."""
+    with transaction.atomic():
+        if isinstance(obj, User):
+            User.objects.filter(pk=obj.pk).update(is_active=False)
+            record_hidden(Recipe.objects.filter(author=obj), author=obj)
+            Recipe.objects.filter(author=obj).update(is_hidden=True)
+        else:
+            record_hidden(Recipe.objects.filter(pk=obj.pk))
+            Recipe.objects.filter(pk=obj.pk).update(is_hidden=True)
+        job = DeletionJob.objects.create(
+            content_type=ContentType.objects.get_for_model(obj),
+            object_id=obj.pk
+        )
+    # update() не отправляет post_save.
+    bump_version()
+    return job
+
+
+def dependents(model):
+    """Обратные связи, по которым удаление model затрагивает другие строки.
+
+    Тот же отбор, что у django.db.models.deletion.Collector, включая
+    скрытые связи промежуточных таблиц many-to-many.
+    """
+    return [
+        field for field in model._meta.get_fields(include_hidden=True)
+        if field.auto_created and not field.concrete
+        and (field.one_to_one or field.one_to_many)
+    ]
+
+
+class Purger:
+    """Удаляет строки вместе с зависимыми пачками по batch_size."""
+
+    def __init__(self, job, batch_size=DELETION_BATCH_SIZE):
+        self.job = job
+        self.batch_size = batch_size
+        self.progress = dict(job.progress)
+
+    def report(self, model, count):
+        label = model._meta.label
+        self.progress[label] = self.progress.get(label, 0) + count
+        DeletionJob.objects.filter(pk=self.job.pk).update(
+            progress=self.progress)
+
+    def purge_dependents(self, model, pks):
+        for relation in dependents(model):
+            if relation.on_delete is models.CASCADE:
+                self.purge(relation.related_model._base_manager.filter(
+                    **{f'{relation.field.name}__in': pks}))
+
+    def purge(self, queryset):
+        model = queryset.model
+        # Связи SET_NULL, PROTECT и подобные обрабатывает обычный delete().
+        raw = all(
+            relation.on_delete in (models.CASCADE, models.DO_NOTHING)
+            for relation in dependents(model)
+        )
+        while True:
+            pks = list(queryset.values_list('pk', flat=True)[
+                :self.batch_size])
+            if not pks:
+                return
+            self.purge_dependents(model, pks)
+            chunk = model._base_manager.filter(pk__in=pks)
+            files = file_names(chunk)
+            with transaction.atomic(using=chunk.db):
+                if raw:
+                    chunk._raw_delete(chunk.db)
+                else:
+                    chunk.delete()
+            self.report(model, len(pks))
+            delete_unused_files(model, files)
+
+    def run(self):
+        """Удаляет объект задания; зависимые строки — пачками."""
+        model = self.job.content_type.model_class()
+        obj = model._base_manager.filter(pk=self.job.object_id).first()
+        if obj is None:
+            return
+        self.purge_dependents(model, [obj.pk])
+        files = file_names(model._base_manager.filter(pk=obj.pk))
+        # Сам объект удаляется обычным delete(), чтобы сработали сигналы.
+        obj.delete()
+        self.report(model, 1)
+        delete_unused_files(model, files)
+
+
+def file_fields(model):
+    return [
+        field for field in model._meta.concrete_fields
+        if isinstance(field, models.FileField)
+    ]
+
+
+def file_names(queryset):
+    """Имена файлов в файловых полях строк: {поле: {имя, ...}}."""
+    fields = file_fields(queryset.model)
+    if not fields:
+        return {}
+    names = {field: set() for field in fields}
+    for row in queryset.values_list(*(field.attname for field in fields)):
+        for field, name in zip(fields, row):
+            if name:
+                names[field].add(name)
+    return names
+
+
+def delete_unused_files(model, files):
+    """Удаляет файлы, на которые не ссылаются оставшиеся строки."""
+    for field, names in files.items():
+        if not names:
+            continue
+        used = set(model._base_manager.filter(
+            **{f'{field.attname}__in': names}
+        ).values_list(field.attname, flat=True))
+        for name in names - used:
+            field.storage.delete(name)
+
+
+def process_job(job, batch_size=DELETION_BATCH_SIZE):
+    """Выполняет задание, если его еще не взял другой обработчик."""
+    claimed = DeletionJob.objects.filter(
+        pk=job.pk, status=job.status
+    ).update(status=DeletionJob.RUNNING)
+    if not claimed:
+        return False
+    try:
+        Purger(job, batch_size).run()
+    except Exception as error:
+        DeletionJob.objects.filter(pk=job.pk).update(
+            status=DeletionJob.FAILED, error=str(error))
+        raise
+    DeletionJob.objects.filter(pk=job.pk).update(
+        status=DeletionJob.DONE, error='', finished_at=timezone.now())
+    return True
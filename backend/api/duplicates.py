@@ -0,0 +1,174 @@
+"""Поиск почти-дубликатов рецептов по MinHash.
+
+Рецепт раскладывается на множество шинглов: ингредиенты и тройки
+соседних слов названия и описания. MinHash из SIGNATURE_SIZE минимумов
+хэшей оценивает долю общих шинглов двух рецептов (сходство Жаккара)
+как долю совпавших позиций. Сигнатура делится на BANDS полос, хэш каждой
+полосы хранится в RecipeBucket: рецепты со сходством выше порога почти
+наверняка совпадают хотя бы в одной полосе, поэтому кандидаты находятся
+одним запросом по индексу, а не перебором всех рецептов. Оригиналом
+считается более ранний рецепт.
+"""
+import hashlib
+import heapq
+import random
+import re
+import struct
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import serializers
+
+from recipes.models import RecipeBucket, RecipeIngredient, RecipeSignature
+
+BANDS = 20
+ROWS = 5
+SIGNATURE_SIZE = BANDS * ROWS
+PRIME = (1 << 61) - 1
+_random = random.Random(20240601)
+PERMUTATIONS = [
+    (_random.randrange(1, PRIME), _random.randrange(PRIME))
+    for _ in range(SIGNATURE_SIZE)
+]
+SHINGLE_WORDS = 3
+# Сколько кандидатов сравнивать с рецептом; у спама их может быть много,
+# а для решения достаточно одного похожего. Берутся кандидаты с наибольшим
+# числом совпавших полос: оно растет вместе со сходством.
+MAX_CANDIDATES = 100
+
+
+def shingles(name, text, ingredient_ids):
+    words = re.findall(r'\w+', f'{name} {text}'.lower())
+    result = {f'i:{pk}' for pk in ingredient_ids}
+    result.update(
+        ' '.join(words[start:start + SHINGLE_WORDS])
+        for start in range(max(len(words) - SHINGLE_WORDS + 1, 1))
+    )
+    return result
+
+
+def minhash(name, text, ingredient_ids):
+    hashes = [
+        int.from_bytes(
+            hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big'
+        ) % PRIME
+        for shingle in shingles(name, text, ingredient_ids)
+    ]
+    return [min((a * value + b) % PRIME for value in hashes)
+            for a, b in PERMUTATIONS]
+
+
+def band_hashes(signature):
+    return [
+        int.from_bytes(hashlib.blake2b(
+            struct.pack(f'<{ROWS}Q', *signature[band * ROWS:][:ROWS]),
+            digest_size=8
+        ).digest(), 'big', signed=True)
+        for band in range(BANDS)
+    ]
+
+
+def similarity(first, second):
+    return sum(a == b for a, b in zip(first, second)) / SIGNATURE_SIZE
+
+
+def candidates(signatures):
+    """{ключ: id кандидатов} для {id рецепта или None для нового: minhash}.
+
+    Кандидаты ищутся среди сохраненных рецептов и в самой пачке.
+    """
+    bands = {key: band_hashes(value) for key, value in signatures.items()}
+    index = defaultdict(set)
+    rows = RecipeBucket.objects.filter(
+        hash__in={value for hashes in bands.values() for value in hashes},
+        recipe__is_hidden=False
+    ).values_list('band', 'hash', 'recipe_id')
+    for band, value, recipe_id in rows:
+        index[band, value].add(recipe_id)
+    for key, hashes in bands.items():
+        if key is not None:
+            for band, value in enumerate(hashes):
+                index[band, value].add(key)
+    result = {}
+    for key, hashes in bands.items():
+        matches = Counter()
+        for band, value in enumerate(hashes):
+            matches.update(index[band, value])
+        found = [pk for pk in matches if key is None or pk < key]
+        result[key] = heapq.nsmallest(
+            MAX_CANDIDATES, found, key=lambda pk: (-matches[pk], pk))
+    return result
+
+
+def find_duplicates(signatures):
+    """{ключ: (id оригинала, сходство)} для рецептов, у которых он есть."""
+    found = candidates(signatures)
+    known = dict(signatures)
+    missing = {pk for pks in found.values() for pk in pks} - set(known)
+    known.update(RecipeSignature.objects.filter(
+        recipe_id__in=missing).values_list('recipe_id', 'minhash'))
+    duplicates = {}
+    for key, pks in found.items():
+        score, original = max(
+            ((similarity(signatures[key], known[pk]), pk)
+             for pk in pks if pk in known),
+            default=(0, None)
+        )
+        if score >= settings.RECIPE_DUPLICATE_SIMILARITY:
+            duplicates[key] = (original, score)
+    return duplicates
+
+
+def check(name, text, ingredient_ids, recipe_id=None):
+    """MinHash рецепта и вероятный оригинал или None.
+
+    При RECIPE_DUPLICATES=reject найденный дубликат — ошибка валидации,
+    при off проверка не выполняется и возвращается None.
+    """
+    if settings.RECIPE_DUPLICATES == 'off':
+        return None
+    signature = minhash(name, text, ingredient_ids)
+    duplicate = find_duplicates({recipe_id: signature}).get(recipe_id)
+    if duplicate is not None and settings.RECIPE_DUPLICATES == 'reject':
+        raise serializers.ValidationError(
+            f'Похожий рецепт уже опубликован: {duplicate[0]}.')
+    return signature, duplicate
+
+
+def store(signatures, duplicates):
+    """Сохраняет сигнатуры {id рецепта: minhash} и их корзины."""
+    ids = list(signatures)
+    with transaction.atomic():
+        RecipeSignature.objects.filter(recipe_id__in=ids).delete()
+        RecipeBucket.objects.filter(recipe_id__in=ids).delete()
+        RecipeSignature.objects.bulk_create([
+            RecipeSignature(
+                recipe_id=pk,
+                minhash=signature,
+                duplicate_of_id=duplicates.get(pk, (None, None))[0],
+                similarity=duplicates.get(pk, (None, None))[1],
+            )
+            for pk, signature in signatures.items()
+        ])
+        RecipeBucket.objects.bulk_create([
+            RecipeBucket(recipe_id=pk, band=band, hash=value)
+            for pk, signature in signatures.items()
+            for band, value in enumerate(band_hashes(signature))
+        ])
+
+
+def sign_recipes(recipes):
+    """Подписывает пачку рецептов; возвращает число найденных дубликатов."""
+    ingredient_ids = defaultdict(list)
+    for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe__in=recipes).values_list('recipe_id', 'ingredient_id'):
+        ingredient_ids[recipe_id].append(ingredient_id)
+    signatures = {
+        recipe.pk: minhash(recipe.name, recipe.text,
+                           ingredient_ids[recipe.pk])
+        for recipe in recipes
+    }
+    duplicates = find_duplicates(signatures)
+    store(signatures, duplicates)
+    return len(duplicates)
@@ -0,0 +1,128 @@
+"""Фильтры списка рецептов и счетчики для них (фасеты).
+
+С ?facets=tags,cooking_time список рецептов дополнительно отдает число
+рецептов по каждому тегу и гистограмму времени приготовления. Каждый
+фасет считается одним агрегирующим запросом с учетом всех фильтров,
+кроме собственного: счетчики тегов не зависят от выбранных тегов, а
+гистограмма — от cooking_time_min и cooking_time_max, чтобы было видно,
+сколько рецептов добавит соседний вариант.
+"""
+import json
+
+from django.db.models import Count, Q
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import Tag
+
+FACETS = ('tags', 'cooking_time')
+# Верхние границы корзин гистограммы, минуты включительно.
+COOKING_TIME_BUCKETS = (15, 30, 60, 120)
+
+
+def requested_facets(params):
+    names = {
+        name
+        for value in params.getlist('facets')
+        for name in value.split(',') if name
+    }
+    if names - set(FACETS):
+        raise ValidationError(
+            {'facets': [f'Допустимые значения: {", ".join(FACETS)}']})
+    return [name for name in FACETS if name in names]
+
+
+def cooking_time_range(params):
+    bounds = []
+    for name in ('cooking_time_min', 'cooking_time_max'):
+        value = params.get(name)
+        try:
+            bounds.append(int(value) if value else None)
+        except ValueError:
+            raise ValidationError({name: ['Ожидается число минут.']})
+    return bounds
+
+
+def filter_cooking_time(queryset, params):
+    low, high = cooking_time_range(params)
+    if low is not None:
+        queryset = queryset.filter(cooking_time__gte=low)
+    if high is not None:
+        queryset = queryset.filter(cooking_time__lte=high)
+    return queryset
+
+
+def filter_recipes(queryset, params, user, skip=None):
+    """Фильтры списка рецептов; фильтр фасета skip не применяется."""
+    author_id = params.get('author')
+    if author_id:
+        queryset = queryset.filter(author__id=author_id)
+    tags = params.getlist('tags')
+    if tags and skip != 'tags':
+        queryset = queryset.filter(tags__slug__in=tags).distinct()
+    if params.get('is_in_shopping_cart') and user.is_authenticated:
+        queryset = queryset.filter(shopping_cart__user=user)
+    if params.get('is_favorited') and user.is_authenticated:
+        queryset = queryset.filter(favorites__user=user)
+    if skip != 'cooking_time':
+        queryset = filter_cooking_time(queryset, params)
+    return queryset
+
+
+def facets_variant(variant, facets):
+    """Вариант ответа для ETag с учетом счетчиков фасетов."""
+    if not facets:
+        return variant
+    return f'{variant}:{json.dumps(facets, sort_keys=True)}'
+
+
+def buckets():
+    """Пары (нижняя, верхняя граница) корзин; у последней верхней нет."""
+    lows = [1] + [high + 1 for high in COOKING_TIME_BUCKETS]
+    return list(zip(lows, list(COOKING_TIME_BUCKETS) + [None]))
+
+
+def tag_counts(recipes):
+    return Tag.objects.annotate(count=Count(
+        'recipe', filter=Q(recipe__in=recipes.values('pk'))
+    )).values('slug', 'name', 'count')
+
+
+def cooking_time_counts():
+    return {
+        f'bucket_{low}': Count('pk', filter=Q(
+            cooking_time__gte=low,
+            **({} if high is None else {'cooking_time__lte': high})
+        ))
+        for low, high in buckets()
+    }
+
+
+def histogram(totals):
+    return [
+        {'min': low, 'max': high, 'count': totals[f'bucket_{low}']}
+        for low, high in buckets()
+    ]
+
+
+def facet_counts(queryset, params, user, names):
+    facets = {}
+    if 'tags' in names:
+        facets['tags'] = list(tag_counts(
+            filter_recipes(queryset, params, user, skip='tags')))
+    if 'cooking_time' in names:
+        facets['cooking_time'] = histogram(
+            filter_recipes(queryset, params, user, skip='cooking_time')
+            .aggregate(**cooking_time_counts()))
+    return facets
+
+
+async def afacet_counts(queryset, params, user, names):
+    facets = {}
+    if 'tags' in names:
+        facets['tags'] = [row async for row in tag_counts(
+            filter_recipes(queryset, params, user, skip='tags'))]
+    if 'cooking_time' in names:
+        facets['cooking_time'] = histogram(
+            await filter_recipes(queryset, params, user, skip='cooking_time')
+            .aaggregate(**cooking_time_counts()))
+    return facets
@@ -0,0 +1,52 @@
+"""Выбор полей рецепта в ответе.
+
+?fields=id,name,image отдает только перечисленные поля, ?omit=text убирает
+поля из набора по умолчанию, ?expand=ingredients добавляет в него поля.
+Список рецептов по умолчанию компактный — без описания и ингредиентов,
+которые не нужны карточкам; страница рецепта отдает все поля. Связи
+невыбранных полей (теги, ингредиенты, автор) не запрашиваются из базы.
+id отдается всегда. Поля OPT_IN_FIELDS нет в документированной схеме
+(docs/openapi-schema.yml), они отдаются только по ?fields= или ?expand=.
+"""
+from rest_framework.exceptions import ValidationError
+
+RECIPE_FIELDS = (
+    'id', 'tags', 'author', 'ingredients', 'name', 'image', 'text',
+    'cooking_time', 'is_favorited', 'is_in_shopping_cart', 'short_link',
+    'views'
+)
+OPT_IN_FIELDS = ('views',)
+DEFAULT_FIELDS = tuple(
+    field for field in RECIPE_FIELDS if field not in OPT_IN_FIELDS)
+COMPACT_OMIT = ('ingredients', 'text')
+FIELDSET_PARAMS = ('fields', 'omit', 'expand')
+
+
+def field_names(params, name):
+    names = {
+        field
+        for value in params.getlist(name)
+        for field in value.split(',') if field
+    }
+    if names - set(RECIPE_FIELDS):
+        raise ValidationError({name: [
+            f'Допустимые значения: {", ".join(RECIPE_FIELDS)}']})
+    return names
+
+
+def recipe_fields(params, compact=False):
+    """Поля рецепта для ответа в порядке RECIPE_FIELDS."""
+    fields, omit, expand = (
+        field_names(params, name) for name in FIELDSET_PARAMS)
+    if not fields:
+        fields = set(DEFAULT_FIELDS) - set(COMPACT_OMIT if compact else ())
+        fields = (fields | expand) - omit
+    fields.add('id')
+    return tuple(field for field in RECIPE_FIELDS if field in fields)
+
+
+def fields_variant(variant, fields):
+    """Вариант ответа для ETag с учетом набора полей."""
+    if fields == DEFAULT_FIELDS:
+        return variant
+    return f'{variant}:{",".join(fields)}'
@@ -0,0 +1,231 @@
+"""Облегченная сериализация рецептов для списков и детальной страницы.
+
+Вместо ModelSerializer данные собираются из .values() несколькими
+запросами на страницу. Формат ответа совпадает с RecipeSerializer.
+
+render_recipes кэширует в два слоя. Данные рецепта без флагов
+пользователя хранятся по ключу из id и updated_at, который меняется при
+любом изменении рецепта, его ингредиентов, тегов и автора. Флаги
+накладываются по кэшированным множествам избранного, корзины и подписок
+пользователя; сигналы сбрасывают их при изменениях. Страница списка —
+запрос id, один get_many и проверки по множествам. Для набора полей
+из api.fieldsets загружаются только нужные связи, и данные кэшируются
+отдельно для каждого набора.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.models import (
+    Favorite,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscription,
+    User
+)
+from .fieldsets import DEFAULT_FIELDS
+
+# Поля ответа, которые берутся из столбцов рецепта.
+RECIPE_COLUMNS = {
+    'name': 'name',
+    'image': 'image',
+    'text': 'text',
+    'cooking_time': 'cooking_time',
+    'short_link': 'short_link',
+    'author': 'author_id',
+    'views': 'views',
+}
+FRAGMENT_KEY = 'api:recipe:{}:{}:{}:{}'
+USER_FLAGS_KEY = 'api:flags:{}'
+AUTHOR_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name', 'avatar'
+)
+
+
+def file_url(field, name):
+    if not name:
+        return None
+    return field.storage.url(name)
+
+
+def author_payloads(author_ids, request):
+    avatar_field = User._meta.get_field('avatar')
+    authors = {}
+    for row in User.objects.filter(id__in=author_ids).values(*AUTHOR_FIELDS):
+        avatar = file_url(avatar_field, row['avatar'])
+        authors[row['id']] = {
+            'email': row['email'],
+            'id': row['id'],
+            'username': row['username'],
+            'first_name': row['first_name'],
+            'last_name': row['last_name'],
+            'is_subscribed': False,
+            'avatar': (request.build_absolute_uri(avatar)
+                       if avatar and request is not None else avatar),
+        }
+    return authors
+
+
+def tag_payloads(recipe_ids):
+    tags = {recipe_id: [] for recipe_id in recipe_ids}
+    for recipe_id, tag_id, name, slug in Recipe.tags.through.objects.filter(
+        recipe_id__in=recipe_ids
+    ).order_by('tag__name').values_list(
+        'recipe_id', 'tag_id', 'tag__name', 'tag__slug'
+    ):
+        tags[recipe_id].append({'id': tag_id, 'name': name, 'slug': slug})
+    return tags
+
+
+def ingredient_payloads(recipe_ids):
+    ingredients = {recipe_id: [] for recipe_id in recipe_ids}
+    for recipe_id, ingredient_id, name, unit, amount in (
+        RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).values_list(
+            'recipe_id', 'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'amount'
+        )
+    ):
+        ingredients[recipe_id].append({
+            'id': ingredient_id,
+            'name': name,
+            'measurement_unit': unit,
+            'amount': amount,
+        })
+    return ingredients
+
+
+def related_payloads(rows, fields, request):
+    """{поле: {id рецепта: значение}} для полей, которые не столбцы."""
+    related = {}
+    if 'tags' in fields:
+        related['tags'] = tag_payloads(rows)
+    if 'ingredients' in fields:
+        related['ingredients'] = ingredient_payloads(rows)
+    if 'author' in fields:
+        authors = author_payloads(
+            {row['author_id'] for row in rows.values()}, request)
+        related['author'] = {
+            pk: authors[row['author_id']] for pk, row in rows.items()}
+    if 'image' in fields:
+        image_field = Recipe._meta.get_field('image')
+        related['image'] = {
+            pk: file_url(image_field, row['image'])
+            for pk, row in rows.items()
+        }
+    return related
+
+
+def recipe_payloads(recipe_ids, request, fields=DEFAULT_FIELDS):
+    """Данные рецептов без флагов текущего пользователя.
+
+    Возвращает список словарей с полями fields в порядке recipe_ids,
+    отсутствующие рецепты пропускаются.
+    """
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return []
+    rows = {
+        row['id']: row
+        for row in Recipe.objects.filter(id__in=recipe_ids).values(
+            'id', *(RECIPE_COLUMNS[field] for field in fields
+                    if field in RECIPE_COLUMNS))
+    }
+    related = related_payloads(rows, fields, request)
+    payloads = []
+    for recipe_id in recipe_ids:
+        row = rows.get(int(recipe_id))
+        if row is None:
+            continue
+        row.update(is_favorited=False, is_in_shopping_cart=False)
+        payloads.append({
+            field: (related[field][row['id']] if field in related
+                    else row[field])
+            for field in fields
+        })
+    return payloads
+
+
+def user_flags_key(user_id):
+    return USER_FLAGS_KEY.format(user_id)
+
+
+def load_user_flags(user):
+    """Множества id избранных рецептов, рецептов в корзине и авторов."""
+    return (
+        set(Favorite.objects.filter(user=user).values_list(
+            'recipe_id', flat=True)),
+        set(ShoppingCart.objects.filter(user=user).values_list(
+            'recipe_id', flat=True)),
+        set(Subscription.objects.filter(user=user).values_list(
+            'author_id', flat=True)),
+    )
+
+
+def apply_user_flags(payloads, user, flags=None):
+    """Проставляет is_favorited, is_in_shopping_cart и is_subscribed.
+
+    flags — множества из load_user_flags, если они уже получены из кэша.
+    Исходные словари не меняются, чтобы их можно было переиспользовать.
+    """
+    if not user.is_authenticated or not payloads:
+        return payloads
+    if flags is None:
+        flags = load_user_flags(user)
+        cache.set(user_flags_key(user.pk), flags,
+                  settings.RESPONSE_CACHE_TIMEOUT)
+    return [with_flags(payload, *flags) for payload in payloads]
+
+
+def with_flags(payload, favorited, in_cart, followed):
+    payload = dict(payload)
+    if 'author' in payload:
+        payload['author'] = {
+            **payload['author'],
+            'is_subscribed': payload['author']['id'] in followed,
+        }
+    if 'is_favorited' in payload:
+        payload['is_favorited'] = payload['id'] in favorited
+    if 'is_in_shopping_cart' in payload:
+        payload['is_in_shopping_cart'] = payload['id'] in in_cart
+    return payload
+
+
+def serialize_recipes(recipe_ids, request):
+    return apply_user_flags(
+        recipe_payloads(recipe_ids, request), request.user)
+
+
+def fragment_key(request, recipe_id, updated_at, fields):
+    # Адрес аватара зависит от хоста запроса.
+    return FRAGMENT_KEY.format(
+        request.get_host(), recipe_id, updated_at.timestamp(),
+        ','.join(fields))
+
+
+def render_recipes(rows, request, fields=DEFAULT_FIELDS):
+    """Данные рецептов по строкам (id, updated_at, views) через кэш."""
+    user = request.user
+    keys = {pk: fragment_key(request, pk, updated_at, fields)
+            for pk, updated_at, _ in rows}
+    flags_key = user_flags_key(user.pk) if user.is_authenticated else None
+    cached = cache.get_many([*keys.values(), flags_key] if flags_key
+                            else list(keys.values()))
+    fragments = {pk: cached[key] for pk, key in keys.items() if key in cached}
+    missing = [pk for pk in keys if pk not in fragments]
+    if missing:
+        fresh = {
+            payload['id']: payload
+            for payload in recipe_payloads(missing, request, fields)
+        }
+        cache.set_many(
+            {keys[pk]: payload for pk, payload in fresh.items()},
+            settings.RECIPE_FRAGMENT_TIMEOUT
+        )
+        fragments.update(fresh)
+    # Просмотры меняются без updated_at и берутся из строки.
+    payloads = [
+        {**fragments[pk], 'views': views} if 'views' in fields
+        else fragments[pk]
+        for pk, _, views in rows if pk in fragments
+    ]
+    return apply_user_flags(payloads, user, cached.get(flags_key))
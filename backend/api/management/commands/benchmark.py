@@ -0,0 +1,131 @@
+import time
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework.throttling import AnonRateThrottle
+
+from api.flat_serializers import serialize_recipes
+from api.renderers import ORJSONRenderer
+from api.serializers import IngredientSerializer, RecipeSerializer
+from api.throttling import TokenBucketThrottle
+from api.views import RecipeViewSet
+from recipes.models import Ingredient, Recipe, User
+
+
+def measure(func, repeat):
+    """Лучшее время одного прогона из repeat, в секундах."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Command(BaseCommand):
+    help = 'Микробенчмарки горячих участков API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('target', choices=['serializers', 'throttle'])
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=50,
+                            help='Сколько рецептов сериализовать')
+        parser.add_argument('--user', help='Email пользователя для флагов')
+        parser.add_argument('--calls', type=int, default=10000,
+                            help='Сколько запросов пропускать через троттлинг')
+
+    def handle(self, *args, **options):
+        getattr(self, f'bench_{options["target"]}')(**options)
+
+    def report(self, name, before, after, items):
+        self.stdout.write(
+            f'{name}: {items} шт., '
+            f'до {before / items * 1e6:.1f} мкс/шт., '
+            f'после {after / items * 1e6:.1f} мкс/шт. '
+            f'(x{before / after:.1f})'
+        )
+
+    def bench_serializers(self, repeat, limit, user, **options):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        if user:
+            try:
+                request.user = User.objects.get(email=user)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь {user} не найден')
+        recipe_ids = list(Recipe.objects.values_list('id', flat=True)[:limit])
+        if not recipe_ids:
+            raise CommandError('Нет рецептов для замера')
+
+        def drf_recipes():
+            recipes = Recipe.objects.filter(
+                id__in=recipe_ids
+            ).select_related('author').prefetch_related(
+                'tags', 'recipe_ingredients__ingredient')
+            JSONRenderer().render(RecipeSerializer(
+                recipes, many=True, context={'request': request}).data)
+
+        def flat_recipes():
+            ORJSONRenderer().render(serialize_recipes(recipe_ids, request))
+
+        self.report(
+            'Рецепты',
+            measure(drf_recipes, repeat),
+            measure(flat_recipes, repeat),
+            len(recipe_ids),
+        )
+
+        ingredients_count = Ingredient.objects.count()
+        if not ingredients_count:
+            return
+
+        def drf_ingredients():
+            JSONRenderer().render(IngredientSerializer(
+                Ingredient.objects.all(), many=True).data)
+
+        def flat_ingredients():
+            ORJSONRenderer().render(list(Ingredient.objects.values(
+                'id', 'name', 'measurement_unit')))
+
+        self.report(
+            'Ингредиенты',
+            measure(drf_ingredients, repeat),
+            measure(flat_ingredients, repeat),
+            ingredients_count,
+        )
+
+    def bench_throttle(self, repeat, calls, **options):
+        request = Request(APIRequestFactory().get('/api/recipes/'))
+        request.user = AnonymousUser()
+        view = RecipeViewSet()
+        view.action = 'list'
+        unlimited = (calls * repeat * 2, 1)
+
+        class DRFThrottle(AnonRateThrottle):
+            rate = f'{calls * repeat * 2}/day'
+
+        def run(throttle_class):
+            def func():
+                throttle = throttle_class()
+                for _ in range(calls):
+                    throttle.allow_request(request, view)
+            return func
+
+        with override_settings(
+                THROTTLE_ENABLED=True,
+                THROTTLE_BUCKETS={'anon': unlimited, 'user': unlimited}):
+            drf = measure(run(DRFThrottle), repeat)
+            for storage in ('memory', 'cache'):
+                with override_settings(THROTTLE_STORAGE=storage):
+                    self.report(
+                        f'Троттлинг ({storage}), AnonRateThrottle -> '
+                        'TokenBucketThrottle',
+                        drf,
+                        measure(run(TokenBucketThrottle), repeat),
+                        calls,
+                    )
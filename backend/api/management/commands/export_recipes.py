@@ -0,0 +1,28 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from api.recipe_io import EXPORT_CHUNK_SIZE, export_recipes
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка всех рецептов в JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='Файл (по умолчанию stdout)')
+        parser.add_argument('--chunk-size', type=int,
+                            default=EXPORT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        output = (open(options['output'], 'wb') if options['output']
+                  else sys.stdout.buffer)
+        count = 0
+        try:
+            for line in export_recipes(options['chunk_size']):
+                output.write(line)
+                count += 1
+        finally:
+            if options['output']:
+                output.close()
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {count}'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from api.recipe_io import IMPORT_BATCH_SIZE, RecipeImporter
+
+
+class Command(BaseCommand):
+    help = 'Загрузка рецептов из JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int,
+                            default=IMPORT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        importer = RecipeImporter(options['batch_size'])
+        with open(options['path'], 'rb') as lines:
+            importer.run(lines)
+        for line_number, message in importer.errors:
+            self.stderr.write(self.style.ERROR(
+                f'Строка {line_number}: {message}'))
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {importer.created}, '
+            f'пропущено: {importer.failed}'
+        ))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_version
+from api.deletion import DELETION_BATCH_SIZE, process_job
+from recipes.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = ('Удаление пользователей и рецептов из очереди пачками. '
+            'Запускается периодически, например из cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=DELETION_BATCH_SIZE)
+        parser.add_argument('--retry', action='store_true',
+                            help='Повторить прерванные и неудачные задания')
+
+    def handle(self, *args, **options):
+        statuses = [DeletionJob.PENDING]
+        if options['retry']:
+            statuses += [DeletionJob.RUNNING, DeletionJob.FAILED]
+        done = failed = 0
+        for job in DeletionJob.objects.filter(status__in=statuses):
+            try:
+                done += process_job(job, options['batch_size'])
+            except Exception as error:
+                failed += 1
+                self.stderr.write(f'{job}: {error}')
+        if done:
+            bump_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено заданий: {done}, с ошибкой: {failed}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from api.sync import TOMBSTONE_BATCH_SIZE, prune_tombstones
+
+
+class Command(BaseCommand):
+    help = ('Удаление записей об удалениях старше SYNC_TOMBSTONE_TTL. '
+            'Запускается периодически, например из cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=TOMBSTONE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        pruned = prune_tombstones(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Удалено записей: {pruned}'))
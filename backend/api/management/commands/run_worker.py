@@ -0,0 +1,29 @@
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.tasks import Worker
+
+
+class Command(BaseCommand):
+    help = ('Выполнение фоновых заданий из очереди в базе данных. '
+            'Останавливается по SIGTERM или SIGINT после текущих заданий.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='Число потоков-исполнителей')
+        parser.add_argument('--poll-interval', type=float,
+                            default=settings.TASKS_POLL_INTERVAL,
+                            help='Пауза при пустой очереди, секунды')
+        parser.add_argument('--burst', action='store_true',
+                            help='Завершиться, когда очередь опустеет')
+
+    def handle(self, *args, **options):
+        worker = Worker(options['concurrency'], options['poll_interval'],
+                        options['burst'])
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+        worker.run()
+        self.stdout.write(self.style.SUCCESS(
+            f'Выполнено заданий: {worker.done}, с ошибкой: {worker.failed}'))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from api.duplicates import sign_recipes
+from recipes.models import Recipe
+
+SIGN_BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ('Подсчет сигнатур MinHash для рецептов без них и отметка '
+            'вероятных дубликатов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=SIGN_BATCH_SIZE)
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать сигнатуры всех рецептов')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.order_by('pk').only('pk', 'name', 'text')
+        if not options['all']:
+            recipes = recipes.filter(signature__isnull=True)
+        signed = flagged = last_id = 0
+        while True:
+            batch = list(
+                recipes.filter(pk__gt=last_id)[:options['batch_size']])
+            if not batch:
+                break
+            flagged += sign_recipes(batch)
+            signed += len(batch)
+            last_id = batch[-1].pk
+        self.stdout.write(self.style.SUCCESS(
+            f'Подписано рецептов: {signed}, вероятных дубликатов: {flagged}'))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_version
+from api.ranking import SCORE_BATCH_SIZE, ScoreUpdater
+
+
+class Command(BaseCommand):
+    help = ('Пересчет рейтингов popular и trending по новым добавлениям '
+            'в избранное и корзину и удалениям из них. Запускается '
+            'периодически, например из cron.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=SCORE_BATCH_SIZE)
+        parser.add_argument('--rebuild', action='store_true',
+                            help='Пересчитать рейтинги с нуля')
+
+    def handle(self, *args, **options):
+        events = ScoreUpdater(options['batch_size']).run(options['rebuild'])
+        if events or options['rebuild']:
+            bump_version()
+        self.stdout.write(self.style.SUCCESS(
+            f'Учтено событий: {events}'))
@@ -0,0 +1,137 @@
+"""Метрики Prometheus.
+
+Включаются настройкой METRICS_ENABLED; без нее функции записи ничего
+не делают, а prometheus_client не импортируется. При нескольких воркерах
+gunicorn нужно задать PROMETHEUS_MULTIPROC_DIR: каждый процесс пишет
+значения в свои mmap-файлы в этом каталоге, а /metrics собирает их вместе.
+
+Запросы к базе считает обертка, которая ставится на каждое соединение
+при его открытии и прибавляет к счетчику текущего запроса из contextvar.
+sync_to_async копирует контекст в свой поток, поэтому учитываются и
+запросы асинхронных представлений.
+"""
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+if settings.METRICS_ENABLED:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        REGISTRY,
+        CollectorRegistry,
+        Counter,
+        Histogram,
+        generate_latest,
+        multiprocess
+    )
+
+    REQUEST_LATENCY = Histogram(
+        'foodgram_request_duration_seconds',
+        'Время обработки запроса',
+        ['view', 'method'],
+    )
+    DB_QUERIES = Histogram(
+        'foodgram_db_queries_per_request',
+        'Запросов к базе на один запрос',
+        ['view', 'method'],
+        buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float('inf')),
+    )
+    RESPONSE_CACHE = Counter(
+        'foodgram_response_cache',
+        'Обращения к кэшу ответов API',
+        ['result'],
+    )
+    EVENTS = Counter(
+        'foodgram_events',
+        'Бизнес-события',
+        ['event'],
+    )
+
+
+def record_cache(result):
+    """result: hit, stale, miss или error (устаревший ответ при сбое базы)."""
+    if settings.METRICS_ENABLED:
+        RESPONSE_CACHE.labels(result).inc()
+
+
+def record_event(event, amount=1):
+    """event: recipe_created, favorite_added, short_link_redirect."""
+    if settings.METRICS_ENABLED:
+        EVENTS.labels(event).inc(amount)
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+
+# Счетчик запроса, который сейчас обрабатывается; None вне запроса.
+QUERIES = ContextVar('metrics_queries', default=None)
+
+
+def count_query(execute, sql, params, many, context):
+    counter = QUERIES.get()
+    if counter is not None:
+        counter.count += 1
+    return execute(sql, params, many, context)
+
+
+def install_counter(sender=None, connection=None, **kwargs):
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+if settings.METRICS_ENABLED:
+    connection_created.connect(install_counter)
+
+
+@contextmanager
+def measure(request):
+    """Замеряет время и число запросов к базе внутри блока."""
+    counter = QueryCounter()
+    token = QUERIES.set(counter)
+    # Соединение, открытое до подключения сигнала, тоже учитывается.
+    install_counter(connection=connections['default'])
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        QUERIES.reset(token)
+    duration = time.perf_counter() - start
+    match = request.resolver_match
+    view = match.view_name if match is not None else 'unmatched'
+    REQUEST_LATENCY.labels(view, request.method).observe(duration)
+    DB_QUERIES.labels(view, request.method).observe(counter.count)
+
+
+def observe(get_response, request):
+    """Выполняет запрос, замеряя время и число запросов к базе."""
+    with measure(request):
+        response = get_response(request)
+    return response
+
+
+async def aobserve(get_response, request):
+    with measure(request):
+        response = await get_response(request)
+    return response
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    # Без токена эндпоинт закрыт: метрики раскрывают устройство API.
+    if (not token or request.META.get('HTTP_AUTHORIZATION')
+            != f'Bearer {token}'):
+        return HttpResponseForbidden()
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,105 @@
+import re
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+from . import metrics, profiling
+from .compression import compress, is_compressible, negotiate
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """Сжимает ответы API размером больше COMPRESSION_MIN_SIZE.
+
+    Если у ответа есть заранее сжатые варианты (атрибут
+    compressed_variants, см. api.cache), они отдаются без повторного
+    сжатия.
+    """
+
+    def process_response(self, request, response):
+        if (not request.path.startswith('/api/')
+                or response.streaming
+                or response.status_code != 200
+                or response.has_header('Content-Encoding')):
+            return response
+        variants = getattr(response, 'compressed_variants', None)
+        if variants is None and not is_compressible(response.content):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        if variants is not None:
+            if encoding not in variants:
+                return response
+            content = variants[encoding]
+        else:
+            content = compress(response.content, encoding)
+        response.content = content
+        response.headers['Content-Length'] = str(len(content))
+        response.headers['Content-Encoding'] = encoding
+        if response.has_header('ETag'):
+            response.headers['ETag'] = re.sub(
+                r'^"', 'W/"', response.headers['ETag'])
+        return response
+
+
+class RateLimitHeadersMiddleware(MiddlewareMixin):
+    """Добавляет заголовки RateLimit-* по состоянию корзины запроса.
+
+    Состояние оставляет api.throttling в атрибуте rate_limit запроса.
+    """
+
+    def process_response(self, request, response):
+        state = getattr(request, 'rate_limit', None)
+        if state is not None:
+            limit, remaining, reset = state
+            response.headers['RateLimit-Limit'] = str(limit)
+            response.headers['RateLimit-Remaining'] = str(remaining)
+            response.headers['RateLimit-Reset'] = str(reset)
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос сотрудника, если он об этом попросил.
+
+    Без PROFILING_ENABLED middleware отключается при старте и ничего
+    не стоит; иначе обычный запрос проверяется на заголовок и параметр.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = profiling.requested_mode(request)
+        if mode is not None and profiling.staff_user(request) is not None:
+            return profiling.profile(self.get_response, request, mode)
+        return self.get_response(request)
+
+
+class MetricsMiddleware:
+    """Время ответа и число запросов к базе по представлениям.
+
+    Работает и в синхронной, и в асинхронной цепочке, чтобы под ASGI
+    не переключать каждый запрос в поток.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return metrics.aobserve(self.get_response, request)
+        return metrics.observe(self.get_response, request)
@@ -1,6 +1,88 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 
 
 class CustomPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = 'limit'
+
+
+class KeysetPagination(BasePagination):
+    """Постраничный вывод по ключу (значение поля сортировки, pk).
+
+    Следующая страница выбирается условием по ключу последней строки
+    предыдущей, а не OFFSET, поэтому стоимость не растет с номером
+    страницы. Общее число строк не считается.
+    """
+
+    page_size = 6
+    page_size_query_param = 'limit'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_query_param = 'ordering'
+    orderings = ()
+
+    def get_ordering(self, request):
+        value = request.query_params.get(self.ordering_query_param, '')
+        field = value.lstrip('-')
+        if field not in self.orderings:
+            raise ValidationError({self.ordering_query_param: [
+                f'Допустимые значения: {", ".join(self.orderings)}']})
+        return field, value.startswith('-')
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(size, self.max_page_size) if size > 0 else self.page_size
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+        try:
+            value, pk = json.loads(base64.urlsafe_b64decode(cursor))
+        except (TypeError, ValueError):
+            raise NotFound('Неверный курсор')
+        return value, pk
+
+    def encode_cursor(self, value, pk):
+        return base64.urlsafe_b64encode(
+            json.dumps([value, pk]).encode()).decode()
+
+    def paginate_queryset(self, queryset, request, view=None):
+        field, descending = self.get_ordering(request)
+        page_size = self.get_page_size(request)
+        prefix, lookup = ('-', 'lt') if descending else ('', 'gt')
+        queryset = queryset.order_by(f'{prefix}{field}', f'{prefix}pk')
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            value, pk = cursor
+            queryset = queryset.filter(
+                Q(**{f'{field}__{lookup}': value})
+                | Q(**{field: value, f'pk__{lookup}': pk})
+            )
+        page = list(queryset[:page_size + 1])
+        self.next_url = None
+        if len(page) > page_size:
+            page = page[:page_size]
+            self.next_url = replace_query_param(
+                request.build_absolute_uri(),
+                self.cursor_query_param,
+                self.encode_cursor(getattr(page[-1], field), page[-1].pk)
+            )
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.next_url, 'results': data})
+
+
+class UserKeysetPagination(KeysetPagination):
+    orderings = ('recipes_count', 'username')
@@ -0,0 +1,209 @@
+"""Профилирование отдельных запросов по требованию сотрудника.
+
+Запрос сотрудника с заголовком X-Profile или параметром ?_profile
+выполняется под профилировщиком:
+- 1 или cprofile — cProfile, снимок выгружается как файл pstats;
+- sample — сэмплирующий профилировщик, который раз в
+  PROFILING_SAMPLE_INTERVAL секунд снимает стек потока запроса; снимок
+  выгружается в формате speedscope. Он меньше искажает время, чем cProfile.
+
+Снимки хранятся в PROFILING_DIR, последние PROFILING_MAX_CAPTURES штук;
+более старые удаляются.
+"""
+import cProfile
+import json
+import os
+import re
+import sys
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = '_profile'
+CAPTURE_ID = re.compile(r'^\d+$')
+# Режим: расширение файла снимка.
+MODES = {
+    '1': '.prof',
+    'cprofile': '.prof',
+    'sample': '.speedscope.json',
+}
+
+
+def requested_mode(request):
+    """Режим профилирования, о котором попросил запрос, или None."""
+    mode = request.META.get(PROFILE_HEADER)
+    if (mode is None
+            and PROFILE_PARAM in request.META.get('QUERY_STRING', '')):
+        mode = request.GET.get(PROFILE_PARAM)
+    return mode if mode in MODES else None
+
+
+def staff_user(request):
+    """Пользователь из сессии или токена, если он сотрудник (как IsAdmin)."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        try:
+            authenticated = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return None
+        user = authenticated[0] if authenticated else None
+    return user if user and user.is_staff else None
+
+
+def capture_dir():
+    return Path(settings.PROFILING_DIR)
+
+
+def captures():
+    """Сохраненные снимки, от новых к старым."""
+    directory = capture_dir()
+    if not directory.is_dir():
+        return []
+    return sorted(
+        (path.stem for path in directory.glob('*.json')
+         if CAPTURE_ID.match(path.stem)),
+        key=int,
+        reverse=True,
+    )
+
+
+def metadata(capture_id):
+    if not CAPTURE_ID.match(capture_id):
+        return None
+    try:
+        return json.loads(
+            (capture_dir() / f'{capture_id}.json').read_text())
+    except FileNotFoundError:
+        return None
+
+
+def capture_path(capture_id):
+    """Файл снимка и его метаданные; None, если снимка нет."""
+    meta = metadata(capture_id)
+    if meta is None:
+        return None, None
+    path = capture_dir() / f'{capture_id}{MODES[meta["mode"]]}'
+    return (path, meta) if path.exists() else (None, None)
+
+
+def save(request, response, mode, duration, write):
+    directory = capture_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    capture_id = str(time.time_ns())
+    write(directory / f'{capture_id}{MODES[mode]}')
+    (directory / f'{capture_id}.json').write_text(json.dumps({
+        'id': capture_id,
+        'mode': mode,
+        'method': request.method,
+        'path': request.get_full_path(),
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'user': request.user.pk if request.user.is_authenticated else None,
+    }))
+    for old in captures()[settings.PROFILING_MAX_CAPTURES:]:
+        for suffix in set(MODES.values()) | {'.json'}:
+            try:
+                os.remove(directory / f'{old}{suffix}')
+            except FileNotFoundError:
+                pass
+    return capture_id
+
+
+class Sampler:
+    """Сэмплирующий профилировщик одного вызова.
+
+    Фоновый поток раз в interval секунд снимает стек потока, в котором
+    выполняется вызов; вес стека — время с предыдущего снимка.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.frames, self.frame_index = [], {}
+        self.samples, self.weights = [], []
+
+    def frame(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        if key not in self.frame_index:
+            self.frame_index[key] = len(self.frames)
+            self.frames.append(
+                {'name': key[0], 'file': key[1], 'line': key[2]})
+        return self.frame_index[key]
+
+    def sample(self, thread_id, base_depth, stop):
+        last = time.perf_counter()
+        while not stop.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(frame.f_code)
+                frame = frame.f_back
+            now = time.perf_counter()
+            self.samples.append(
+                [self.frame(code) for code in reversed(stack)][base_depth:])
+            self.weights.append(now - last)
+            last = now
+
+    def runcall(self, func, *args):
+        # Кадры сервера ниже runcall в стеки не попадают.
+        base_depth, frame = 0, sys._getframe()
+        while frame is not None:
+            base_depth += 1
+            frame = frame.f_back
+        # Иначе поток сэмплера получает GIL не чаще раза в 5 мс.
+        switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(switch_interval, self.interval))
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=self.sample,
+            args=(threading.get_ident(), base_depth, stop),
+            daemon=True,
+        )
+        thread.start()
+        try:
+            return func(*args)
+        finally:
+            stop.set()
+            thread.join()
+            sys.setswitchinterval(switch_interval)
+
+    def speedscope(self, name):
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'exporter': 'foodgram',
+            'name': name,
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': sum(self.weights),
+                'samples': self.samples,
+                'weights': self.weights,
+            }],
+        }
+
+
+def profile(get_response, request, mode):
+    """Выполняет запрос под профилировщиком и сохраняет снимок."""
+    if MODES[mode] == '.prof':
+        profiler = cProfile.Profile()
+    else:
+        profiler = Sampler(settings.PROFILING_SAMPLE_INTERVAL)
+    start = time.perf_counter()
+    response = profiler.runcall(get_response, request)
+    duration = time.perf_counter() - start
+    if MODES[mode] == '.prof':
+        write = profiler.dump_stats
+    else:
+        def write(path):
+            path.write_text(json.dumps(
+                profiler.speedscope(request.get_full_path())))
+    response['X-Profile-Id'] = save(
+        request, response, mode, duration, write)
+    return response
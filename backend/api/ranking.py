@@ -0,0 +1,218 @@
+"""Рейтинги рецептов popular и trending.
+
+popular — сколько раз рецепт сейчас лежит в избранном и корзинах; для
+рецептов с новыми добавлениями и удалениями оно пересчитывается по
+текущему содержимому таблиц, поэтому циклы добавления и удаления его не
+накручивают. trending — сумма весов добавлений, где вес убывает вдвое
+каждые TRENDING_HALF_LIFE_HOURS. Чтобы не пересчитывать старые веса при
+каждом запуске, хранится логарифм суммы exp(rate * (t - EPOCH)): он растет
+вместе с текущим трендом и не зависит от момента пересчета, поэтому новые
+события просто добавляются к нему (log-sum-exp), а сортировка по нему
+дает тот же порядок, что и по затухающей сумме на любой момент времени.
+"""
+import math
+import time
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, F, Q
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import (
+    Favorite,
+    Recipe,
+    RecipeScore,
+    ScoreWatermark,
+    ShoppingCart,
+    SyncTombstone
+)
+
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+SOURCES = {
+    'favorite': Favorite,
+    'shopping_cart': ShoppingCart,
+}
+# Удаления из избранного и корзины читаются по записям для синхронизации.
+REMOVALS = 'removals'
+REMOVAL_KINDS = (SyncTombstone.FAVORITE, SyncTombstone.SHOPPING_CART)
+ORDERINGS = {
+    'popular': F('score__popular').desc(nulls_last=True),
+    'trending': F('score__trending').desc(nulls_last=True),
+    'views': F('views').desc(),
+}
+SCORE_BATCH_SIZE = 5000
+# Сколько секунд ждать строки с пропущенным id: дольше транзакции
+# с добавлением в избранное или корзину не длятся, а id удаленных
+# и откаченных строк так и не появятся.
+LATE_COMMIT_TIMEOUT = 3600
+# Сколько диапазонов пропущенных id хранить; самые старые отбрасываются.
+MAX_PENDING_RANGES = 1000
+
+
+def order_recipes(queryset, ordering):
+    """Сортирует рецепты по рейтингу; без рейтинга — в конец."""
+    if not ordering:
+        return queryset
+    if ordering not in ORDERINGS:
+        raise ValidationError({'ordering': [
+            f'Допустимые значения: {", ".join(ORDERINGS)}']})
+    return queryset.order_by(ORDERINGS[ordering], '-pub_date')
+
+
+def log_add(first, second):
+    if first is None:
+        return second
+    high, low = max(first, second), min(first, second)
+    return high + math.log1p(math.exp(low - high))
+
+
+def events(source):
+    """Строки (id, рецепт, время) таблицы событий source."""
+    if source == REMOVALS:
+        return SyncTombstone.objects.filter(
+            kind__in=REMOVAL_KINDS
+        ).values_list('id', 'object_id', 'changed_at')
+    return SOURCES[source].objects.values_list(
+        'id', 'recipe_id', 'created_at')
+
+
+def split_ranges(ranges, found):
+    """Диапазоны [начало, конец, время] без найденных id."""
+    found = sorted(found)
+    result = []
+    for start, end, seen in ranges:
+        for pk in found[bisect_left(found, start):bisect_right(found, end)]:
+            if pk > start:
+                result.append([start, pk - 1, seen])
+            start = pk + 1
+        if start <= end:
+            result.append([start, end, seen])
+    return result
+
+
+def cap_ranges(ranges):
+    if len(ranges) > MAX_PENDING_RANGES:
+        ranges = sorted(ranges, key=lambda item: item[2])[
+            -MAX_PENDING_RANGES:]
+    return sorted(ranges)
+
+
+class ScoreUpdater:
+    """Учитывает в рейтингах события, появившиеся после прошлого запуска.
+
+    Для каждой таблицы событий хранится последний учтенный id, так что
+    запуск читает только новые строки. id выдаются до фиксации транзакции,
+    поэтому строка с меньшим id может появиться после строк с большими:
+    пропуски в прочитанных id запоминаются диапазонами и перечитываются
+    следующими запусками, пока не истечет LATE_COMMIT_TIMEOUT. rebuild
+    пересчитывает все с нуля по текущему содержимому таблиц.
+    """
+
+    def __init__(self, batch_size=SCORE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.rate = math.log(2) / (settings.TRENDING_HALF_LIFE_HOURS * 3600)
+        self.touched = set()
+        self.trending = {}
+        self.events = 0
+
+    def weight(self, created_at):
+        return self.rate * (created_at - EPOCH).total_seconds()
+
+    def add(self, source, rows):
+        for _, recipe_id, created_at in rows:
+            self.touched.add(recipe_id)
+            if source != REMOVALS:
+                self.trending[recipe_id] = log_add(
+                    self.trending.get(recipe_id), self.weight(created_at))
+        self.events += len(rows)
+
+    def collect_late(self, source, pending):
+        """Учитывает появившиеся строки с пропущенными id."""
+        now = time.time()
+        pending = [
+            [start, end, seen] for start, end, seen in pending
+            if now - seen < LATE_COMMIT_TIMEOUT
+        ]
+        if not pending:
+            return []
+        lookup = Q()
+        for start, end, _ in pending:
+            lookup |= Q(id__range=(start, end))
+        rows = list(events(source).filter(lookup))
+        self.add(source, rows)
+        return split_ranges(pending, [pk for pk, _, _ in rows])
+
+    def collect(self, source):
+        watermark, _ = ScoreWatermark.objects.select_for_update(
+        ).get_or_create(source=source)
+        pending = self.collect_late(source, watermark.pending)
+        now = time.time()
+        # Пропуск перед строкой старше этого уже не заполнится.
+        recent = datetime.now(timezone.utc) - timedelta(
+            seconds=LATE_COMMIT_TIMEOUT)
+        while True:
+            rows = list(events(source).filter(
+                id__gt=watermark.last_id
+            ).order_by('id')[:self.batch_size])
+            if not rows:
+                break
+            self.add(source, rows)
+            for pk, _, created_at in rows:
+                if pk > watermark.last_id + 1 and created_at > recent:
+                    pending.append([watermark.last_id + 1, pk - 1, now])
+                watermark.last_id = pk
+        watermark.pending = cap_ranges(pending)
+        watermark.save(update_fields=['last_id', 'pending'])
+
+    def counts(self, recipe_ids):
+        """Текущее число добавлений в избранное и корзину по рецептам."""
+        popular = dict.fromkeys(recipe_ids, 0)
+        for model in SOURCES.values():
+            for recipe_id, count in model.objects.filter(
+                recipe_id__in=recipe_ids
+            ).order_by().values('recipe_id').annotate(
+                count=Count('pk')
+            ).values_list('recipe_id', 'count'):
+                popular[recipe_id] += count
+        return popular
+
+    def write(self):
+        recipe_ids = sorted(self.touched)
+        for start in range(0, len(recipe_ids), self.batch_size):
+            # Рецепты блокируются до конца транзакции: удаленный между
+            # проверкой и записью рецепт нарушил бы внешний ключ.
+            chunk = list(Recipe.objects.select_for_update(
+                no_key=True
+            ).filter(
+                pk__in=recipe_ids[start:start + self.batch_size]
+            ).values_list('pk', flat=True))
+            popular = self.counts(chunk)
+            scores = {
+                score.recipe_id: score
+                for score in RecipeScore.objects.filter(recipe_id__in=chunk)
+            }
+            for recipe_id in chunk:
+                score = scores.setdefault(
+                    recipe_id, RecipeScore(recipe_id=recipe_id))
+                score.popular = popular[recipe_id]
+                if recipe_id in self.trending:
+                    score.trending = log_add(
+                        score.trending, self.trending[recipe_id])
+            RecipeScore.objects.bulk_create(
+                scores.values(),
+                update_conflicts=True,
+                unique_fields=['recipe'],
+                update_fields=['popular', 'trending'],
+            )
+
+    def run(self, rebuild=False):
+        with transaction.atomic():
+            if rebuild:
+                RecipeScore.objects.all().delete()
+                ScoreWatermark.objects.all().delete()
+            for source in [*SOURCES, REMOVALS]:
+                self.collect(source)
+            self.write()
+        return self.events
@@ -0,0 +1,238 @@
+"""Выгрузка и загрузка рецептов в формате JSONL.
+
+Одна строка — один рецепт:
+{"name": ..., "text": ..., "cooking_time": ..., "author": "<email>",
+ "image": "<путь в MEDIA_ROOT>", "short_link": ..., "pub_date": ...,
+ "tags": ["<slug>", ...],
+ "ingredients": [{"name": ..., "measurement_unit": ..., "amount": ...}]}
+
+Файлы изображений не выгружаются, переносится только ссылка на них.
+"""
+import orjson
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_datetime
+
+from api.constants import (
+    COOKING_TIME_MAX,
+    COOKING_TIME_MIN,
+    RANDOM_HASH_LENGTH_MAX,
+    RECIPE_INGREDIENT_AMOUT_MAX,
+    RECIPE_INGREDIENT_AMOUT_MIN,
+    RECIPE_NAME_MAX_LENGTH
+)
+from api.utils import generate_hash
+from recipes.models import (
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    Tag,
+    User
+)
+from .cache import bump_version
+from .metrics import record_event
+
+EXPORT_CHUNK_SIZE = 1000
+IMPORT_BATCH_SIZE = 1000
+# Сколько ошибок хранить для отчета; считаются все.
+MAX_REPORTED_ERRORS = 1000
+
+
+def export_recipes(chunk_size=EXPORT_CHUNK_SIZE):
+    """Генератор строк JSONL со всеми рецептами.
+
+    Рецепты читаются курсором на стороне сервера пачками по chunk_size,
+    так что потребление памяти не зависит от размера базы.
+    """
+    recipes = Recipe.visible.select_related('author').prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.only('slug', 'name')),
+        Prefetch(
+            'recipe_ingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        ),
+    ).order_by('pk')
+    for recipe in recipes.iterator(chunk_size=chunk_size):
+        yield orjson.dumps({
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'author': recipe.author.email,
+            'image': recipe.image.name or None,
+            'short_link': recipe.short_link,
+            'pub_date': recipe.pub_date,
+            'tags': [tag.slug for tag in recipe.tags.all()],
+            'ingredients': [
+                {
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in recipe.recipe_ingredients.all()
+            ],
+        }) + b'\n'
+
+
+class RecipeImportError(ValueError):
+    pass
+
+
+def in_range(value, minimum, maximum):
+    return (isinstance(value, int) and not isinstance(value, bool)
+            and minimum <= value <= maximum)
+
+
+class RecipeImporter:
+    """Загружает рецепты из строк JSONL пачками.
+
+    Ингредиенты и теги сопоставляются по словарям в памяти, авторы — одним
+    запросом на пачку. Каждая пачка пишется через bulk_create в своей
+    транзакции. Ошибочные строки пропускаются и попадают в errors.
+    """
+
+    def __init__(self, batch_size=IMPORT_BATCH_SIZE):
+        self.batch_size = batch_size
+        self.ingredients = {
+            (name, unit): pk
+            for pk, name, unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit')
+        }
+        self.tags = dict(Tag.objects.values_list('slug', 'pk'))
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, line_number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line_number, message))
+
+    def run(self, lines):
+        batch = []
+        for line_number, line in enumerate(lines, 1):
+            if not line.strip():
+                continue
+            try:
+                batch.append((line_number, orjson.loads(line)))
+            except orjson.JSONDecodeError as error:
+                self.error(line_number, f'Неверный JSON: {error}')
+                continue
+            if len(batch) >= self.batch_size:
+                self.write_batch(batch)
+                batch = []
+        if batch:
+            self.write_batch(batch)
+        if self.created:
+            bump_version()
+            # bulk_create не отправляет post_save.
+            record_event('recipe_created', self.created)
+        return self.created
+
+    def validate_tags(self, slugs):
+        tag_ids = []
+        for slug in slugs or []:
+            if slug not in self.tags:
+                raise RecipeImportError(f'Тег {slug} не найден')
+            tag_ids.append(self.tags[slug])
+        if not tag_ids:
+            raise RecipeImportError('Необходим хотя бы один тег')
+        return tag_ids
+
+    def validate_ingredients(self, items):
+        amounts = {}
+        for item in items or []:
+            key = (item.get('name'), item.get('measurement_unit'))
+            if key not in self.ingredients:
+                raise RecipeImportError(f'Ингредиент {key} не найден')
+            if not in_range(item.get('amount'), RECIPE_INGREDIENT_AMOUT_MIN,
+                            RECIPE_INGREDIENT_AMOUT_MAX):
+                raise RecipeImportError(f'Неверное количество для {key}')
+            if self.ingredients[key] in amounts:
+                raise RecipeImportError('Ингредиенты не должны повторяться')
+            amounts[self.ingredients[key]] = item['amount']
+        if not amounts:
+            raise RecipeImportError('Необходим хотя бы один ингредиент')
+        return amounts
+
+    def validate(self, data, authors):
+        if not isinstance(data, dict):
+            raise RecipeImportError('Ожидается объект')
+        name, text = data.get('name'), data.get('text')
+        if not isinstance(name, str) or not isinstance(text, str):
+            raise RecipeImportError('Нужны name и text')
+        if not name or not text or len(name) > RECIPE_NAME_MAX_LENGTH:
+            raise RecipeImportError('Неверные name или text')
+        if not in_range(data.get('cooking_time'),
+                        COOKING_TIME_MIN, COOKING_TIME_MAX):
+            raise RecipeImportError('Неверное cooking_time')
+        author_id = authors.get(data.get('author'))
+        if author_id is None:
+            raise RecipeImportError(f'Автор {data.get("author")} не найден')
+        tag_ids = self.validate_tags(data.get('tags'))
+        amounts = self.validate_ingredients(data.get('ingredients'))
+        short_link = data.get('short_link')
+        if (not isinstance(short_link, str) or not short_link
+                or len(short_link) > RANDOM_HASH_LENGTH_MAX):
+            short_link = generate_hash()
+        recipe = Recipe(
+            author_id=author_id,
+            name=name,
+            text=text,
+            cooking_time=data['cooking_time'],
+            image=str(data.get('image') or ''),
+            short_link=short_link,
+        )
+        return recipe, parse_datetime(data.get('pub_date') or ''), (
+            tag_ids, amounts)
+
+    def write_batch(self, batch):
+        authors = dict(User.objects.filter(
+            email__in={
+                data['author'] for _, data in batch
+                if isinstance(data, dict)
+                and isinstance(data.get('author'), str)
+            }
+        ).values_list('email', 'pk'))
+        recipes, pub_dates, relations = [], [], []
+        for line_number, data in batch:
+            try:
+                recipe, pub_date, related = self.validate(data, authors)
+            except (AttributeError, TypeError, ValueError) as error:
+                self.error(line_number, str(error))
+                continue
+            recipes.append(recipe)
+            pub_dates.append(pub_date)
+            relations.append(related)
+        if not recipes:
+            return
+        taken = set(Recipe.objects.filter(
+            short_link__in=[recipe.short_link for recipe in recipes]
+        ).values_list('short_link', flat=True))
+        for recipe in recipes:
+            if recipe.short_link in taken:
+                recipe.short_link = generate_hash()
+            taken.add(recipe.short_link)
+        with transaction.atomic():
+            Recipe.objects.bulk_create(recipes)
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe_id=recipe.pk,
+                    ingredient_id=ingredient_id,
+                    amount=amount
+                )
+                for recipe, (_, amounts) in zip(recipes, relations)
+                for ingredient_id, amount in amounts.items()
+            ])
+            Recipe.tags.through.objects.bulk_create([
+                Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag_id)
+                for recipe, (tag_ids, _) in zip(recipes, relations)
+                for tag_id in set(tag_ids)
+            ])
+            # auto_now_add перезаписывает pub_date при вставке.
+            dated = []
+            for recipe, pub_date in zip(recipes, pub_dates):
+                if pub_date is not None:
+                    recipe.pub_date = pub_date
+                    dated.append(recipe)
+            if dated:
+                Recipe.objects.bulk_update(dated, ['pub_date'])
+        self.created += len(recipes)
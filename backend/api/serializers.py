@@ -8,25 +8,33 @@ from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer
 from djoser.serializers import UserSerializer as BaseUserSerializer
 from rest_framework import serializers
 
+from api import duplicates, uploads
 from api.constants import (
     COOKING_TIME_MAX,
     COOKING_TIME_MIN,
+    MEAL_PLAN_BULK_MAX,
+    MEAL_PLAN_SERVINGS_MAX,
+    MEAL_PLAN_SERVINGS_MIN,
     RECIPE_INGREDIENT_AMOUT_MAX,
     RECIPE_INGREDIENT_AMOUT_MIN
 )
 from recipes.models import (
     Ingredient,
     LinkMapped,
+    MealPlanEntry,
     Recipe,
     RecipeIngredient,
     Subscription,
-    Tag
+    Tag,
+    Upload
 )
 
 User = get_user_model()
 
 
 class Base64ImageField(serializers.ImageField):
+    """Изображение в base64 или токен загрузки из /api/uploads/."""
+
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
             format, imgstr = data.split(';base64,')
@@ -36,9 +44,36 @@ class Base64ImageField(serializers.ImageField):
                 base64.b64decode(imgstr),
                 name=f'{uuid.uuid4()}.{ext}'
             )
+        elif isinstance(data, str):
+            # Изображение проверено при загрузке; файл открывается только
+            # в UploadsMixin.save, поэтому ошибка в других полях ничего
+            # не оставляет открытым, а загрузку можно отправить повторно.
+            return uploads.find_upload(data, self.context['request'].user)
         return super().to_internal_value(data)
 
 
+class UploadsMixin:
+    """Подставляет файлы загрузок при сохранении и удаляет загрузки."""
+
+    def save(self, **kwargs):
+        used = {
+            name: value for name, value in self.validated_data.items()
+            if isinstance(value, Upload)
+        }
+        files = {
+            name: uploads.open_upload(upload)
+            for name, upload in used.items()
+        }
+        try:
+            instance = super().save(**{**files, **kwargs})
+        finally:
+            for file in files.values():
+                file.close()
+        for upload in used.values():
+            uploads.discard(upload)
+        return instance
+
+
 class PasswordSerializer(serializers.Serializer):
     current_password = serializers.CharField(required=True)
     new_password = serializers.CharField(required=True)
@@ -50,7 +85,7 @@ class UserCreateSerializer(BaseUserCreateSerializer):
         fields = ['email', 'username', 'password', 'first_name', 'last_name']
 
 
-class UserSerializer(BaseUserSerializer):
+class UserSerializer(UploadsMixin, BaseUserSerializer):
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField(required=False, allow_null=True)
 
@@ -68,9 +103,13 @@ class UserSerializer(BaseUserSerializer):
         return obj.avatar.url
 
     def get_is_subscribed(self, obj):
+        # В списке пользователей флаг уже посчитан одним подзапросом.
+        subscribed = getattr(obj, 'subscribed', None)
+        if subscribed is not None:
+            return subscribed
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.follower.filter(user=request.user).exists()
+            return obj.following.filter(user=request.user).exists()
         return False
 
 
@@ -98,6 +137,12 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         model = RecipeIngredient
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        # В ответе id — это id ингредиента, а не строки RecipeIngredient.
+        representation['id'] = instance.ingredient_id
+        return representation
+
 
 class RecipeSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
@@ -138,7 +183,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         return False
 
 
-class RecipeCreateSerializer(serializers.ModelSerializer):
+class RecipeCreateSerializer(UploadsMixin, serializers.ModelSerializer):
     tags = serializers.PrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all()
@@ -170,6 +215,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
 
         recipe.tags.set(tags)
         self._create_or_update_ingredients(recipe, ingredients_data)
+        self._store_signature(recipe)
         return recipe
 
     def update(self, instance, validated_data):
@@ -183,8 +229,15 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
         instance.save()
+        self._store_signature(instance)
         return instance
 
+    def _store_signature(self, recipe):
+        if self.signature is not None:
+            signature, duplicate = self.signature
+            duplicates.store({recipe.pk: signature},
+                             {recipe.pk: duplicate} if duplicate else {})
+
     def _create_or_update_ingredients(self, recipe, ingredients_data):
         """Создает или обновляет ингредиенты рецепта."""
         ingredients = [
@@ -212,6 +265,22 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError('Необходим хотя бы один тег.')
         return value
 
+    def validate(self, attrs):
+        """Ищет почти-дубликаты среди уже опубликованных рецептов."""
+        recipe = self.instance
+        if 'ingredients' in attrs:
+            ingredient_ids = [item['id'].id for item in attrs['ingredients']]
+        else:
+            ingredient_ids = recipe.recipe_ingredients.values_list(
+                'ingredient_id', flat=True)
+        self.signature = duplicates.check(
+            attrs.get('name', getattr(recipe, 'name', '')),
+            attrs.get('text', getattr(recipe, 'text', '')),
+            ingredient_ids,
+            getattr(recipe, 'pk', None)
+        )
+        return attrs
+
     def to_representation(self, instance):
         return RecipeSerializer(instance, context=self.context).data
 
@@ -263,10 +332,10 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         return True  # Так как это подписка, всегда True
 
     def get_recipes_count(self, obj):
-        return obj.author.recipes.count()
+        return obj.author.recipes.filter(is_hidden=False).count()
 
     def get_recipes(self, obj):
-        recipes = obj.author.recipes.all()
+        recipes = obj.author.recipes.filter(is_hidden=False)
         limit = self.context.get('recipes_limit')
         if limit:
             try:
@@ -282,3 +351,66 @@ class SubscriptionSerializer(serializers.ModelSerializer):
                 return request.build_absolute_uri(obj.author.avatar.url)
             return obj.author.avatar.url
         return None
+
+
+class MealPlanListSerializer(serializers.ListSerializer):
+    """Пакетное добавление в план: рецепты проверяются одним запросом,
+    записи создаются одним bulk_create."""
+
+    def validate(self, attrs):
+        if len(attrs) > MEAL_PLAN_BULK_MAX:
+            raise serializers.ValidationError(
+                f'Не больше {MEAL_PLAN_BULK_MAX} записей за раз')
+        recipe_ids = {item['recipe_id'] for item in attrs}
+        missing = recipe_ids - set(Recipe.visible.filter(
+            id__in=recipe_ids).values_list('id', flat=True))
+        if missing:
+            raise serializers.ValidationError(
+                f'Рецепты не найдены: {sorted(missing)}')
+        return attrs
+
+    def create(self, validated_data):
+        return MealPlanEntry.objects.bulk_create(
+            MealPlanEntry(**item) for item in validated_data)
+
+
+class MealPlanEntrySerializer(serializers.ModelSerializer):
+    recipe = serializers.IntegerField(source='recipe_id')
+    servings = serializers.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        min_value=MEAL_PLAN_SERVINGS_MIN,
+        max_value=MEAL_PLAN_SERVINGS_MAX,
+        default=1
+    )
+
+    class Meta:
+        model = MealPlanEntry
+        fields = ('id', 'recipe', 'day', 'servings')
+        list_serializer_class = MealPlanListSerializer
+
+    def to_representation(self, instance):
+        representation = super().to_representation(instance)
+        representation['recipe'] = ShortRecipeSerializer(
+            instance.recipe).data
+        return representation
+
+
+class MealPlanRangeSerializer(serializers.Serializer):
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    include_cart = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        if ('start' in attrs and 'end' in attrs
+                and attrs['start'] > attrs['end']):
+            raise serializers.ValidationError(
+                'Начало периода позже его конца')
+        return attrs
+
+    def filter(self, entries):
+        if 'start' in self.validated_data:
+            entries = entries.filter(day__gte=self.validated_data['start'])
+        if 'end' in self.validated_data:
+            entries = entries.filter(day__lte=self.validated_data['end'])
+        return entries
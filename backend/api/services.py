@@ -1,12 +1,24 @@
 from django.conf import settings
 from django.core.mail import send_mail
 
+from .tasks import task
 
-def send_confirmation_email(email, confirmation_code):
+
+@task
+def send_email(subject, message, recipient_list):
     send_mail(
+        subject,
+        message,
+        settings.DEFAULT_FROM_EMAIL,
+        recipient_list,
+        fail_silently=False,
+    )
+
+
+def send_confirmation_email(email, confirmation_code):
+    # Письмо отправляет run_worker, задержка SMTP не попадает в ответ.
+    send_email.delay(
         'Confirmation code',
         f'Your code: {confirmation_code}',
-        settings.DEFAULT_FROM_EMAIL,
         [email],
-        fail_silently=False,
     )
@@ -0,0 +1,162 @@
+"""Сведение списка покупок с приведением единиц измерения.
+
+Количества одного продукта в разных единицах («г», «кг», «ст. л.»)
+переводятся в базовую единицу своей величины (масса — граммы, объем —
+миллилитры, штуки) и складываются. Если продукт встречается и в единицах
+массы, и в единицах объема, а его плотность известна, объем переводится
+в массу; продукт только в единицах объема остается в миллилитрах. Вся
+корзина обрабатывается одним векторным проходом по массивам NumPy, циклы
+на Python идут только по уникальным единицам и продуктам.
+"""
+import numpy as np
+from django.db.models import F, Sum
+
+MASS, VOLUME, COUNT, TASTE = range(4)
+# Единицы, которые нельзя перевести в другие, получают свои коды от OTHER.
+OTHER = 4
+
+TO_TASTE = 'по вкусу'
+
+# Единица: (величина, сколько базовых единиц в ней).
+UNITS = {
+    'мг': (MASS, 0.001),
+    'г': (MASS, 1),
+    'кг': (MASS, 1000),
+    'мл': (VOLUME, 1),
+    'л': (VOLUME, 1000),
+    'капля': (VOLUME, 0.05),
+    'ч. л.': (VOLUME, 5),
+    'ст. л.': (VOLUME, 15),
+    'стакан': (VOLUME, 250),
+    'шт.': (COUNT, 1),
+    TO_TASTE: (TASTE, 0),
+}
+
+# Плотность, г/мл: для этих продуктов объем переводится в массу.
+DENSITY = {
+    'вода': 1.0,
+    'молоко': 1.03,
+    'сливки': 1.0,
+    'кефир': 1.03,
+    'мед': 1.4,
+    'мука': 0.53,
+    'пшеничная мука': 0.53,
+    'сахар': 0.85,
+    'сахарный песок': 0.85,
+    'соль': 1.2,
+    'растительное масло': 0.92,
+    'подсолнечное масло': 0.92,
+    'оливковое масло': 0.91,
+    'рис': 0.85,
+    'крахмал': 0.65,
+}
+
+# Крупные единицы для вывода: (величина, порог, единица, делитель).
+DISPLAY_UNITS = {
+    MASS: ((1000, 'кг', 1000), (0, 'г', 1)),
+    VOLUME: ((1000, 'л', 1000), (0, 'мл', 1)),
+    COUNT: ((0, 'шт.', 1),),
+}
+
+
+INGREDIENT = 'recipe__recipe_ingredients__'
+
+
+def ingredient_totals(entries, multiplier=None):
+    """Строки (название, единица, количество) для набора записей с рецептом.
+
+    Σ amount × multiplier считается одним агрегатом в базе; multiplier —
+    имя поля записи с множителем, без него каждый рецепт учитывается один
+    раз. Так список покупок и план питания считаются одинаково.
+    """
+    amount = F(f'{INGREDIENT}amount')
+    if multiplier:
+        amount = amount * F(multiplier)
+    entries = entries.filter(**{
+        f'{INGREDIENT}isnull': False, 'recipe__is_hidden': False})
+    return entries.order_by().values(
+        f'{INGREDIENT}ingredient__name',
+        f'{INGREDIENT}ingredient__measurement_unit',
+    ).annotate(total_amount=Sum(amount)).values_list(
+        f'{INGREDIENT}ingredient__name',
+        f'{INGREDIENT}ingredient__measurement_unit',
+        'total_amount',
+    )
+
+
+def format_amount(value):
+    if float(value).is_integer():
+        return str(int(value))
+    return f'{value:.2f}'.rstrip('0').rstrip('.')
+
+
+def display(dimension, unit, total):
+    """Единица и количество для вывода человеку."""
+    if dimension == TASTE:
+        return TO_TASTE, None
+    for threshold, label, divider in DISPLAY_UNITS.get(
+            dimension, ((0, unit, 1),)):
+        if total >= threshold:
+            return label, format_amount(total / divider)
+
+
+def aggregate(rows, density=DENSITY):
+    """Сводит строки (название, единица, количество) по продуктам.
+
+    Возвращает отсортированный список (название, единица, количество),
+    где количество — строка или None для «по вкусу».
+    """
+    if not rows:
+        return []
+    names, units, amounts = zip(*rows)
+    names = np.array(names, dtype=object)
+    amounts = np.array(amounts, dtype=np.float64)
+
+    unique_units, unit_codes = np.unique(
+        np.array(units, dtype=object), return_inverse=True)
+    dimensions = np.empty(len(unique_units), dtype=np.int64)
+    factors = np.empty(len(unique_units), dtype=np.float64)
+    other_units = {}
+    for code, unit in enumerate(unique_units):
+        dimension, factor = UNITS.get(unit, (None, 1))
+        if dimension is None:
+            dimension = other_units.setdefault(
+                unit, OTHER + len(other_units))
+        dimensions[code], factors[code] = dimension, factor
+    row_dimensions = dimensions[unit_codes]
+    row_amounts = amounts * factors[unit_codes]
+
+    unique_names, name_codes = np.unique(names, return_inverse=True)
+    densities = np.array(
+        [density.get(name.lower(), 0.0) for name in unique_names],
+        dtype=np.float64
+    )[name_codes]
+    # Объем переводится в массу, только чтобы сложить его с массой.
+    has_mass = np.zeros(len(unique_names), dtype=bool)
+    has_mass[name_codes[row_dimensions == MASS]] = True
+    to_mass = ((row_dimensions == VOLUME) & (densities > 0)
+               & has_mass[name_codes])
+    row_amounts[to_mass] *= densities[to_mass]
+    row_dimensions[to_mass] = MASS
+
+    dimensions_count = OTHER + len(other_units)
+    groups, group_codes = np.unique(
+        name_codes * dimensions_count + row_dimensions, return_inverse=True)
+    totals = np.bincount(group_codes, weights=row_amounts)
+
+    labels = {code: unit for unit, code in other_units.items()}
+    result = []
+    for group, total in zip(groups.tolist(), totals.tolist()):
+        name_code, dimension = divmod(group, dimensions_count)
+        unit, amount = display(dimension, labels.get(dimension), total)
+        result.append((unique_names[name_code], unit, amount))
+    return result
+
+
+def render(items):
+    """Текст списка покупок, по строке на продукт."""
+    return '\n'.join(
+        f'{name} ({unit})' if amount is None
+        else f'{name} ({unit}) - {amount}'
+        for name, unit, amount in items
+    )
@@ -0,0 +1,129 @@
+"""Сброс версий кэша API при изменении данных."""
+from django.core.cache import cache
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete
+)
+from django.dispatch import receiver
+from django.utils import timezone
+
+from recipes.models import (
+    Favorite,
+    Ingredient,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscription,
+    Tag,
+    User
+)
+from .cache import CATALOG_VERSION_KEY, bump_version, short_link_key
+from .conditional import bump_flags
+from .flat_serializers import user_flags_key
+from .metrics import record_event
+from .sync import tombstone
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(post_delete, sender=User)
+def recipes_changed(sender, **kwargs):
+    bump_version()
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def catalog_changed(sender, **kwargs):
+    bump_version(CATALOG_VERSION_KEY)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(pre_delete, sender=Tag)
+def tag_changed(sender, instance, created=False, **kwargs):
+    if not created:
+        touch_recipes(tags=instance)
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(recipe_ingredients__ingredient=instance)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(sender, instance, action, reverse, pk_set,
+                        **kwargs):
+    if action.startswith('post_'):
+        bump_version()
+        if not reverse:
+            touch_recipes(pk=instance.pk)
+        elif pk_set:
+            touch_recipes(pk__in=pk_set)
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, update_fields=None, **kwargs):
+    # Вход пользователя обновляет только last_login, он в ответы не попадает.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        bump_version()
+        touch_recipes(author=instance)
+
+
+def touch_recipes(**lookups):
+    """Обновляет updated_at рецептов, чьи данные в ответах изменились."""
+    Recipe.objects.filter(**lookups).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredients_changed(sender, instance, **kwargs):
+    touch_recipes(pk=instance.recipe_id)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Subscription)
+def user_flags_changed(sender, instance, **kwargs):
+    bump_flags(instance.user_id)
+    cache.delete(user_flags_key(instance.user_id))
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+def user_list_item_deleted(sender, instance, origin=None, **kwargs):
+    # Вместе с пользователем удаляются и его записи для синхронизации.
+    if isinstance(origin, User) and origin.pk == instance.user_id:
+        return
+    tombstone(instance).save()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(sender, created, **kwargs):
+    if created:
+        record_event('recipe_created')
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_added(sender, created, **kwargs):
+    if created:
+        record_event('favorite_added')
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    if instance.short_link:
+        cache.delete(short_link_key(instance.short_link))
@@ -0,0 +1,161 @@
+"""Синхронизация избранного, списка покупок и подписок по изменениям.
+
+GET /api/sync/ без токена отдает все три списка целиком и токен. С
+?token=... отдаются только изменения после выдачи токена: added — рецепты
+и авторы, добавленные с тех пор (по created_at), removed — id удаленных
+(по SyncTombstone). Обе выборки идут по индексам (user, created_at)
+и (user, changed_at), а не по всему списку пользователя.
+
+Токен подписан и привязан к пользователю. Следующий токен отсчитывается
+с запасом OVERLAP, чтобы не потерять строки из транзакций, которые
+зафиксировались позже ответа, поэтому изменения на границе могут прийти
+повторно — клиент применяет их идемпотентно. Записи об удалениях хранятся
+SYNC_TOMBSTONE_TTL; по более старому токену отдается полное состояние
+с reset: true, и клиент заменяет им свои списки.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from recipes.models import (
+    Favorite,
+    Recipe,
+    ShoppingCart,
+    Subscription,
+    SyncTombstone,
+    User
+)
+from .serializers import ShortRecipeSerializer
+
+TOKEN_SALT = 'api.sync'
+OVERLAP = timedelta(seconds=10)
+# Списки ответа: ключ, вид записи об удалении и обратная связь
+# рецепта или автора со строками списка.
+LISTS = (
+    ('favorites', SyncTombstone.FAVORITE, 'favorites'),
+    ('shopping_cart', SyncTombstone.SHOPPING_CART, 'shopping_cart'),
+    ('subscriptions', SyncTombstone.SUBSCRIPTION, 'following'),
+)
+KINDS = {
+    Favorite: (SyncTombstone.FAVORITE, 'recipe_id'),
+    ShoppingCart: (SyncTombstone.SHOPPING_CART, 'recipe_id'),
+    Subscription: (SyncTombstone.SUBSCRIPTION, 'author_id'),
+}
+AUTHOR_FIELDS = ('id', 'username', 'first_name', 'last_name')
+TOMBSTONE_BATCH_SIZE = 1000
+
+
+def make_token(user, since):
+    return signing.dumps(
+        {'u': user.pk, 't': since.isoformat()}, salt=TOKEN_SALT)
+
+
+def read_token(token, user):
+    """Момент, с которого отдаются изменения; None — полное состояние."""
+    if not token:
+        return None
+    try:
+        data = signing.loads(token, salt=TOKEN_SALT)
+        since = parse_datetime(data['t'])
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        since = None
+    if since is None or data.get('u') != user.pk:
+        raise ValidationError({'token': ['Недействительный токен.']})
+    return since
+
+
+def tombstone(instance):
+    kind, field = KINDS[type(instance)]
+    return SyncTombstone(
+        user_id=instance.user_id, kind=kind,
+        object_id=getattr(instance, field))
+
+
+def record_hidden(recipes, author=None):
+    """Записи об удалении для списков со скрываемыми рецептами и автором.
+
+    Строки списков остаются до фоновой очистки (api.deletion), но
+    в синхронизации пропадают сразу.
+    """
+    sources = [(Favorite, {'recipe__in': recipes}),
+               (ShoppingCart, {'recipe__in': recipes})]
+    if author is not None:
+        sources.append((Subscription, {'author': author}))
+    rows = []
+    for model, lookups in sources:
+        kind, field = KINDS[model]
+        rows.extend(
+            SyncTombstone(user_id=user_id, kind=kind, object_id=object_id)
+            for user_id, object_id in model.objects.filter(
+                **lookups).values_list('user_id', field).iterator()
+        )
+    SyncTombstone.objects.bulk_create(rows, batch_size=TOMBSTONE_BATCH_SIZE)
+
+
+def changed(queryset, related, user, since):
+    lookups = {f'{related}__user': user}
+    if since is not None:
+        lookups[f'{related}__created_at__gte'] = since
+    return queryset.filter(**lookups).order_by(f'{related}__created_at')
+
+
+def added(related, user, since, request):
+    if related == 'following':
+        return list(changed(
+            User.objects.filter(is_active=True), related, user, since
+        ).values(*AUTHOR_FIELDS))
+    return ShortRecipeSerializer(
+        changed(Recipe.visible.all(), related, user, since),
+        many=True, context={'request': request}
+    ).data
+
+
+def removed(user, since):
+    # dict вместо set сохраняет порядок удалений.
+    result = defaultdict(dict)
+    rows = SyncTombstone.objects.filter(
+        user=user, changed_at__gte=since
+    ).order_by('changed_at').values_list('kind', 'object_id')
+    for kind, object_id in rows:
+        result[kind][object_id] = None
+    return result
+
+
+def changes(request, token):
+    """Ответ синхронизации для пользователя запроса."""
+    user = request.user
+    now = timezone.now()
+    since = read_token(token, user)
+    reset = since is None or since < now - timedelta(
+        seconds=settings.SYNC_TOMBSTONE_TTL)
+    if reset:
+        since = None
+    gone = {} if reset else removed(user, since)
+    response = {'reset': reset, 'token': make_token(user, now - OVERLAP)}
+    for key, kind, related in LISTS:
+        items = added(related, user, since, request)
+        ids = {item['id'] for item in items}
+        response[key] = {
+            'added': items,
+            'removed': [pk for pk in gone.get(kind, ()) if pk not in ids],
+        }
+    return response
+
+
+def prune_tombstones(batch_size=TOMBSTONE_BATCH_SIZE):
+    """Удаляет просроченные записи об удалениях; возвращает их число."""
+    expired = SyncTombstone.objects.filter(
+        changed_at__lt=timezone.now() - timedelta(
+            seconds=settings.SYNC_TOMBSTONE_TTL)
+    ).order_by('pk').values_list('pk', flat=True)
+    pruned = 0
+    while True:
+        pks = list(expired[:batch_size])
+        if not pks:
+            return pruned
+        pruned += SyncTombstone.objects.filter(pk__in=pks).delete()[0]
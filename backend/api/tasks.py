@@ -0,0 +1,218 @@
+"""Фоновые задания в таблице базы данных.
+
+Функция, обернутая в @task, ставится в очередь вызовом .delay(...):
+создается строка Task с путем к функции и аргументами в JSON. Команда
+run_worker забирает готовые задания через SELECT ... FOR UPDATE SKIP
+LOCKED, поэтому несколько воркеров не получат одно и то же задание,
+и сохраняет результат. Упавшее задание повторяется с экспоненциально
+растущей задержкой, пока не исчерпает max_attempts. Задание, которое
+выполняется дольше TASKS_TIMEOUT (например, его воркер упал), снова
+отдается воркерам, а после max_attempts таких попыток помечается
+упавшим. Номер попытки, увеличенный при взятии, служит меткой владельца:
+итог записывается, только если задание все еще выполняется в этой
+попытке, поэтому воркер, у которого задание забрали по таймауту, не
+перезапишет результат новой попытки. При TASKS_EAGER задание
+выполняется сразу в вызвавшем процессе, а его ошибка пробрасывается
+вызывающему — для тестов и разработки.
+"""
+import json
+import logging
+import random
+import threading
+import traceback
+from datetime import timedelta
+from functools import update_wrapper
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from recipes.models import Task
+
+logger = logging.getLogger(__name__)
+
+
+class TaskFunction:
+    """Функция, которую можно вызвать напрямую или поставить в очередь."""
+
+    def __init__(self, func, max_attempts=None):
+        update_wrapper(self, func)
+        self.func = func
+        self.name = f'{func.__module__}.{func.__name__}'
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Ставит вызов в очередь; аргументы должны сериализоваться в JSON."""
+        now = timezone.now()
+        eager = settings.TASKS_EAGER
+        task = Task.objects.create(
+            name=self.name,
+            args=list(args),
+            kwargs=kwargs,
+            max_attempts=self.max_attempts or settings.TASKS_MAX_ATTEMPTS,
+            run_at=now,
+            status=Task.RUNNING if eager else Task.QUEUED,
+            attempts=int(eager),
+            started_at=now if eager else None,
+        )
+        if eager:
+            execute(task, propagate=True)
+            task.refresh_from_db()
+        return task
+
+
+def task(func=None, *, max_attempts=None):
+    """Декоратор фонового задания: @task или @task(max_attempts=...)."""
+    def decorator(func):
+        return TaskFunction(func, max_attempts)
+
+    return decorator(func) if func is not None else decorator
+
+
+def backoff(attempts):
+    """Задержка перед следующей попыткой, со случайным разбросом."""
+    delay = min(settings.TASKS_RETRY_BACKOFF * 2 ** (attempts - 1),
+                settings.TASKS_RETRY_BACKOFF_MAX)
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def json_result(result):
+    try:
+        json.dumps(result, cls=DjangoJSONEncoder)
+    except (TypeError, ValueError):
+        return repr(result)
+    return result
+
+
+def fail_abandoned(stale, now):
+    """Помечает упавшими брошенные задания, исчерпавшие попытки."""
+    failed = Task.objects.filter(
+        status=Task.RUNNING, started_at__lt=stale,
+        attempts__gte=F('max_attempts')
+    ).update(
+        status=Task.FAILED,
+        error=(f'Не завершилось за {settings.TASKS_TIMEOUT} с '
+               'в последней попытке.'),
+        finished_at=now,
+    )
+    if failed:
+        logger.error('Брошенных заданий без попыток: %s', failed)
+
+
+def claim(limit=1):
+    """Забирает до limit готовых заданий и помечает их выполняемыми."""
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.TASKS_TIMEOUT)
+    fail_abandoned(stale, now)
+    with transaction.atomic():
+        tasks = list(Task.objects.select_for_update(skip_locked=True).filter(
+            Q(status=Task.QUEUED, run_at__lte=now)
+            | Q(status=Task.RUNNING, started_at__lt=stale,
+                attempts__lt=F('max_attempts'))
+        ).order_by('run_at', 'id')[:limit])
+        if not tasks:
+            return []
+        Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+            status=Task.RUNNING, started_at=now, attempts=F('attempts') + 1)
+    for task in tasks:
+        task.status, task.started_at = Task.RUNNING, now
+        task.attempts += 1
+    return tasks
+
+
+def save_outcome(task, **fields):
+    """Записывает итог попытки, если задание не отдано другому воркеру."""
+    updated = Task.objects.filter(
+        pk=task.pk, status=Task.RUNNING, attempts=task.attempts
+    ).update(**fields)
+    if not updated:
+        logger.warning('Задание %s #%s взято повторно, итог попытки %s '
+                       'отброшен', task.name, task.pk, task.attempts)
+
+
+def execute(task, propagate=False):
+    """Выполняет взятое задание и записывает результат или ошибку."""
+    try:
+        result = import_string(task.name)(*task.args, **task.kwargs)
+    except Exception:
+        # В режиме eager ошибка уходит вызывающему, повторов нет.
+        retry = not propagate and task.attempts < task.max_attempts
+        save_outcome(
+            task,
+            status=Task.QUEUED if retry else Task.FAILED,
+            run_at=(timezone.now() + backoff(task.attempts) if retry
+                    else task.run_at),
+            error=traceback.format_exc(),
+            finished_at=None if retry else timezone.now(),
+        )
+        if propagate:
+            raise
+        logger.exception('Задание %s #%s не выполнено', task.name, task.pk)
+        return False
+    save_outcome(
+        task,
+        status=Task.DONE,
+        result=json_result(result),
+        error='',
+        finished_at=timezone.now(),
+    )
+    return True
+
+
+class Worker:
+    """Выполняет задания в concurrency потоках до вызова stop().
+
+    В режиме burst поток завершается, как только очередь опустела.
+    """
+
+    def __init__(self, concurrency=1, poll_interval=1.0, burst=False):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.burst = burst
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+        self.done = 0
+        self.failed = 0
+
+    def stop(self, *args):
+        self.stopping.set()
+
+    def run(self):
+        threads = [
+            threading.Thread(target=self.loop, name=f'task-worker-{number}')
+            for number in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            # join с таймаутом, чтобы главный поток получал сигналы.
+            while thread.is_alive():
+                thread.join(0.5)
+
+    def loop(self):
+        try:
+            while not self.stopping.is_set():
+                close_old_connections()
+                try:
+                    tasks = claim()
+                except DatabaseError:
+                    logger.exception('Не удалось получить задания')
+                    tasks = None
+                if not tasks:
+                    if self.burst and tasks is not None:
+                        return
+                    self.stopping.wait(self.poll_interval)
+                    continue
+                for task in tasks:
+                    succeeded = execute(task)
+                    with self.lock:
+                        self.done += succeeded
+                        self.failed += not succeeded
+        finally:
+            close_old_connections()
@@ -0,0 +1,227 @@
+"""Ограничение частоты запросов по алгоритму token bucket.
+
+У каждого клиента (пользователя или IP для анонимов) есть корзина на
+capacity токенов, которая пополняется со скоростью refill токенов
+в секунду. Запрос списывает столько токенов, сколько стоит его действие
+(throttle_costs у представления, по умолчанию 1): дорогие эндпоинты
+расходуют лимит быстрее дешевых. Сотрудники не ограничиваются.
+
+IP клиента берется из X-Forwarded-For с учетом NUM_PROXIES DRF: nginx
+дописывает в заголовок адрес, с которого пришел запрос, и берется именно
+он, поэтому подставленный клиентом заголовок не дает новой корзины.
+
+Состояние корзин хранится в памяти процесса (THROTTLE_STORAGE=memory)
+или в общем кэше (THROTTLE_STORAGE=cache), чтобы лимит был один на все
+воркеры. Обновление в кэше не атомарно: при одновременных запросах
+одного клиента лимит может быть превышен на несколько токенов.
+"""
+import math
+import threading
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+# Сколько корзин держать в памяти до очистки полных и как часто
+# (в секундах) можно чистить, если почти все корзины заняты.
+MEMORY_MAX_KEYS = 100000
+MEMORY_PRUNE_INTERVAL = 10
+
+
+class MemoryBuckets:
+    def __init__(self, max_keys=MEMORY_MAX_KEYS,
+                 prune_interval=MEMORY_PRUNE_INTERVAL):
+        self.max_keys = max_keys
+        self.prune_interval = prune_interval
+        self.buckets = {}
+        self.pruned_at = None
+        # Потоки воркера (gthread, sync_to_async) обращаются к корзинам
+        # одновременно.
+        self.lock = threading.Lock()
+
+    def prune(self, now):
+        # Полная корзина ничем не отличается от отсутствующей.
+        self.buckets = {
+            key: bucket for key, bucket in self.buckets.items()
+            if bucket[2] > now
+        }
+        self.pruned_at = now
+
+    def should_prune(self, now):
+        return len(self.buckets) >= self.max_keys and (
+            self.pruned_at is None
+            or now - self.pruned_at >= self.prune_interval)
+
+    def take(self, key, cost, capacity, refill):
+        with self.lock:
+            now = time.monotonic()
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                if self.should_prune(now):
+                    self.prune(now)
+                tokens = capacity
+            else:
+                tokens = min(
+                    capacity, bucket[0] + (now - bucket[1]) * refill)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self.buckets[key] = (
+                tokens, now, now + (capacity - tokens) / refill)
+            return allowed, tokens
+
+
+class CacheBuckets:
+    def take(self, key, cost, capacity, refill):
+        now = time.time()
+        key = f'throttle:{key}'
+        bucket = cache.get(key)
+        if bucket is None:
+            tokens = capacity
+        else:
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * refill)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+            cache.set(key, (tokens, now),
+                      math.ceil((capacity - tokens) / refill) + 1)
+        return allowed, tokens
+
+
+STORAGES = {
+    'memory': MemoryBuckets(),
+    'cache': CacheBuckets(),
+}
+
+# Настройки читаются на каждый запрос, поэтому кэшируются в модуле
+# и сбрасываются при override_settings.
+_config = None
+
+
+def config():
+    global _config
+    if _config is None:
+        _config = (
+            settings.THROTTLE_ENABLED,
+            STORAGES[settings.THROTTLE_STORAGE],
+            settings.THROTTLE_BUCKETS,
+        )
+    return _config
+
+
+@receiver(setting_changed)
+def reset_config(setting, **kwargs):
+    global _config
+    if setting.startswith('THROTTLE_'):
+        _config = None
+
+
+def take(request, user, ident, cost):
+    """Списывает cost токенов и запоминает состояние для заголовков.
+
+    Корзина — пользователя, а для анонимов — IP ident. Возвращает None,
+    если запрос разрешен, иначе число секунд до того, как в корзине
+    наберется нужное количество токенов.
+    """
+    if user is not None and user.is_authenticated:
+        tier, key = 'user', f'user:{user.pk}'
+    else:
+        tier, key = 'anon', f'anon:{ident}'
+    _, storage, buckets = config()
+    capacity, refill = buckets[tier]
+    allowed, tokens = storage.take(key, cost, capacity, refill)
+    request.rate_limit = (
+        capacity,
+        int(tokens),
+        math.ceil((capacity - tokens) / refill),
+    )
+    if allowed:
+        return None
+    return math.ceil((cost - tokens) / refill)
+
+
+def is_exempt(user):
+    return not config()[0] or (user is not None and user.is_staff)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Троттлинг DRF со стоимостью действий из view.throttle_costs.
+
+    Ключ throttle_costs — имя действия вьюсета или HTTP-метод.
+    """
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        if hasattr(request._request, 'rate_limit'):
+            # Запрос уже списан декоратором throttle асинхронного
+            # представления, которое отдало его DRF.
+            return True
+        user = request.user
+        if is_exempt(user):
+            return True
+        costs = getattr(view, 'throttle_costs', None)
+        cost = 1
+        if costs:
+            cost = costs.get(
+                getattr(view, 'action', None) or request.method, 1)
+        request = request._request
+        self.wait_time = take(
+            request, user,
+            None if user.is_authenticated else self.get_ident(request),
+            cost
+        )
+        return self.wait_time is None
+
+    def wait(self):
+        return self.wait_time
+
+
+def throttled_response(wait):
+    response = JsonResponse(
+        {'detail': 'Слишком много запросов'},
+        status=429,
+        json_dumps_params={'ensure_ascii': False}
+    )
+    response['Retry-After'] = str(wait)
+    return response
+
+
+def throttle(cost=1, get_user=None):
+    """Тот же лимит для обычных представлений Django.
+
+    Async-представлению нужен get_user — корутина, которая возвращает
+    пользователя запроса (None — не удалось определить); без нее запросы
+    ограничиваются по IP как анонимные.
+    """
+    ident = TokenBucketThrottle().get_ident
+
+    def check(request, user):
+        if is_exempt(user):
+            return None
+        wait = take(request, user, ident(request), cost)
+        return None if wait is None else throttled_response(wait)
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                user = await get_user(request) if get_user else None
+                return (check(request, user)
+                        or await view(request, *args, **kwargs))
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return (check(request, request.user)
+                    or view(request, *args, **kwargs))
+
+        return wrapper
+
+    return decorator
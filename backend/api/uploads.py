@@ -0,0 +1,270 @@
+"""Загрузка изображений отдельно от JSON рецепта и профиля.
+
+POST /api/uploads/ принимает файл в multipart (поле file) или сырым телом
+с Content-Type image/* и пишет его во временный каталог UPLOAD_TEMP_DIR
+кусками, не держа тело запроса в памяти целиком. Загрузку можно разбить
+на части: в POST передается заголовок Upload-Length с полным размером
+и первая часть тела (или пустое тело), а PATCH /api/uploads/<token>/
+с Content-Range дописывает следующие части. GET по тому же адресу
+возвращает, сколько байт уже получено, — с этого места загрузка
+продолжается после обрыва связи. Часть сначала пишется в отдельный файл
+без блокировок, а затем под короткой блокировкой строки загрузки
+переименовывается, если получено ровно столько байт, сколько ожидалось;
+при завершении части склеиваются в один файл. У пользователя может быть
+не больше UPLOAD_MAX_OPEN незавершенных загрузок и не больше
+UPLOAD_MAX_USER_BYTES байт во всех его загрузках.
+
+Токен завершенной загрузки передается в поле image рецепта или avatar
+профиля вместо base64. Использованные и просроченные (UPLOAD_EXPIRY)
+загрузки удаляются.
+"""
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from PIL import Image
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+
+from recipes.models import Upload, User
+
+CHUNK_SIZE = 64 * 1024
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+TOKEN = re.compile(r'^[0-9a-f]{8}-([0-9a-f]{4}-){3}[0-9a-f]{12}$')
+PURGE_BATCH_SIZE = 100
+
+
+class UploadConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Часть файла не совпадает с уже полученными данными.'
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'Файл слишком большой.'
+
+
+class TooManyUploads(APIException):
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_detail = 'Слишком много незавершенных загрузок.'
+
+
+def path(upload):
+    return os.path.join(settings.UPLOAD_TEMP_DIR, str(upload.token))
+
+
+def part_path(upload, start):
+    # Номер первого байта дополняется нулями, чтобы части сортировались.
+    return f'{path(upload)}.{start:012d}'
+
+
+def part_paths(upload):
+    prefix = f'{upload.token}.'
+    return sorted(
+        os.path.join(settings.UPLOAD_TEMP_DIR, name)
+        for name in os.listdir(settings.UPLOAD_TEMP_DIR)
+        if name.startswith(prefix)
+    )
+
+
+def data(upload):
+    return {
+        'token': str(upload.token),
+        'size': upload.size,
+        'offset': upload.received,
+        'completed': upload.completed,
+    }
+
+
+def header_int(request, name):
+    value = request.META.get(name) or 0
+    try:
+        value = int(value)
+    except ValueError:
+        raise serializers.ValidationError({name: 'Ожидается число байт.'})
+    if value < 0:
+        raise serializers.ValidationError({name: 'Ожидается число байт.'})
+    return value
+
+
+def check_limits(user, size):
+    """Ограничения на число и общий размер загрузок пользователя."""
+    usage = Upload.objects.filter(user=user).aggregate(
+        open=Count('pk', filter=Q(completed=False)),
+        total=Sum('size'),
+    )
+    if usage['open'] >= settings.UPLOAD_MAX_OPEN:
+        raise TooManyUploads()
+    if (usage['total'] or 0) + size > settings.UPLOAD_MAX_USER_BYTES:
+        raise UploadTooLarge(
+            'Превышен общий размер загрузок; используйте или дождитесь '
+            'удаления прежних.')
+
+
+def create(user, size):
+    if size > settings.UPLOAD_MAX_SIZE:
+        raise UploadTooLarge()
+    os.makedirs(settings.UPLOAD_TEMP_DIR, exist_ok=True)
+    with transaction.atomic():
+        # Блокировка пользователя не дает параллельным запросам вместе
+        # превысить ограничения.
+        User.objects.select_for_update().filter(pk=user.pk).exists()
+        check_limits(user, size)
+        upload = Upload.objects.create(user=user, size=size)
+    open(path(upload), 'wb').close()
+    return upload
+
+
+def copy_stream(source, target, length):
+    """Копирует до length байт кусками; возвращает число скопированных."""
+    copied = 0
+    while copied < length:
+        chunk = source.read(min(CHUNK_SIZE, length - copied))
+        if not chunk:
+            break
+        target.write(chunk)
+        copied += len(chunk)
+    return copied
+
+
+def check_offset(upload, start):
+    if upload.completed or start != upload.received:
+        raise UploadConflict(
+            f'Ожидается продолжение с байта {upload.received}.')
+
+
+def append(upload, stream, start, length):
+    """Дописывает часть файла, начиная с байта start.
+
+    Тело читается во временный файл вне транзакции; под блокировкой
+    только сверяется received и файл переименовывается в часть.
+    """
+    check_offset(upload, start)
+    if start + length > upload.size:
+        raise UploadTooLarge('Часть выходит за заявленный размер файла.')
+    descriptor, temporary = tempfile.mkstemp(
+        dir=settings.UPLOAD_TEMP_DIR, prefix='part-')
+    try:
+        with os.fdopen(descriptor, 'wb') as target:
+            copied = copy_stream(stream, target, length)
+        with transaction.atomic():
+            upload = Upload.objects.select_for_update().get(pk=upload.pk)
+            check_offset(upload, start)
+            if copied:
+                os.replace(temporary, part_path(upload, start))
+                upload.received += copied
+                upload.save(update_fields=['received'])
+    finally:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+    if upload.received == upload.size:
+        finish(upload)
+    return upload
+
+
+def join_parts(upload):
+    with open(path(upload), 'ab') as target:
+        for part in part_paths(upload):
+            with open(part, 'rb') as source:
+                shutil.copyfileobj(source, target, CHUNK_SIZE)
+            os.remove(part)
+
+
+def finish(upload):
+    """Проверяет, что получено изображение, и завершает загрузку."""
+    join_parts(upload)
+    try:
+        with Image.open(path(upload)) as image:
+            image.verify()
+            extension = EXTENSIONS.get(image.format)
+    except Exception:
+        extension = None
+    if extension is None:
+        discard(upload)
+        raise serializers.ValidationError(
+            {'file': 'Загрузите корректное изображение.'})
+    upload.extension, upload.completed = extension, True
+    upload.save(update_fields=['extension', 'completed'])
+
+
+def from_stream(request):
+    """Загрузка из сырого тела; Upload-Length задает полный размер."""
+    length = header_int(request, 'CONTENT_LENGTH')
+    size = header_int(request, 'HTTP_UPLOAD_LENGTH') or length
+    if not size:
+        raise serializers.ValidationError(
+            {'file': 'Пустое тело запроса.'})
+    upload = create(request.user, size)
+    return append(upload, request.stream, 0, length) if length else upload
+
+
+def from_file(user, uploaded):
+    """Загрузка из файла multipart, уже сохраненного Django на диск."""
+    upload = create(user, uploaded.size)
+    if hasattr(uploaded, 'temporary_file_path'):
+        shutil.move(uploaded.temporary_file_path(), path(upload))
+    else:
+        with open(path(upload), 'wb') as target:
+            for chunk in uploaded.chunks(CHUNK_SIZE):
+                target.write(chunk)
+    upload.received = upload.size
+    upload.save(update_fields=['received'])
+    finish(upload)
+    return upload
+
+
+def from_range(upload, request):
+    """Очередная часть из PATCH с Content-Range: bytes start-end/size."""
+    match = CONTENT_RANGE.match(request.META.get('HTTP_CONTENT_RANGE', ''))
+    if match is None:
+        raise serializers.ValidationError(
+            {'Content-Range': 'Ожидается bytes <начало>-<конец>/<размер>.'})
+    start, end, size = map(int, match.groups())
+    length = end - start + 1
+    if (size != upload.size or length <= 0
+            or length != header_int(request, 'CONTENT_LENGTH')):
+        raise serializers.ValidationError(
+            {'Content-Range': 'Не совпадает с размером файла или тела.'})
+    return append(upload, request.stream, start, length)
+
+
+def discard(upload):
+    for name in [path(upload), *part_paths(upload)]:
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+    upload.delete()
+
+
+def purge_expired():
+    expired = Upload.objects.filter(
+        created_at__lt=timezone.now() - timedelta(
+            seconds=settings.UPLOAD_EXPIRY)
+    )[:PURGE_BATCH_SIZE]
+    for upload in expired:
+        discard(upload)
+
+
+def find_upload(token, user):
+    """Завершенная загрузка пользователя по токену."""
+    upload = None
+    if TOKEN.match(token):
+        upload = Upload.objects.filter(
+            token=token, user=user, completed=True).first()
+    if upload is None:
+        raise serializers.ValidationError('Загрузка не найдена.')
+    return upload
+
+
+def open_upload(upload):
+    return File(
+        open(path(upload), 'rb'), name=f'{upload.token}.{upload.extension}')
@@ -1,8 +1,12 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework import routers
 
 from .views import (AdminIngredientViewSet, AdminTagViewSet, IngredientViewSet,
-                    RecipeViewSet, TagViewSet, UserViewSet)
+                    MealPlanShoppingListView, MealPlanView,
+                    ProfileDownloadView, ProfileListView, RecipeExportView,
+                    RecipeImportView, RecipeViewSet, SyncView, TagViewSet,
+                    UploadDetailView, UploadView, UserViewSet)
 
 app_name = 'api'
 
@@ -17,7 +21,42 @@ router.register(
     r'admin/ingredients', AdminIngredientViewSet, basename='admin-ingredients')
 
 urlpatterns = [
+    path('admin/recipes/export/', RecipeExportView.as_view(),
+         name='admin-recipes-export'),
+    path('admin/recipes/import/', RecipeImportView.as_view(),
+         name='admin-recipes-import'),
+    path('admin/profiles/', ProfileListView.as_view(),
+         name='admin-profiles'),
+    path('admin/profiles/<str:capture_id>/',
+         ProfileDownloadView.as_view(),
+         name='admin-profile-download'),
+    path('meal-plan/', MealPlanView.as_view(), name='meal-plan'),
+    path('meal-plan/download_shopping_list/',
+         MealPlanShoppingListView.as_view(),
+         name='meal-plan-shopping-list'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('uploads/', UploadView.as_view(), name='uploads'),
+    path('uploads/<uuid:token>/', UploadDetailView.as_view(),
+         name='upload-detail'),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
+
+if settings.ASYNC_API:
+    from . import async_views
+
+    # Асинхронные GET перекрывают маршруты роутера с теми же адресами.
+    urlpatterns = [
+        path('recipes/', async_views.recipes_list_view,
+             name='recipes-list'),
+        path('recipes/<int:pk>/', async_views.recipes_detail_view,
+             name='recipes-detail'),
+        path('tags/', async_views.tags_list_view, name='tags-list'),
+        path('tags/<int:pk>/', async_views.tags_detail_view,
+             name='tags-detail'),
+        path('ingredients/', async_views.ingredients_list_view,
+             name='ingredients-list'),
+        path('ingredients/<int:pk>/', async_views.ingredients_detail_view,
+             name='ingredients-detail'),
+    ] + urlpatterns
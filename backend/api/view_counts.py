@@ -0,0 +1,209 @@
+"""Счетчики просмотров рецептов с отложенной записью.
+
+Просмотр не пишет в базу: воркер копит для каждого рецепта за текущий
+день HyperLogLog по посетителям (токен авторизации или IP и User-Agent),
+так что повторные просмотры одного клиента, в том числе ботов, считаются
+один раз в день. Фоновый поток раз в VIEW_COUNTS_FLUSH_INTERVAL секунд,
+а также воркер при завершении (worker_exit в gunicorn.conf.py), добавляет
+к Recipe.views прирост оценок одним UPDATE ... FROM (VALUES ...) на все
+рецепты. Процессы, которые не считали просмотры (тесты, команды
+manage.py), в базу ничего не пишут. Один и тот же клиент,
+попавший на разные воркеры, учитывается каждым из них.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from rest_framework.throttling import BaseThrottle
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+PRECISION = 10
+REGISTERS = 1 << PRECISION
+RANK_BITS = 64 - PRECISION
+ALPHA = 0.7213 / (1 + 1.079 / REGISTERS)
+# До этого числа посетителей хранятся сами хэши и счет точный.
+SPARSE_MAX = REGISTERS // 8
+# Рецептов в одном UPDATE.
+FLUSH_BATCH_SIZE = 5000
+
+
+class HyperLogLog:
+    """Оценка числа уникальных 64-битных хэшей, погрешность около 3%."""
+
+    __slots__ = ('hashes', 'registers')
+
+    def __init__(self):
+        self.hashes = set()
+        self.registers = None
+
+    def add(self, value):
+        if self.registers is not None:
+            self.set_register(value)
+            return
+        self.hashes.add(value)
+        if len(self.hashes) > SPARSE_MAX:
+            self.registers = bytearray(REGISTERS)
+            for value in self.hashes:
+                self.set_register(value)
+            self.hashes = None
+
+    def set_register(self, value):
+        index = value >> RANK_BITS
+        rank = RANK_BITS - (value & ((1 << RANK_BITS) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        if self.registers is None:
+            return len(self.hashes)
+        estimate = ALPHA * REGISTERS ** 2 / sum(
+            2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * REGISTERS and zeros:
+            estimate = REGISTERS * math.log(REGISTERS / zeros)
+        return round(estimate)
+
+
+def visitor_hash(request):
+    authorization = request.META.get('HTTP_AUTHORIZATION')
+    visitor = authorization or '{} {}'.format(
+        BaseThrottle().get_ident(request),
+        request.META.get('HTTP_USER_AGENT', ''))
+    return int.from_bytes(
+        hashlib.blake2b(visitor.encode(), digest_size=8).digest(), 'big')
+
+
+def write_deltas(deltas):
+    """Добавляет к Recipe.views прирост {id рецепта: просмотры}."""
+    items = list(deltas.items())
+    connection = connections[Recipe.objects.db]
+    for start in range(0, len(items), FLUSH_BATCH_SIZE):
+        batch = items[start:start + FLUSH_BATCH_SIZE]
+        if connection.vendor != 'postgresql':
+            Recipe.objects.filter(pk__in=dict(batch)).update(
+                views=F('views') + Case(
+                    *(When(pk=pk, then=Value(delta)) for pk, delta in batch),
+                    default=Value(0)
+                ))
+            continue
+        table = connection.ops.quote_name(Recipe._meta.db_table)
+        values = ', '.join(['(%s::bigint, %s::bigint)'] * len(batch))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'UPDATE {table} AS recipe '
+                f'SET views = recipe.views + delta.views '
+                f'FROM (VALUES {values}) AS delta (id, views) '
+                f'WHERE recipe.id = delta.id',
+                [value for item in batch for value in item]
+            )
+
+
+class ViewCounter:
+    """Просмотры рецептов в памяти воркера до записи в базу."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.day = None
+        self.sketches = {}
+        # Сколько уже учтено по каждому рецепту за текущий день.
+        self.counted = {}
+        self.dirty = set()
+        self.pending = defaultdict(int)
+        self.pid = None
+
+    def record(self, recipe_id, request):
+        value = visitor_hash(request)
+        day = timezone.now().date()
+        with self.lock:
+            if day != self.day:
+                self.collect()
+                self.day, self.sketches, self.counted = day, {}, {}
+            self.sketches.setdefault(recipe_id, HyperLogLog()).add(value)
+            self.dirty.add(recipe_id)
+        if self.pid != os.getpid():
+            self.start()
+
+    def collect(self):
+        """Переносит прирост оценок в pending; вызывается под lock."""
+        for recipe_id in self.dirty:
+            count = self.sketches[recipe_id].count()
+            delta = count - self.counted.get(recipe_id, 0)
+            if delta > 0:
+                self.pending[recipe_id] += delta
+                self.counted[recipe_id] = count
+        self.dirty = set()
+
+    def flush(self):
+        # Пишет только процесс, в котором запущен поток записи; после fork
+        # накопленное родителем не учитывается повторно.
+        if self.pid != os.getpid():
+            return
+        with self.lock:
+            self.collect()
+            deltas, self.pending = self.pending, defaultdict(int)
+        if not deltas:
+            return
+        try:
+            write_deltas(deltas)
+        except DatabaseError:
+            with self.lock:
+                for recipe_id, delta in deltas.items():
+                    self.pending[recipe_id] += delta
+            raise
+
+    def start(self):
+        # Поток не переживает fork, поэтому запускается в каждом воркере.
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+        threading.Thread(
+            target=self.run, name='view-counts', daemon=True).start()
+
+    def run(self):
+        while True:
+            time.sleep(settings.VIEW_COUNTS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Не удалось записать просмотры рецептов')
+            finally:
+                connections.close_all()
+
+
+counter = ViewCounter()
+
+
+def count_views(view):
+    """Учитывает просмотр рецепта kwargs['pk'] при ответе 200 или 304."""
+    def record(request, response, pk):
+        if response is not None and response.status_code in (200, 304):
+            counter.record(int(pk), request)
+        return response
+
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            response = await view(request, *args, **kwargs)
+            return record(request, response, kwargs['pk'])
+
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        return record(request, view(request, *args, **kwargs), kwargs['pk'])
+
+    return wrapper
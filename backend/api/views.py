@@ -1,9 +1,17 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db.models import Count, Exists, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.http import (
+    FileResponse,
+    Http404,
+    HttpResponse,
+    JsonResponse,
+    StreamingHttpResponse
+)
 from django.shortcuts import get_object_or_404, redirect
-from rest_framework import serializers, status, viewsets
+from django.utils.decorators import method_decorator
+from rest_framework import generics, serializers, status, viewsets
 from rest_framework.decorators import action, api_view
-from rest_framework.parsers import JSONParser
+from rest_framework.parsers import JSONParser, MultiPartParser
 from rest_framework.permissions import (
     AllowAny,
     IsAuthenticated,
@@ -16,15 +24,41 @@ from foodgram.settings import BASE_URL, DEBUG
 from recipes.models import (
     Ingredient,
     Recipe,
-    RecipeIngredient,
     Subscription,
     Tag,
+    Upload,
     User,
     generate_hash
 )
+from . import profiling, shopping_list, sync, uploads, warmup
+from .cache import cache_anonymous, cache_catalog, short_link_target
+from .conditional import (
+    ROW_FIELDS,
+    cached_not_modified,
+    get_versions,
+    not_modified,
+    remember_etag,
+    set_validators,
+    validators
+)
+from .deletion import schedule_deletion
+from .facets import (
+    facet_counts,
+    facets_variant,
+    filter_recipes,
+    requested_facets
+)
+from .fieldsets import fields_variant, recipe_fields
+from .flat_serializers import render_recipes
+from .metrics import record_event
+from .pagination import UserKeysetPagination
 from .permissions import IsAdmin, IsAuthorOrReadOnly
+from .ranking import order_recipes
+from .recipe_io import RecipeImporter, export_recipes
 from .serializers import (
     IngredientSerializer,
+    MealPlanEntrySerializer,
+    MealPlanRangeSerializer,
     PasswordSerializer,
     RecipeCreateSerializer,
     RecipeSerializer,
@@ -34,11 +68,51 @@ from .serializers import (
     UserCreateSerializer,
     UserSerializer
 )
+from .throttling import throttle
+from .view_counts import count_views
 
 
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.filter(is_active=True)
     parser_classes = [JSONParser]
+    throttle_costs = {'create': 10, 'set_password': 10, 'avatar': 10}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action != 'list':
+            return queryset
+        user = self.request.user
+        if user.is_authenticated:
+            queryset = queryset.annotate(subscribed=Exists(
+                Subscription.objects.filter(user=user, author=OuterRef('pk'))
+            ))
+        search = self.request.query_params.get('search')
+        if search:
+            queryset = queryset.filter(
+                Q(username__istartswith=search)
+                | Q(first_name__istartswith=search)
+                | Q(last_name__istartswith=search)
+            )
+        if self.paginator.__class__ is UserKeysetPagination:
+            queryset = queryset.annotate(recipes_count=Coalesce(Subquery(
+                Recipe.visible.filter(
+                    author=OuterRef('pk')
+                ).order_by().values('author').annotate(
+                    count=Count('pk')).values('count')
+            ), 0))
+        return queryset
+
+    def perform_destroy(self, instance):
+        schedule_deletion(instance)
+
+    @property
+    def paginator(self):
+        # С ?ordering= список отдается по ключу, без OFFSET и COUNT.
+        if (not hasattr(self, '_paginator') and self.action == 'list'
+                and UserKeysetPagination.ordering_query_param
+                in self.request.query_params):
+            self._paginator = UserKeysetPagination()
+        return super().paginator
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -127,11 +201,13 @@ class UserViewSet(viewsets.ModelViewSet):
 
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-    @action(detail=False, methods=['put', 'delete'], url_path='me/avatar')
+    @action(detail=False, methods=['put', 'delete'], url_path='me/avatar',
+            parser_classes=[JSONParser, MultiPartParser])
     def avatar(self, request):
         user = request.user
         if request.method == 'PUT':
-            serializer = UserSerializer(user, data=request.data, partial=True)
+            serializer = UserSerializer(user, data=request.data, partial=True,
+                                        context={'request': request})
             serializer.is_valid(raise_exception=True)
             serializer.save()
             return Response(serializer.data)
@@ -148,11 +224,30 @@ def get_ingredients(request):
     return Response(list(ingredients))
 
 
+def recipe_response(request, queryset, pk):
+    """Рецепт из queryset с ETag и Last-Modified или ответ 304."""
+    fields = recipe_fields(request.query_params)
+    row = generics.get_object_or_404(
+        queryset.values_list(*ROW_FIELDS), pk=pk)
+    etag, last_modified = validators(
+        [row], get_versions(request.user),
+        fields_variant(request.accepted_renderer.format, fields))
+    response = not_modified(request, etag, last_modified)
+    if response is None:
+        response = Response(render_recipes([row], request, fields)[0])
+    return set_validators(response, etag, last_modified)
+
+
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
 
+    @cache_catalog
+    def list(self, request, *args, **kwargs):
+        return Response(list(
+            self.get_queryset().values('id', 'name', 'slug')))
+
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
@@ -166,44 +261,78 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
             queryset = queryset.filter(name__istartswith=name)
         return queryset
 
+    @cache_catalog
+    def list(self, request, *args, **kwargs):
+        return Response(list(
+            self.get_queryset().values('id', 'name', 'measurement_unit')))
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+    queryset = Recipe.visible.all()
     permission_classes = [IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    # Создание и изменение принимают изображения в base64, выгрузка списка
+    # покупок агрегирует всю корзину, get-link может писать в базу.
+    throttle_costs = {
+        'create': 10,
+        'update': 10,
+        'partial_update': 10,
+        'download_shopping_cart': 10,
+        'get_link': 5,
+    }
 
     def get_queryset(self):
-        queryset = super().get_queryset()
-        user = self.request.user
-
-        # Фильтр по автору
-        author_id = self.request.query_params.get('author')
-        if author_id:
-            queryset = queryset.filter(author__id=author_id)
-
-        # Остальные фильтры (теги, корзина, избранное) остаются без изменений
-        tags = self.request.query_params.getlist('tags')
-        if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
-
-        is_in_shopping_cart = self.request.query_params.get(
-            'is_in_shopping_cart')
-        if is_in_shopping_cart and user.is_authenticated:
-            queryset = queryset.filter(shopping_cart__user=user)
-
-        is_favorited = self.request.query_params.get('is_favorited')
-        if is_favorited and user.is_authenticated:
-            queryset = queryset.filter(favorites__user=user)
-
-        return queryset
+        queryset = filter_recipes(super().get_queryset(),
+                                  self.request.query_params,
+                                  self.request.user)
+        return order_recipes(
+            queryset, self.request.query_params.get('ordering'))
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
             return RecipeCreateSerializer
         return RecipeSerializer
 
+    @cache_anonymous
+    def list(self, request, *args, **kwargs):
+        fields = recipe_fields(request.query_params, compact=True)
+        user = request.user
+        versions = get_versions(user, recipes=True)
+        variant = fields_variant(request.accepted_renderer.format, fields)
+        response = cached_not_modified(request, user, versions, variant)
+        if response is not None:
+            return response
+        rows = self.get_queryset().values_list(*ROW_FIELDS)
+        page = self.paginate_queryset(rows)
+        if page is None:
+            return Response(render_recipes(rows, request, fields))
+        facets = facet_counts(
+            self.queryset, request.query_params, user,
+            requested_facets(request.query_params))
+        # Счетчики могут измениться и без изменения рецептов страницы.
+        etag, _ = validators(
+            page, versions, facets_variant(variant, facets),
+            self.paginator.page.paginator.count
+        )
+        remember_etag(request, user, versions, variant, etag)
+        response = not_modified(request, etag)
+        if response is None:
+            response = self.get_paginated_response(
+                render_recipes(page, request, fields))
+            if facets:
+                response.data['facets'] = facets
+        return set_validators(response, etag)
+
+    @method_decorator(count_views)
+    @cache_anonymous
+    def retrieve(self, request, *args, **kwargs):
+        return recipe_response(request, self.get_queryset(), kwargs['pk'])
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        schedule_deletion(instance)
+
     def get_serializer_context(self):
         context = super().get_serializer_context()
         context.update({'request': self.request})
@@ -215,7 +344,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def favorite(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
+        recipe = get_object_or_404(Recipe.visible, id=pk)
         user = request.user
 
         if request.method == 'POST':
@@ -237,7 +366,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post', 'delete'])
     def shopping_cart(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, id=pk)
+        recipe = get_object_or_404(Recipe.visible, id=pk)
         user = request.user
 
         if request.method == 'POST':
@@ -257,32 +386,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def shopping_cart_list(self, request):
-        recipes = Recipe.objects.filter(shopping_cart__user=request.user)
+        recipes = Recipe.visible.filter(shopping_cart__user=request.user)
         serializer = ShortRecipeSerializer(recipes, many=True)
         return Response(serializer.data)
 
-    @action(detail=False, methods=['get'])
+    @action(detail=False, methods=['get'],
+            permission_classes=[IsAuthenticated])
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(total_amount=Sum('amount'))
-
-        shopping_list = []
-        for item in ingredients:
-            shopping_list.append(
-                f"{item['ingredient__name']} "
-                f"({item['ingredient__measurement_unit']}) - "
-                f"{item['total_amount']}"
-            )
-
-        response = HttpResponse(
-            '\n'.join(shopping_list), content_type='text/plain')
-        response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"')
-        return response
+        return shopping_list_response(
+            shopping_list.ingredient_totals(request.user.shopping_cart.all()))
 
     @action(
         methods=['get'],
@@ -302,18 +414,149 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response({'short-link': short_link})
 
 
+def shopping_list_response(rows):
+    response = HttpResponse(
+        shopping_list.render(shopping_list.aggregate(list(rows))),
+        content_type='text/plain'
+    )
+    response['Content-Disposition'] = (
+        'attachment; filename="shopping_list.txt"')
+    return response
+
+
+class MealPlanView(generics.GenericAPIView):
+    """План питания: список, пакетное добавление и удаление записей."""
+
+    serializer_class = MealPlanEntrySerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return self.request.user.meal_plan.filter(
+            recipe__is_hidden=False).select_related('recipe')
+
+    def get(self, request):
+        period = MealPlanRangeSerializer(data=request.query_params)
+        period.is_valid(raise_exception=True)
+        queryset = period.filter(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                self.get_serializer(page, many=True).data)
+        return Response(self.get_serializer(queryset, many=True).data)
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        entries = serializer.save(user=request.user)
+        queryset = self.get_queryset().filter(
+            id__in=[entry.id for entry in entries])
+        return Response(self.get_serializer(queryset, many=True).data,
+                        status=status.HTTP_201_CREATED)
+
+    def delete(self, request):
+        ids = getattr(request.data, 'get', lambda key: None)('ids')
+        if (not isinstance(ids, list)
+                or not all(isinstance(pk, int) for pk in ids)):
+            return Response(
+                {'errors': 'Передайте список ids'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        request.user.meal_plan.filter(id__in=ids).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class MealPlanShoppingListView(APIView):
+    """Список покупок по плану питания за период.
+
+    Количества умножаются на servings; с include_cart к ним добавляются
+    рецепты из корзины с множителем 1.
+    """
+
+    permission_classes = [IsAuthenticated]
+    throttle_costs = {'GET': 10}
+
+    def get(self, request):
+        period = MealPlanRangeSerializer(data=request.query_params)
+        period.is_valid(raise_exception=True)
+        rows = shopping_list.ingredient_totals(
+            period.filter(request.user.meal_plan.all()), 'servings')
+        if period.validated_data['include_cart']:
+            rows = rows.union(
+                shopping_list.ingredient_totals(
+                    request.user.shopping_cart.all()),
+                all=True
+            )
+        return shopping_list_response(rows)
+
+
+class UploadView(APIView):
+    """Начало загрузки изображения: multipart с полем file или сырое тело."""
+
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+    throttle_costs = {'POST': 10}
+
+    def post(self, request):
+        uploads.purge_expired()
+        if request.content_type.startswith('multipart/'):
+            file = request.data.get('file')
+            if file is None:
+                return Response({'file': 'Передайте файл.'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            upload = uploads.from_file(request.user, file)
+        else:
+            upload = uploads.from_stream(request)
+        return Response(uploads.data(upload), status=status.HTTP_201_CREATED)
+
+
+class UploadDetailView(APIView):
+    """Состояние загрузки и продолжение с Content-Range."""
+
+    permission_classes = [IsAuthenticated]
+    throttle_costs = {'PATCH': 5}
+
+    def get_upload(self, request, token):
+        return get_object_or_404(Upload, token=token, user=request.user)
+
+    def get(self, request, token):
+        return Response(uploads.data(self.get_upload(request, token)))
+
+    def patch(self, request, token):
+        upload = uploads.from_range(self.get_upload(request, token), request)
+        return Response(uploads.data(upload))
+
+
+class SyncView(APIView):
+    """Изменения избранного, списка покупок и подписок после токена."""
+
+    permission_classes = [IsAuthenticated]
+    throttle_costs = {'GET': 2}
+
+    def get(self, request):
+        return Response(
+            sync.changes(request, request.query_params.get('token')))
+
+
+@throttle()
 def recipe_by_short_link(request, short_link):
-    recipe = get_object_or_404(Recipe, short_link=short_link)
-    return redirect(f'/recipes/{recipe.pk}/')
+    recipe_id = short_link_target(short_link)
+    record_event('short_link_redirect')
+    return redirect(f'/recipes/{recipe_id}/')
+
+
+def readiness(request):
+    """Готов ли воркер принимать трафик (прогрев завершен)."""
+    if warmup.is_ready():
+        return JsonResponse({'status': 'ready'})
+    return JsonResponse({'status': 'warming up'}, status=503)
 
 
 class RecipeDetailView(APIView):
     permission_classes = [AllowAny]
 
+    @cache_anonymous
     def get(self, request, pk):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        serializer = RecipeSerializer(recipe, context={'request': request})
-        return Response(serializer.data)
+        return recipe_response(request, Recipe.visible.all(), pk)
 
 
 class AdminTagViewSet(viewsets.ModelViewSet):
@@ -335,3 +578,66 @@ class AdminIngredientViewSet(viewsets.ModelViewSet):
         if name:
             queryset = queryset.filter(name__istartswith=name)
         return queryset
+
+
+class RecipeExportView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        response = StreamingHttpResponse(
+            export_recipes(), content_type='application/x-ndjson')
+        response['Content-Disposition'] = (
+            'attachment; filename="recipes.jsonl"')
+        return response
+
+
+class RecipeImportView(APIView):
+    """Загрузка рецептов из JSONL: файл в поле file или тело запроса."""
+
+    permission_classes = [IsAdmin]
+
+    def post(self, request):
+        importer = RecipeImporter()
+        if request.content_type.startswith('multipart/'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response(
+                    {'errors': 'Файл не передан'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            importer.run(upload)
+        else:
+            importer.run(request.stream)
+        return Response({
+            'created': importer.created,
+            'failed': importer.failed,
+            'errors': [
+                {'line': line_number, 'error': message}
+                for line_number, message in importer.errors
+            ],
+        })
+
+
+class ProfileListView(APIView):
+    """Сохраненные снимки профилировщика, от новых к старым."""
+
+    permission_classes = [IsAdmin]
+
+    def get(self, request):
+        return Response([
+            profiling.metadata(capture_id)
+            for capture_id in profiling.captures()
+        ])
+
+
+class ProfileDownloadView(APIView):
+    """Снимок профилировщика: файл pstats или JSON для speedscope."""
+
+    permission_classes = [IsAdmin]
+
+    def get(self, request, capture_id):
+        path, _ = profiling.capture_path(capture_id)
+        if path is None:
+            raise Http404
+        return FileResponse(
+            open(path, 'rb'), as_attachment=True, filename=path.name)
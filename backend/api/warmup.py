@@ -0,0 +1,94 @@
+"""Прогрев воркера перед приемом трафика.
+
+prepare() выполняет то, что не требует базы: построение маршрутов,
+импорт представлений и сериализаторов, чтение настроек DRF. С
+preload_app gunicorn делает это один раз в мастере, и воркеры получают
+результат при fork. start() запускает в каждом воркере поток с warm_up():
+он проходит по WARMUP_URLS внутренними запросами через обработчик WSGI
+(заодно наполняя кэш ответов) и кладет в кэш короткие ссылки самых
+популярных рецептов. Воркер тем временем уже принимает соединения,
+а /health/ready/ отвечает 503, пока прогрев не завершится, поэтому
+балансировщик не отправит на него трафик раньше времени.
+"""
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.db.models import F
+from django.test import RequestFactory
+from django.urls import get_resolver
+from rest_framework.settings import api_settings
+
+from recipes.models import Recipe
+from .cache import short_link_key
+
+logger = logging.getLogger(__name__)
+
+_ready = False
+
+
+def is_ready():
+    return _ready or not settings.WARMUP_ENABLED
+
+
+def prepare():
+    resolver = get_resolver()
+    # Обращение к reverse_dict заполняет кэши резолвера.
+    resolver.reverse_dict
+    for name in ('DEFAULT_RENDERER_CLASSES', 'DEFAULT_PARSER_CLASSES',
+                 'DEFAULT_AUTHENTICATION_CLASSES',
+                 'DEFAULT_PERMISSION_CLASSES', 'DEFAULT_THROTTLE_CLASSES',
+                 'DEFAULT_PAGINATION_CLASS'):
+        getattr(api_settings, name)
+
+
+def warm_host():
+    for host in settings.ALLOWED_HOSTS:
+        if host and not host.startswith(('.', '*')):
+            return host
+    return 'localhost'
+
+
+def prime_short_links(limit):
+    links = Recipe.visible.filter(short_link__isnull=False).order_by(
+        F('score__popular').desc(nulls_last=True), '-pub_date'
+    ).values_list('short_link', 'pk')[:limit]
+    cache.set_many(
+        {short_link_key(short_link): pk for short_link, pk in links},
+        settings.SHORT_LINK_CACHE_TIMEOUT,
+    )
+
+
+def warm_urls(urls):
+    # RequestFactory только строит запрос; обрабатывает его тот же
+    # стек middleware, что и настоящие запросы.
+    handler = WSGIHandler()
+    factory = RequestFactory(HTTP_HOST=warm_host())
+    for url in urls:
+        response = handler.get_response(factory.get(url))
+        response.close()
+        if response.status_code >= 400:
+            logger.warning('Прогрев %s: ответ %s', url,
+                           response.status_code)
+
+
+def warm_up():
+    global _ready
+    try:
+        prepare()
+        warm_urls(settings.WARMUP_URLS)
+        prime_short_links(settings.WARMUP_SHORT_LINKS)
+    except Exception:
+        logger.exception('Прогрев не завершен')
+    finally:
+        # Непрогретый воркер все равно обслуживает запросы, только медленнее.
+        _ready = True
+        connections.close_all()
+
+
+def start():
+    """Прогрев в фоновом потоке; до его конца воркер не готов."""
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
@@ -15,6 +15,9 @@ DEBUG = os.getenv('DEBUG', 'False').lower() == 'True'
 
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '').split(',')
 
+# Асинхронные представления чтения для запуска под ASGI (uvicorn).
+ASYNC_API = os.getenv('ASYNC_API', 'False').lower() == 'true'
+
 
 INSTALLED_APPS = [
     'django.contrib.admin',
@@ -33,11 +36,15 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
+    'api.middleware.RateLimitHeadersMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -104,6 +111,117 @@ DATABASES = {
     }
 }
 
+# Кэш общий для всех воркеров: в нем версии данных, по которым сбрасываются
+# закэшированные ответы, блокировки их пересчета и корзины троттлинга.
+# LocMemCache годится только для одного процесса (разработка, тесты);
+# gunicorn с несколькими воркерами с ним не запустится (gunicorn.conf.py).
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'redis://cache:6379/1'),
+    }
+}
+
+# Время жизни закэшированных ответов API, секунды. До жесткого срока
+# устаревший ответ отдается, пока один запрос обновляет его в фоне.
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 300))
+RESPONSE_CACHE_HARD_TIMEOUT = int(
+    os.getenv('RESPONSE_CACHE_HARD_TIMEOUT', 3600))
+# Сколько после жесткого срока отдавать ответ, если база недоступна;
+# 0 — не отдавать.
+RESPONSE_CACHE_STALE_IF_ERROR = int(
+    os.getenv('RESPONSE_CACHE_STALE_IF_ERROR', 0))
+# Блокировка пересчета ответа и сколько другие запросы ждут его, секунды.
+RESPONSE_CACHE_LOCK_TIMEOUT = int(
+    os.getenv('RESPONSE_CACHE_LOCK_TIMEOUT', 30))
+RESPONSE_CACHE_LOCK_WAIT = float(os.getenv('RESPONSE_CACHE_LOCK_WAIT', 2))
+
+# Время жизни данных отдельных рецептов в кэше, секунды.
+RECIPE_FRAGMENT_TIMEOUT = int(os.getenv('RECIPE_FRAGMENT_TIMEOUT', 3600))
+
+# Ответы API меньше этого размера, байт, не сжимаются.
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+
+# Период полураспада веса добавления в избранное или корзину
+# для сортировки trending, часы.
+TRENDING_HALF_LIFE_HOURS = float(os.getenv('TRENDING_HALF_LIFE_HOURS', 48))
+
+THROTTLE_ENABLED = os.getenv('THROTTLE_ENABLED', 'True').lower() == 'true'
+# Где хранить корзины токенов: memory (в процессе) или cache (общий кэш).
+THROTTLE_STORAGE = os.getenv('THROTTLE_STORAGE', 'memory')
+# Тир: (емкость корзины, пополнение в токенах в секунду).
+THROTTLE_BUCKETS = {
+    'anon': (int(os.getenv('THROTTLE_ANON_CAPACITY', 60)),
+             float(os.getenv('THROTTLE_ANON_REFILL', 1))),
+    'user': (int(os.getenv('THROTTLE_USER_CAPACITY', 120)),
+             float(os.getenv('THROTTLE_USER_REFILL', 2))),
+}
+
+# Профилирование запросов сотрудников по X-Profile или ?_profile.
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'False').lower() == 'true'
+PROFILING_DIR = os.getenv('PROFILING_DIR', '/tmp/foodgram-profiles')
+PROFILING_MAX_CAPTURES = int(os.getenv('PROFILING_MAX_CAPTURES', 50))
+# Период сэмплирования для режима sample, секунды.
+PROFILING_SAMPLE_INTERVAL = float(
+    os.getenv('PROFILING_SAMPLE_INTERVAL', 0.001))
+
+# Метрики Prometheus на /metrics. METRICS_TOKEN требуется в заголовке
+# Authorization: Bearer <token>; пока он не задан, /metrics отвечает 403.
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False').lower() == 'true'
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Сколько хранить соответствие короткой ссылки рецепту, секунды.
+SHORT_LINK_CACHE_TIMEOUT = int(os.getenv('SHORT_LINK_CACHE_TIMEOUT', 86400))
+
+# Как часто воркер записывает накопленные просмотры рецептов, секунды.
+VIEW_COUNTS_FLUSH_INTERVAL = float(
+    os.getenv('VIEW_COUNTS_FLUSH_INTERVAL', 60))
+
+# Проверка новых и измененных рецептов на почти-дубликаты (api.duplicates):
+# flag — отметить для модерации, reject — отклонить, off — не проверять.
+RECIPE_DUPLICATES = os.getenv('RECIPE_DUPLICATES', 'flag')
+# Оценка доли совпадающих шинглов, начиная с которой рецепт — дубликат.
+RECIPE_DUPLICATE_SIMILARITY = float(
+    os.getenv('RECIPE_DUPLICATE_SIMILARITY', 0.7))
+
+# Фоновые задания (api.tasks, команда run_worker). При TASKS_EAGER задания
+# выполняются сразу в процессе, который их поставил.
+TASKS_EAGER = os.getenv('TASKS_EAGER', 'False').lower() == 'true'
+# Попыток на задание по умолчанию; считаются и попытки, брошенные воркером
+# (дольше TASKS_TIMEOUT), после последней задание помечается упавшим.
+TASKS_MAX_ATTEMPTS = int(os.getenv('TASKS_MAX_ATTEMPTS', 5))
+# Задержка перед повтором: TASKS_RETRY_BACKOFF * 2^(попытка - 1), секунды.
+TASKS_RETRY_BACKOFF = float(os.getenv('TASKS_RETRY_BACKOFF', 10))
+TASKS_RETRY_BACKOFF_MAX = float(os.getenv('TASKS_RETRY_BACKOFF_MAX', 3600))
+# Через сколько секунд выполняемое задание считается брошенным.
+TASKS_TIMEOUT = int(os.getenv('TASKS_TIMEOUT', 600))
+TASKS_POLL_INTERVAL = float(os.getenv('TASKS_POLL_INTERVAL', 1))
+
+# Загрузки изображений (api.uploads): временный каталог, предельный размер
+# в байтах и срок, после которого незавершенная загрузка удаляется, секунды.
+UPLOAD_TEMP_DIR = os.getenv('UPLOAD_TEMP_DIR', '/tmp/foodgram-uploads')
+UPLOAD_MAX_SIZE = int(os.getenv('UPLOAD_MAX_SIZE', 10 * 1024 * 1024))
+UPLOAD_EXPIRY = int(os.getenv('UPLOAD_EXPIRY', 86400))
+# Сколько незавершенных загрузок и байт во всех загрузках может быть
+# у одного пользователя.
+UPLOAD_MAX_OPEN = int(os.getenv('UPLOAD_MAX_OPEN', 5))
+UPLOAD_MAX_USER_BYTES = int(os.getenv('UPLOAD_MAX_USER_BYTES',
+                                      50 * 1024 * 1024))
+
+# Сколько секунд хранятся записи об удалениях для /api/sync/; по более
+# старому токену клиент получает полное состояние.
+SYNC_TOMBSTONE_TTL = int(os.getenv('SYNC_TOMBSTONE_TTL', 30 * 86400))
+
+# Прогрев воркеров gunicorn (см. gunicorn.conf.py и api/warmup.py).
+WARMUP_ENABLED = os.getenv('WARMUP_ENABLED', 'False').lower() == 'true'
+WARMUP_URLS = [
+    url for url in os.getenv(
+        'WARMUP_URLS', '/api/tags/,/api/ingredients/,/api/recipes/'
+    ).split(',') if url
+]
+WARMUP_SHORT_LINKS = int(os.getenv('WARMUP_SHORT_LINKS', 1000))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -127,6 +245,16 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBucketThrottle',
+    ],
+    # Сколько прокси (nginx) стоит перед приложением: IP клиента для
+    # лимита запросов — последний адрес, дописанный ими в X-Forwarded-For.
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', 1)),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 6,
 }
@@ -168,6 +296,10 @@ ADMIN_SITE_HEADER = "Foodgram Administration"
 ADMIN_SITE_TITLE = "Foodgram Admin Portal"
 ADMIN_INDEX_TITLE = "Welcome to Foodgram Admin"
 
+# Таблицы больше этого числа строк админка считает по статистике Postgres.
+ADMIN_COUNT_ESTIMATE_THRESHOLD = int(
+    os.getenv('ADMIN_COUNT_ESTIMATE_THRESHOLD', 100000))
+
 AdminSite.site_header = ADMIN_SITE_HEADER
 AdminSite.site_title = ADMIN_SITE_TITLE
 AdminSite.index_title = ADMIN_INDEX_TITLE
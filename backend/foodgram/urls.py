@@ -1,18 +1,30 @@
 """URL configuration for foodgram project."""
-from api.views import recipe_by_short_link
 from django.conf import settings
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from api.views import readiness
+
+if settings.ASYNC_API:
+    from api.async_views import recipe_by_short_link
+else:
+    from api.views import recipe_by_short_link
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
+    path('health/ready/', readiness, name='readiness'),
     path('s/<slug:short_link>/',
          recipe_by_short_link,
          name='recipe-short-link'),
 ]
 
+if settings.METRICS_ENABLED:
+    from api.metrics import metrics_view
+
+    urlpatterns.append(path('metrics', metrics_view, name='metrics'))
+
 if settings.DEBUG:
     urlpatterns += static(
         settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
@@ -0,0 +1,68 @@
+"""Настройки gunicorn; файл подхватывается из рабочего каталога."""
+import glob
+import os
+
+# Приложение загружается в мастере один раз; воркеры получают уже
+# импортированный код и заполненные маршруты при fork.
+preload_app = os.getenv('WARMUP_ENABLED', 'False').lower() == 'true'
+
+
+def on_starting(server):
+    check_shared_cache(server)
+    # Значения метрик прошлого запуска не должны попасть в новые.
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        for path in glob.glob(os.path.join(directory, '*.db')):
+            os.remove(path)
+
+
+def check_shared_cache(server):
+    # С кэшем в памяти процесса сброс версий в одном воркере не виден
+    # остальным, и они отдают устаревшие ответы.
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    from django.conf import settings
+
+    backend = settings.CACHES['default']['BACKEND']
+    if server.cfg.workers > 1 and backend.endswith('.LocMemCache'):
+        raise RuntimeError(
+            f'CACHE_BACKEND={backend} не общий для {server.cfg.workers} '
+            'воркеров; используйте Redis или один воркер.')
+
+
+def when_ready(server):
+    if server.cfg.preload_app:
+        from api.warmup import prepare
+
+        prepare()
+
+
+def post_fork(server, worker):
+    if server.cfg.preload_app:
+        # Соединения с базой из мастера не должны делиться между воркерами.
+        from django.db import connections
+
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    # Вызывается после загрузки приложения в воркере, до приема запросов;
+    # прогрев идет в потоке, пока воркер уже принимает соединения.
+    if os.getenv('WARMUP_ENABLED', 'False').lower() == 'true':
+        from api.warmup import start
+
+        start()
+
+
+def worker_exit(server, worker):
+    # Просмотры, накопленные воркером с последней записи.
+    from api.view_counts import counter
+
+    counter.flush()
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
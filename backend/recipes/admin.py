@@ -1,14 +1,20 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 
-from .models import (Favorite, Ingredient, LinkMapped, Recipe, ShoppingCart,
-                     Subscription, Tag, User)
+from .admin_tools import (BackgroundDeletionAdminMixin, LargeTableAdminMixin,
+                          autocomplete_filter)
+from .models import (DeletionJob, Favorite, Ingredient, LinkMapped,
+                     MealPlanEntry, Recipe, RecipeSignature, ShoppingCart,
+                     Subscription, Tag, Task, User)
 
 admin.site.register(LinkMapped)
 
 
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(BackgroundDeletionAdminMixin, LargeTableAdminMixin,
+                BaseUserAdmin):
     list_display = ('email', 'username', 'first_name', 'last_name', 'is_staff')
     list_filter = ('is_staff', 'is_superuser', 'is_active')
     search_fields = ('email', 'username', 'first_name', 'last_name')
@@ -19,23 +25,38 @@ class RecipeIngredientInline(admin.TabularInline):
     model = Recipe.ingredients.through
     extra = 1
     min_num = 1
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(BackgroundDeletionAdminMixin, LargeTableAdminMixin,
+                  admin.ModelAdmin):
     list_display = ('name', 'author', 'cooking_time', 'favorites_count')
-    list_filter = ('tags', 'author')
+    list_filter = ('tags', autocomplete_filter('author'))
+    list_select_related = ('author',)
     search_fields = ('name', 'author__username',)
+    autocomplete_fields = ('author', 'tags')
     inlines = [RecipeIngredientInline]
     exclude = ('ingredients',)
 
+    def get_queryset(self, request):
+        # Подзапрос считается только для строк текущей страницы.
+        return super().get_queryset(request).annotate(
+            favorites_count=Coalesce(Subquery(
+                Favorite.objects.filter(
+                    recipe=OuterRef('pk')
+                ).order_by().values('recipe').annotate(
+                    count=Count('pk')).values('count')
+            ), 0)
+        )
+
+    @admin.display(description='В избранном', ordering='favorites_count')
     def favorites_count(self, obj):
-        return obj.favorites.count()
-    favorites_count.short_description = 'В избранном'
+        return obj.favorites_count
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('name', 'measurement_unit')
     search_fields = ('name',)
     list_filter = ('measurement_unit',)
@@ -52,18 +73,59 @@ class TagAdmin(admin.ModelAdmin):
 
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'recipe')
-    list_filter = ('user',)
+    list_filter = (autocomplete_filter('user'),)
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'recipe')
-    list_filter = ('user',)
+    list_filter = (autocomplete_filter('user'),)
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
 
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('user', 'author')
-    list_filter = ('user',)
+    list_filter = (autocomplete_filter('user'),)
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+
+
+@admin.register(MealPlanEntry)
+class MealPlanEntryAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('user', 'day', 'recipe', 'servings')
+    list_filter = ('day', autocomplete_filter('user'))
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
+
+
+@admin.register(RecipeSignature)
+class RecipeSignatureAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('recipe', 'duplicate_of', 'similarity')
+    list_filter = (('duplicate_of', admin.EmptyFieldListFilter),)
+    list_select_related = ('recipe', 'duplicate_of')
+    raw_id_fields = ('recipe', 'duplicate_of')
+    exclude = ('minhash',)
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ('content_type', 'object_id', 'status', 'progress',
+                    'created_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('content_type', 'object_id', 'progress', 'error',
+                       'created_at', 'finished_at')
+
+
+@admin.register(Task)
+class TaskAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    list_display = ('name', 'status', 'attempts', 'run_at', 'created_at',
+                    'finished_at')
+    list_filter = ('status', 'name')
+    readonly_fields = ('name', 'args', 'kwargs', 'attempts', 'result',
+                       'error', 'created_at', 'started_at', 'finished_at')
@@ -0,0 +1,127 @@
+"""Помощники админки для больших таблиц."""
+from django import forms
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from api.deletion import schedule_deletion
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор, который не считает строки большой таблицы целиком.
+
+    Для списка без фильтров на Postgres берется оценка reltuples из
+    pg_class; точный COUNT(*) выполняется только для небольших таблиц
+    и отфильтрованных списков.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql' and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+            if row and row[0] > settings.ADMIN_COUNT_ESTIMATE_THRESHOLD:
+                return row[0]
+        return super().count
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """Фильтр по связанной модели с поиском вместо списка всех значений.
+
+    Использует виджет автодополнения админки, так что у модели, на которую
+    ссылается field_name, должны быть заданы search_fields.
+    """
+
+    template = 'admin/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        field = model._meta.get_field(self.field_name)
+        self.parameter_name = f'{self.field_name}__id__exact'
+        self.title = field.verbose_name
+        self.form_field = forms.ModelChoiceField(
+            queryset=field.remote_field.model._default_manager.all(),
+            widget=AutocompleteSelect(field, model_admin.admin_site),
+            required=False,
+        )
+        super().__init__(request, params, model, model_admin)
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            return queryset.filter(**{self.parameter_name: self.value()})
+        except (ValueError, ValidationError) as error:
+            raise IncorrectLookupParameters(error)
+
+    def choices(self, changelist):
+        yield {
+            'widget': self.form_field.widget.render(
+                self.parameter_name, self.value()),
+            'params': [
+                (name, value) for name, value in changelist.params.items()
+                if name not in (self.parameter_name, PAGE_VAR)
+            ],
+            'reset_url': changelist.get_query_string(
+                remove=[self.parameter_name, PAGE_VAR]),
+        }
+
+
+def autocomplete_filter(field_name):
+    return type(
+        f'{field_name.title()}AutocompleteFilter',
+        (AutocompleteFilter,),
+        {'field_name': field_name},
+    )
+
+
+class LargeTableAdminMixin:
+    """Список без полного COUNT(*) и с фильтрами-автодополнениями."""
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(None, self.admin_site).media
+
+
+class BackgroundDeletionAdminMixin:
+    """Удаление через очередь DeletionJob вместо каскада в запросе."""
+
+    def delete_model(self, request, obj):
+        schedule_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            schedule_deletion(obj)
+
+    def get_deleted_objects(self, objs, request):
+        # Зависимые строки не собираются и не показываются: их удалит
+        # process_deletions.
+        objs = list(objs)
+        return (
+            [str(obj) for obj in objs],
+            {self.model._meta.verbose_name_plural: len(objs)},
+            set(),
+            [],
+        )
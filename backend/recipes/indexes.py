@@ -0,0 +1,28 @@
+"""Индексы, которые есть только в Postgres.
+
+Поиск пользователей по началу имени (istartswith) сравнивает
+UPPER(поле) LIKE 'X%', и индексу нужен класс операторов
+text_pattern_ops. Он не объявлен в Meta.indexes, чтобы makemigrations
+давал одни и те же миграции на любой базе, а создается после migrate
+и только в Postgres.
+"""
+from django.db import connections
+
+PREFIX_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def create_prefix_indexes(using='default', **kwargs):
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    from .models import User
+
+    quote = connection.ops.quote_name
+    table = quote(User._meta.db_table)
+    with connection.cursor() as cursor:
+        for name in PREFIX_FIELDS:
+            column = quote(User._meta.get_field(name).column)
+            cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS user_{name}_prefix '
+                f'ON {table} (UPPER({column}) text_pattern_ops)'
+            )
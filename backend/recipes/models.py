@@ -1,12 +1,18 @@
+import uuid
+
 from django.contrib.auth.models import AbstractUser
+from django.contrib.contenttypes.models import ContentType
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 from api.constants import (
     COOKING_TIME_MAX,
     COOKING_TIME_MIN,
     INGREDIENT_NAME_MAX_LEENGTH,
     MAX_MEASUREMENT_INGREDIENT_UNIT,
+    MEAL_PLAN_SERVINGS_MAX,
+    MEAL_PLAN_SERVINGS_MIN,
     RANDOM_HASH_LENGTH_MAX,
     RECIPE_INGREDIENT_AMOUT_MAX,
     RECIPE_INGREDIENT_AMOUT_MIN,
@@ -43,6 +49,7 @@ class User(AbstractUser):
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'
         ordering = ('id',)
+        # Индексы для поиска по началу имени создает recipes.indexes.
 
     def __str__(self):
         return self.username
@@ -83,6 +90,13 @@ class Ingredient(models.Model):
         return self.name
 
 
+class VisibleManager(models.Manager):
+    """Не показывает строки, поставленные в очередь на удаление."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_hidden=False)
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -97,6 +111,7 @@ class Recipe(models.Model):
                               verbose_name='Изображение')
     text = models.TextField(verbose_name='Описание')
     cooking_time = models.PositiveSmallIntegerField(
+        db_index=True,
         validators=[MinValueValidator(COOKING_TIME_MIN),
                     MaxValueValidator(COOKING_TIME_MAX)],
         verbose_name='Время приготовления'
@@ -109,6 +124,9 @@ class Recipe(models.Model):
     )
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации')
+    # Меняется и при изменении ингредиентов, тегов и автора (api.signals).
+    updated_at = models.DateTimeField(auto_now=True,
+                                      verbose_name='Дата изменения')
     short_link = models.SlugField(
         max_length=RANDOM_HASH_LENGTH_MAX,
         unique=True,
@@ -116,6 +134,15 @@ class Recipe(models.Model):
         null=True,
         verbose_name='Короткая ссылка'
     )
+    is_hidden = models.BooleanField(default=False,
+                                    verbose_name='Скрыт до удаления')
+    # Уникальные посетители по дням, пишется api.view_counts.
+    views = models.PositiveBigIntegerField(default=0,
+                                           verbose_name='Просмотры')
+
+    objects = models.Manager()
+    # Рецепты, не поставленные в очередь на удаление, — для выдачи в API.
+    visible = VisibleManager()
 
     def save(self, *args, **kwargs):
         if not self.short_link:
@@ -126,6 +153,9 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(fields=['-views'], name='recipe_views'),
+        ]
 
     def __str__(self):
         return self.name
@@ -173,6 +203,9 @@ class Favorite(models.Model):
         verbose_name='Рецепт'
     )
 
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      verbose_name='Дата добавления')
+
     class Meta:
         verbose_name = 'Избранное'
         verbose_name_plural = 'Избранное'
@@ -182,6 +215,10 @@ class Favorite(models.Model):
                 name='unique_favorite'
             )
         ]
+        indexes = [
+            models.Index(fields=['user', 'created_at'],
+                         name='favorite_user_created'),
+        ]
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
@@ -201,6 +238,9 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт'
     )
 
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      verbose_name='Дата добавления')
+
     class Meta:
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
@@ -210,11 +250,56 @@ class ShoppingCart(models.Model):
                 name='unique_shopping_cart'
             )
         ]
+        indexes = [
+            models.Index(fields=['user', 'created_at'],
+                         name='shopping_cart_user_created'),
+        ]
 
     def __str__(self):
         return f'{self.user} {self.recipe}'
 
 
+class MealPlanEntry(models.Model):
+    """Рецепт в плане питания на день.
+
+    В отличие от списка покупок, один рецепт можно запланировать несколько
+    раз, а servings масштабирует количества ингредиентов.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='meal_plan',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='meal_plan_entries',
+        verbose_name='Рецепт'
+    )
+    day = models.DateField(verbose_name='День')
+    servings = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        default=1,
+        validators=[MinValueValidator(MEAL_PLAN_SERVINGS_MIN),
+                    MaxValueValidator(MEAL_PLAN_SERVINGS_MAX)],
+        verbose_name='Множитель порций'
+    )
+
+    class Meta:
+        verbose_name = 'Рецепт в плане питания'
+        verbose_name_plural = 'План питания'
+        ordering = ('day', 'id')
+        indexes = [
+            models.Index(fields=['user', 'day'], name='meal_plan_user_day'),
+        ]
+
+    def __str__(self):
+        return f'{self.user} {self.day} {self.recipe}'
+
+
 class Subscription(models.Model):
     user = models.ForeignKey(
         User,
@@ -228,6 +313,8 @@ class Subscription(models.Model):
         related_name='following',
         verbose_name='Автор'
     )
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      verbose_name='Дата подписки')
 
     class Meta:
         verbose_name = 'Подписка'
@@ -238,11 +325,296 @@ class Subscription(models.Model):
                 name='unique_subscription'
             )
         ]
+        indexes = [
+            models.Index(fields=['user', 'created_at'],
+                         name='subscription_user_created'),
+        ]
 
     def __str__(self):
         return f'{self.user} {self.author}'
 
 
+class SyncTombstone(models.Model):
+    """Удаление из избранного, корзины или подписок для синхронизации.
+
+    Читается эндпоинтом /api/sync/ (api.sync).
+    """
+
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    SUBSCRIPTION = 'subscription'
+    KIND_CHOICES = (
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+        (SUBSCRIPTION, 'Подписка'),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='sync_tombstones',
+        verbose_name='Пользователь'
+    )
+    kind = models.CharField(max_length=16,
+                            choices=KIND_CHOICES,
+                            verbose_name='Список')
+    object_id = models.BigIntegerField(
+        verbose_name='id рецепта или автора')
+    changed_at = models.DateTimeField(default=timezone.now,
+                                      verbose_name='Дата удаления')
+
+    class Meta:
+        verbose_name = 'Удаление для синхронизации'
+        verbose_name_plural = 'Удаления для синхронизации'
+        indexes = [
+            models.Index(fields=['user', 'changed_at'],
+                         name='sync_tombstone_user_changed'),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} {self.kind} {self.object_id}'
+
+
+class RecipeScore(models.Model):
+    """Рейтинги рецепта для сортировок popular и trending.
+
+    Пересчитываются командой update_recipe_scores.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт'
+    )
+    popular = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Добавлений в избранное и корзину'
+    )
+    trending = models.FloatField(
+        null=True,
+        verbose_name='Логарифм затухающей суммы добавлений'
+    )
+
+    class Meta:
+        verbose_name = 'Рейтинг рецепта'
+        verbose_name_plural = 'Рейтинги рецептов'
+        indexes = [
+            models.Index(fields=['-popular'], name='recipe_score_popular'),
+            models.Index(fields=['-trending'], name='recipe_score_trending'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.popular} / {self.trending}'
+
+
+class ScoreWatermark(models.Model):
+    """Последняя учтенная в рейтингах запись таблицы событий."""
+
+    source = models.CharField(max_length=32,
+                              unique=True,
+                              verbose_name='Источник')
+    last_id = models.BigIntegerField(default=0,
+                                     verbose_name='Последний id')
+    # Диапазоны [первый id, последний id, время обнаружения] пропусков
+    # ниже last_id: строки транзакций, зафиксированных позже строк
+    # с большим id.
+    pending = models.JSONField(default=list,
+                               verbose_name='Ожидаемые id')
+
+    class Meta:
+        verbose_name = 'Отметка пересчета рейтингов'
+        verbose_name_plural = 'Отметки пересчета рейтингов'
+
+    def __str__(self):
+        return f'{self.source}: {self.last_id}'
+
+
+class RecipeSignature(models.Model):
+    """MinHash ингредиентов и текста рецепта (api.duplicates)."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='signature',
+        verbose_name='Рецепт'
+    )
+    minhash = models.JSONField(verbose_name='MinHash')
+    duplicate_of = models.ForeignKey(
+        Recipe,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='Вероятный оригинал'
+    )
+    similarity = models.FloatField(null=True,
+                                   blank=True,
+                                   verbose_name='Сходство с оригиналом')
+
+    class Meta:
+        verbose_name = 'Сигнатура рецепта'
+        verbose_name_plural = 'Сигнатуры рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id} ~ {self.duplicate_of_id}'
+
+
+class RecipeBucket(models.Model):
+    """Корзина LSH: хэш одной полосы сигнатуры рецепта."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='lsh_buckets',
+        verbose_name='Рецепт'
+    )
+    band = models.PositiveSmallIntegerField(verbose_name='Полоса')
+    hash = models.BigIntegerField(verbose_name='Хэш полосы')
+
+    class Meta:
+        verbose_name = 'Корзина LSH'
+        verbose_name_plural = 'Корзины LSH'
+        indexes = [
+            models.Index(fields=['hash', 'band'],
+                         name='recipe_bucket_hash_band'),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.band}/{self.hash}'
+
+
+class DeletionJob(models.Model):
+    """Фоновое удаление пользователя или рецепта со всеми зависимыми.
+
+    Обрабатывается командой process_deletions.
+    """
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнено'),
+        (FAILED, 'Ошибка'),
+    )
+
+    content_type = models.ForeignKey(
+        ContentType,
+        on_delete=models.CASCADE,
+        verbose_name='Тип объекта'
+    )
+    object_id = models.BigIntegerField(verbose_name='id объекта')
+    status = models.CharField(max_length=16,
+                              choices=STATUSES,
+                              default=PENDING,
+                              db_index=True,
+                              verbose_name='Состояние')
+    progress = models.JSONField(default=dict,
+                                verbose_name='Удалено строк по таблицам')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      verbose_name='Создано')
+    finished_at = models.DateTimeField(null=True,
+                                       blank=True,
+                                       verbose_name='Завершено')
+
+    class Meta:
+        verbose_name = 'Удаление'
+        verbose_name_plural = 'Очередь удаления'
+        ordering = ('id',)
+
+    def __str__(self):
+        return f'{self.content_type} {self.object_id}: {self.status}'
+
+
+class Task(models.Model):
+    """Задание фоновой очереди (api.tasks), выполняется run_worker."""
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнено'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(max_length=255, verbose_name='Функция')
+    args = models.JSONField(default=list, verbose_name='Аргументы')
+    kwargs = models.JSONField(default=dict,
+                              verbose_name='Именованные аргументы')
+    status = models.CharField(max_length=16,
+                              choices=STATUSES,
+                              default=QUEUED,
+                              verbose_name='Состояние')
+    attempts = models.PositiveSmallIntegerField(default=0,
+                                                verbose_name='Попыток')
+    max_attempts = models.PositiveSmallIntegerField(
+        verbose_name='Максимум попыток')
+    run_at = models.DateTimeField(verbose_name='Выполнить после')
+    result = models.JSONField(null=True, blank=True, verbose_name='Результат')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      verbose_name='Создано')
+    started_at = models.DateTimeField(null=True,
+                                      blank=True,
+                                      verbose_name='Начато')
+    finished_at = models.DateTimeField(null=True,
+                                       blank=True,
+                                       verbose_name='Завершено')
+
+    class Meta:
+        verbose_name = 'Фоновое задание'
+        verbose_name_plural = 'Фоновые задания'
+        ordering = ('-id',)
+        indexes = [
+            models.Index(fields=['status', 'run_at'],
+                         name='task_status_run_at'),
+        ]
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}: {self.status}'
+
+
+class Upload(models.Model):
+    """Загружаемое изображение; файл лежит в UPLOAD_TEMP_DIR (api.uploads)."""
+
+    token = models.UUIDField(default=uuid.uuid4,
+                             unique=True,
+                             editable=False,
+                             verbose_name='Токен')
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='uploads',
+        verbose_name='Пользователь'
+    )
+    size = models.PositiveIntegerField(verbose_name='Размер, байт')
+    received = models.PositiveIntegerField(default=0,
+                                           verbose_name='Получено, байт')
+    extension = models.CharField(max_length=8,
+                                 blank=True,
+                                 verbose_name='Расширение')
+    completed = models.BooleanField(default=False,
+                                    verbose_name='Загрузка завершена')
+    created_at = models.DateTimeField(auto_now_add=True,
+                                      verbose_name='Создано')
+
+    class Meta:
+        verbose_name = 'Загрузка'
+        verbose_name_plural = 'Загрузки'
+
+    def __str__(self):
+        return f'{self.token}: {self.received}/{self.size}'
+
+
 class LinkMapped(models.Model):
     url_hash = models.CharField(max_length=RANDOM_HASH_LENGTH_MAX,
                                 unique=True,
@@ -0,0 +1,108 @@
+from unittest import mock
+
+from django.contrib import admin
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from recipes import admin_tools
+from recipes.admin_tools import EstimatedCountPaginator
+from recipes.models import Favorite, Recipe, User
+from tests.utils import LOCMEM, make_recipe, make_user
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class ChangelistTest(TestCase):
+    url = reverse('admin:recipes_recipe_changelist')
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author')
+        self.reader = make_user('reader')
+        self.client.force_login(
+            make_user('admin', is_staff=True, is_superuser=True))
+
+    def add_recipes(self, count):
+        for number in range(count):
+            recipe = make_recipe(self.author, name=f'Рецепт {number}')
+            Favorite.objects.create(user=self.reader, recipe=recipe)
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        self.add_recipes(2)
+        few = self.count_queries()
+        self.add_recipes(10)
+        self.assertEqual(self.count_queries(), few)
+
+    def test_favorites_count_is_sortable(self):
+        self.add_recipes(1)
+        popular = make_recipe(self.author, name='Популярный')
+        Favorite.objects.create(user=self.author, recipe=popular)
+        Favorite.objects.create(user=self.reader, recipe=popular)
+        response = self.client.get(self.url, {'o': '-4'})
+        self.assertEqual(response.status_code, 200)
+        results = list(response.context['cl'].result_list)
+        self.assertEqual(results[0], popular)
+        self.assertEqual(results[0].favorites_count, 2)
+
+    def test_author_filter(self):
+        self.add_recipes(1)
+        other = make_recipe(self.reader, name='Чужой')
+        response = self.client.get(
+            self.url, {'author__id__exact': self.reader.pk})
+        self.assertEqual(list(response.context['cl'].result_list), [other])
+        self.assertContains(response, 'admin-autocomplete')
+
+    def test_invalid_author_filter_value(self):
+        response = self.client.get(self.url, {'author__id__exact': 'x'})
+        self.assertRedirects(response, f'{self.url}?e=1',
+                             fetch_redirect_response=False)
+
+    def test_all_changelists_render(self):
+        self.add_recipes(1)
+        for model in admin.site._registry:
+            url = reverse(f'admin:{model._meta.app_label}_'
+                          f'{model._meta.model_name}_changelist')
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+@override_settings(ADMIN_COUNT_ESTIMATE_THRESHOLD=100)
+class EstimatedCountPaginatorTest(TestCase):
+
+    def setUp(self):
+        make_user('author')
+
+    def paginator(self, queryset, reltuples=None):
+        if reltuples is None:
+            return EstimatedCountPaginator(queryset, 10)
+        self.fake = mock.MagicMock(vendor='postgresql')
+        cursor = self.fake.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (reltuples,)
+        patcher = mock.patch.object(admin_tools, 'connections',
+                                    {'default': self.fake})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return EstimatedCountPaginator(queryset, 10)
+
+    def test_exact_count_outside_postgres(self):
+        self.assertEqual(self.paginator(User.objects.all()).count, 1)
+
+    def test_estimate_for_large_unfiltered_table(self):
+        self.assertEqual(
+            self.paginator(User.objects.all(), 5000).count, 5000)
+
+    def test_exact_count_for_small_table(self):
+        self.assertEqual(self.paginator(User.objects.all(), 50).count, 1)
+
+    def test_exact_count_for_filtered_list(self):
+        paginator = self.paginator(
+            Recipe.objects.filter(name='Суп'), 5000)
+        self.assertEqual(paginator.count, 0)
+        self.fake.cursor.assert_not_called()
@@ -0,0 +1,108 @@
+import importlib.util
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings
+)
+from rest_framework.test import APIClient
+
+from api.cache import response_key
+from tests.utils import LOCMEM, make_recipe, make_tag, make_user
+
+REDIS = {'default': {
+    'BACKEND': 'django.core.cache.backends.redis.RedisCache'}}
+
+
+def load_gunicorn_config():
+    path = Path(settings.BASE_DIR) / 'gunicorn.conf.py'
+    spec = importlib.util.spec_from_file_location('gunicorn_conf', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class AnonymousCacheTest(TestCase):
+    url = '/api/recipes/'
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author')
+        self.tag = make_tag('Обед', 'lunch')
+        self.recipe = make_recipe(self.author, tags=[self.tag])
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def names(self, response):
+        return [item['name'] for item in response.json()['results']]
+
+    def test_repeated_anonymous_list_skips_database(self):
+        first = self.anonymous.get(self.url)
+        with self.assertNumQueries(0):
+            second = self.anonymous.get(self.url)
+        self.assertEqual(first.json(), second.json())
+
+    def test_repeated_anonymous_detail_skips_database(self):
+        url = f'{self.url}{self.recipe.pk}/'
+        self.anonymous.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.anonymous.get(url).status_code, 200)
+
+    def test_recipe_change_invalidates(self):
+        self.anonymous.get(self.url)
+        response = self.client.patch(
+            f'{self.url}{self.recipe.pk}/', {'name': 'Борщ'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.names(self.anonymous.get(self.url)), ['Борщ'])
+
+    def test_tag_change_invalidates(self):
+        self.anonymous.get(self.url)
+        self.tag.name = 'Ужин'
+        self.tag.save()
+        tags = self.anonymous.get(self.url).json()['results'][0]['tags']
+        self.assertEqual([tag['name'] for tag in tags], ['Ужин'])
+
+    def test_authenticated_response_is_not_cached(self):
+        response = self.client.get(self.url)
+        self.assertIsNone(cache.get(response_key(response.wsgi_request)))
+        response = self.anonymous.get(self.url)
+        self.assertIsNotNone(cache.get(response_key(response.wsgi_request)))
+
+    def test_key_ignores_param_order_and_unknown_params(self):
+        factory = RequestFactory()
+        self.assertEqual(
+            response_key(factory.get(self.url, {'page': 2, 'limit': 6})),
+            response_key(factory.get(
+                self.url, {'limit': 6, 'page': 2, 'utm_source': 'mail'})))
+        self.assertNotEqual(
+            response_key(factory.get(self.url, {'page': 2})),
+            response_key(factory.get(self.url, {'page': 3})))
+
+
+class SharedCacheCheckTest(SimpleTestCase):
+
+    def setUp(self):
+        self.config = load_gunicorn_config()
+
+    def server(self, workers):
+        return mock.Mock(cfg=mock.Mock(workers=workers))
+
+    @override_settings(CACHES=LOCMEM)
+    def test_local_cache_with_several_workers_fails(self):
+        with self.assertRaisesMessage(RuntimeError, 'LocMemCache'):
+            self.config.check_shared_cache(self.server(4))
+
+    @override_settings(CACHES=LOCMEM)
+    def test_local_cache_with_one_worker_is_allowed(self):
+        self.config.check_shared_cache(self.server(1))
+
+    @override_settings(CACHES=REDIS)
+    def test_redis_with_several_workers_is_allowed(self):
+        self.config.check_shared_cache(self.server(4))
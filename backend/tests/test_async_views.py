@@ -0,0 +1,118 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.http import Http404
+from django.test import AsyncRequestFactory, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import async_views
+from recipes.models import Favorite
+from tests.utils import (
+    LOCMEM,
+    make_ingredient,
+    make_recipe,
+    make_tag,
+    make_user
+)
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class AsyncReadPathTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author')
+        self.reader = make_user('reader')
+        self.token = Token.objects.create(user=self.reader).key
+        self.salt = make_ingredient('Соль')
+        self.tag = make_tag('Обед', 'lunch')
+        self.soup = make_recipe(self.author, ingredients=[(self.salt, 5)],
+                                tags=[self.tag])
+        self.porridge = make_recipe(self.author, name='Каша')
+        Favorite.objects.create(user=self.reader, recipe=self.soup)
+        self.factory = AsyncRequestFactory()
+
+    def call(self, view, path, data=None, token=None, method='get', **kwargs):
+        headers = {'Authorization': f'Token {token}'} if token else {}
+        request = getattr(self.factory, method)(path, data, headers=headers)
+        response = async_to_sync(view)(request, **kwargs)
+        # Ответы DRF рендерит обработчик Django.
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+
+    def sync_get(self, path, data=None, token=None):
+        client = APIClient()
+        if token:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        return client.get(path, data)
+
+    def assertSameAsSync(self, view, path, data=None, token=None, **kwargs):
+        response = self.call(view, path, data, token, **kwargs)
+        expected = self.sync_get(path, data, token)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(json.loads(response.content), expected.json())
+        return response
+
+    def test_recipe_list_matches_sync(self):
+        for token in (None, self.token):
+            for data in ({}, {'limit': 1, 'page': 2},
+                         {'tags': 'lunch'}, {'fields': 'id,name'}):
+                cache.clear()
+                with self.subTest(token=token, data=data):
+                    self.assertSameAsSync(
+                        async_views.recipes_list_view, '/api/recipes/',
+                        data, token)
+
+    def test_recipe_list_marks_favorites_for_token_user(self):
+        response = self.call(async_views.recipes_list_view, '/api/recipes/',
+                             token=self.token)
+        flags = {item['id']: item['is_favorited']
+                 for item in json.loads(response.content)['results']}
+        self.assertEqual(flags, {self.soup.pk: True, self.porridge.pk: False})
+
+    def test_recipe_detail_matches_sync(self):
+        for token in (None, self.token):
+            cache.clear()
+            self.assertSameAsSync(
+                async_views.recipes_detail_view,
+                f'/api/recipes/{self.soup.pk}/', token=token, pk=self.soup.pk)
+
+    def test_catalogs_match_sync(self):
+        self.assertSameAsSync(async_views.tags_list_view, '/api/tags/')
+        self.assertSameAsSync(async_views.tags_detail_view,
+                              f'/api/tags/{self.tag.pk}/', pk=self.tag.pk)
+        self.assertSameAsSync(async_views.ingredients_list_view,
+                              '/api/ingredients/', {'name': 'Со'})
+        self.assertSameAsSync(
+            async_views.ingredients_detail_view,
+            f'/api/ingredients/{self.salt.pk}/', pk=self.salt.pk)
+
+    def test_errors_are_left_to_drf(self):
+        self.assertSameAsSync(
+            async_views.recipes_detail_view, '/api/recipes/999/', pk=999)
+        self.assertSameAsSync(async_views.recipes_list_view, '/api/recipes/',
+                              {'ordering': 'name'})
+        self.assertSameAsSync(async_views.recipes_list_view, '/api/recipes/',
+                              {'page': 5})
+        self.assertSameAsSync(async_views.recipes_list_view, '/api/recipes/',
+                              token='invalid')
+
+    def test_writes_go_to_sync_view(self):
+        response = self.call(async_views.recipes_list_view, '/api/recipes/',
+                             {}, self.token, method='post')
+        self.assertEqual(response.status_code, 400)
+        response = self.call(async_views.recipes_list_view, '/api/recipes/',
+                             method='post')
+        self.assertEqual(response.status_code, 401)
+
+    def test_short_link_redirects(self):
+        response = self.call(async_views.recipe_by_short_link, '/s/x/',
+                             short_link=self.soup.short_link)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], f'/recipes/{self.soup.pk}/')
+        with self.assertRaises(Http404):
+            self.call(async_views.recipe_by_short_link, '/s/x/',
+                      short_link='missing')
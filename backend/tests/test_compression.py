@@ -0,0 +1,85 @@
+import gzip
+from unittest import mock
+
+import brotli
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import compression
+from api.cache import finish_refresh, response_key
+from api.compression import negotiate, precompress
+from tests.utils import LOCMEM, make_ingredient
+
+
+class NegotiateTest(SimpleTestCase):
+
+    def test_prefers_brotli(self):
+        self.assertEqual(negotiate('gzip, deflate, br'), 'br')
+
+    def test_respects_quality(self):
+        self.assertEqual(negotiate('br;q=0.5, gzip'), 'gzip')
+        self.assertIsNone(negotiate('br;q=0, gzip;q=0'))
+
+    def test_wildcard_and_unknown(self):
+        self.assertEqual(negotiate('*'), 'br')
+        self.assertIsNone(negotiate('identity'))
+        self.assertIsNone(negotiate(''))
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class PrecompressTest(SimpleTestCase):
+    content = b'{"name":"ingredient"}' * 50
+
+    def levels(self):
+        return {encoding: mock.Mock(return_value=encoding.encode())
+                for encoding in compression.ENCODINGS}
+
+    def test_small_content_is_not_compressed(self):
+        self.assertEqual(precompress(b'{}'), {})
+
+    def test_request_path_uses_fast_levels(self):
+        fast, best = self.levels(), self.levels()
+        with mock.patch.dict(compression.FAST, fast), \
+                mock.patch.dict(compression.BEST, best):
+            self.assertEqual(precompress(self.content),
+                             {'br': b'br', 'gzip': b'gzip'})
+        self.assertFalse(any(level.called for level in best.values()))
+
+    def test_variants_decompress_to_content(self):
+        variants = precompress(self.content, best=True)
+        self.assertEqual(brotli.decompress(variants['br']), self.content)
+        self.assertEqual(gzip.decompress(variants['gzip']), self.content)
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False,
+                   COMPRESSION_MIN_SIZE=100)
+class CompressionMiddlewareTest(TestCase):
+    url = '/api/ingredients/'
+
+    def setUp(self):
+        cache.clear()
+        for number in range(20):
+            make_ingredient(f'Продукт {number}')
+        self.client = APIClient()
+
+    def test_response_is_compressed(self):
+        plain = self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+    def test_small_response_is_not_compressed(self):
+        response = self.client.get('/api/tags/', HTTP_ACCEPT_ENCODING='br')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_background_refresh_uses_best_levels(self):
+        response = self.client.get(self.url)
+        best = {encoding: mock.Mock(return_value=b'best')
+                for encoding in compression.ENCODINGS}
+        key = response_key(response.wsgi_request)
+        with mock.patch.dict(compression.BEST, best):
+            finish_refresh(key, cache.get(key)['version'], response)
+        self.assertEqual(cache.get(key)['compressed'],
+                         {'br': b'best', 'gzip': b'best'})
@@ -0,0 +1,73 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Favorite
+from tests.utils import LOCMEM, make_recipe, make_user
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class ConditionalGetTest(TestCase):
+    list_url = '/api/recipes/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('reader')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = make_recipe(make_user('author'))
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def etag(self, url):
+        return self.client.get(url)['ETag']
+
+    def test_recipe_validators(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['ETag'].startswith('W/"'))
+        self.assertIn('Authorization', response['Vary'])
+        for headers in ({'HTTP_IF_NONE_MATCH': response['ETag']},
+                        {'HTTP_IF_MODIFIED_SINCE':
+                         response['Last-Modified']}):
+            not_modified = self.client.get(self.url, **headers)
+            self.assertEqual(not_modified.status_code, 304)
+            self.assertEqual(not_modified.content, b'')
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+
+    def test_recipe_etag_follows_changes(self):
+        etag = self.etag(self.url)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        favorited = self.etag(self.url)
+        self.assertNotEqual(favorited, etag)
+        self.recipe.name = 'Борщ'
+        self.recipe.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=favorited)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'Борщ')
+
+    def test_etag_depends_on_user_and_format(self):
+        etag = self.etag(self.url)
+        other = APIClient()
+        other.force_authenticate(make_user('other'))
+        self.assertNotEqual(other.get(self.url)['ETag'], etag)
+        self.assertNotEqual(self.etag(f'{self.url}?fields=id'), etag)
+
+    def test_missing_recipe(self):
+        response = self.client.get('/api/recipes/999/',
+                                   HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+    def test_list_not_modified_without_queries(self):
+        response = self.client.get(self.list_url)
+        self.assertNotIn('Last-Modified', response)
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                self.list_url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_list_etag_changes_with_new_recipe(self):
+        etag = self.etag(self.list_url)
+        make_recipe(self.recipe.author, name='Каша')
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
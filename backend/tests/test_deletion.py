@@ -0,0 +1,112 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.serializers import SubscriptionSerializer
+from recipes.models import (
+    DeletionJob,
+    Favorite,
+    Recipe,
+    RecipeIngredient,
+    ShoppingCart,
+    Subscription,
+    User
+)
+from tests.utils import LOCMEM, make_ingredient, make_recipe, make_user
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class BackgroundDeletionTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author')
+        self.reader = make_user('reader')
+        self.salt = make_ingredient('Соль')
+        self.recipe = make_recipe(self.author, ingredients=[(self.salt, 5)])
+        self.other = make_recipe(self.author, name='Каша')
+        self.author_client = APIClient()
+        self.author_client.force_authenticate(self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def hide(self):
+        response = self.author_client.delete(
+            f'/api/recipes/{self.recipe.pk}/')
+        self.assertEqual(response.status_code, 204)
+
+    def process(self):
+        call_command('process_deletions', stdout=StringIO())
+
+    def test_deleted_recipe_is_hidden_until_processed(self):
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        self.hide()
+        self.assertTrue(Recipe.objects.filter(pk=self.recipe.pk).exists())
+        self.assertFalse(Recipe.visible.filter(pk=self.recipe.pk).exists())
+        ids = [item['id'] for item in
+               self.client.get('/api/recipes/').json()['results']]
+        self.assertEqual(ids, [self.other.pk])
+        self.assertEqual(
+            self.client.get(f'/api/recipes/{self.recipe.pk}/').status_code,
+            404)
+
+        self.process()
+        self.assertFalse(Recipe.objects.filter(pk=self.recipe.pk).exists())
+        self.assertFalse(Favorite.objects.exists())
+        self.assertFalse(
+            RecipeIngredient.objects.filter(recipe=self.recipe).exists())
+        self.assertEqual(DeletionJob.objects.get().status, DeletionJob.DONE)
+
+    def test_hidden_recipe_cannot_be_favorited_or_planned(self):
+        self.hide()
+        url = f'/api/recipes/{self.recipe.pk}/'
+        self.assertEqual(
+            self.client.post(url + 'favorite/').status_code, 404)
+        self.assertEqual(
+            self.client.post(url + 'shopping_cart/').status_code, 404)
+        response = self.client.post('/api/meal-plan/', [
+            {'recipe': self.recipe.pk, 'day': '2026-01-01'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Favorite.objects.exists())
+        self.assertFalse(ShoppingCart.objects.exists())
+
+    def test_hidden_recipe_leaves_shopping_list(self):
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        before = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertIn('Соль', before.content.decode())
+        self.hide()
+        after = self.client.get('/api/recipes/download_shopping_cart/')
+        self.assertNotIn('Соль', after.content.decode())
+
+    def test_hidden_recipe_is_not_counted_in_subscriptions(self):
+        subscription = Subscription.objects.create(
+            user=self.reader, author=self.author)
+        self.hide()
+        author = SubscriptionSerializer(subscription).data
+        self.assertEqual(author['recipes_count'], 1)
+        self.assertEqual([recipe['id'] for recipe in author['recipes']],
+                         [self.other.pk])
+
+    def test_deleted_user_is_hidden_with_recipes(self):
+        admin = APIClient()
+        admin.force_authenticate(make_user('admin', is_staff=True))
+        response = admin.delete(f'/api/users/{self.author.pk}/')
+        self.assertEqual(response.status_code, 204)
+        self.author.refresh_from_db()
+        self.assertFalse(self.author.is_active)
+        self.assertFalse(Recipe.visible.filter(author=self.author).exists())
+
+        self.process()
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
+        self.assertFalse(Recipe.objects.filter(author_id=self.author.pk))
+
+    def test_admin_still_sees_hidden_recipe(self):
+        self.hide()
+        admin = make_user('admin', is_staff=True, is_superuser=True)
+        self.client.force_login(admin)
+        response = self.client.get(
+            f'/admin/recipes/recipe/{self.recipe.pk}/change/')
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,117 @@
+import base64
+import io
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api import duplicates
+from recipes.models import RecipeBucket, RecipeSignature
+from tests.utils import (
+    LOCMEM,
+    make_ingredient,
+    make_recipe,
+    make_tag,
+    make_user
+)
+
+
+def image():
+    buffer = io.BytesIO()
+    Image.new('RGB', (1, 1)).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+TEXT = ('Нарезать картофель кубиками, обжарить лук с морковью, залить '
+        'бульоном и варить двадцать минут на медленном огне.')
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False,
+                   RECIPE_DUPLICATES='flag', RECIPE_DUPLICATE_SIMILARITY=0.7)
+class DuplicateDetectionTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author')
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('copycat'))
+        self.potato = make_ingredient('Картофель')
+        self.onion = make_ingredient('Лук')
+        self.tag = make_tag('Обед', 'lunch')
+        self.original = make_recipe(
+            self.author, name='Картофельный суп', text=TEXT,
+            ingredients=[(self.potato, 300), (self.onion, 50)])
+        duplicates.sign_recipes([self.original])
+
+    def payload(self, **kwargs):
+        return {
+            'ingredients': [{'id': self.potato.pk, 'amount': 300},
+                            {'id': self.onion.pk, 'amount': 50}],
+            'tags': [self.tag.pk],
+            'name': 'Картофельный суп', 'text': TEXT, 'cooking_time': 30,
+            'image': image(),
+            **kwargs,
+        }
+
+    def test_copy_is_flagged(self):
+        response = self.client.post(
+            '/api/recipes/', self.payload(), format='json')
+        self.assertEqual(response.status_code, 201)
+        signature = RecipeSignature.objects.get(recipe=response.json()['id'])
+        self.assertEqual(signature.duplicate_of_id, self.original.pk)
+        self.assertEqual(signature.similarity, 1)
+        self.assertEqual(RecipeBucket.objects.filter(
+            recipe=response.json()['id']).count(), duplicates.BANDS)
+
+    def test_different_recipe_is_not_flagged(self):
+        response = self.client.post('/api/recipes/', self.payload(
+            name='Блины', text='Смешать муку с молоком и жарить.',
+            ingredients=[{'id': make_ingredient('Мука').pk, 'amount': 200}]
+        ), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(RecipeSignature.objects.get(
+            recipe=response.json()['id']).duplicate_of_id)
+
+    @override_settings(RECIPE_DUPLICATES='reject')
+    def test_copy_is_rejected(self):
+        response = self.client.post(
+            '/api/recipes/', self.payload(), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.original.pk),
+                      response.json()['non_field_errors'][0])
+
+    @override_settings(RECIPE_DUPLICATES='off')
+    def test_check_is_disabled(self):
+        self.assertIsNone(duplicates.check('Суп', TEXT, [self.potato.pk]))
+
+    def test_hidden_original_is_ignored(self):
+        self.original.is_hidden = True
+        self.original.save()
+        _, duplicate = duplicates.check(
+            'Картофельный суп', TEXT, [self.potato.pk, self.onion.pk])
+        self.assertIsNone(duplicate)
+
+    def test_batch_finds_earlier_recipe_in_same_batch(self):
+        first = make_recipe(self.author, name='Каша', text=TEXT)
+        second = make_recipe(self.author, name='Каша', text=TEXT)
+        self.assertEqual(duplicates.sign_recipes([first, second]), 2)
+        self.assertEqual(RecipeSignature.objects.get(
+            recipe=second).duplicate_of_id, first.pk)
+
+    def test_candidates_are_ranked_by_matching_bands(self):
+        signature = duplicates.minhash('Окрошка', 'Смешать и охладить.', [])
+        hashes = duplicates.band_hashes(signature)
+        weak = make_recipe(self.author, name='Слабый')
+        strong = make_recipe(self.author, name='Сильный')
+        RecipeBucket.objects.bulk_create(
+            [RecipeBucket(recipe=weak, band=0, hash=hashes[0])]
+            + [RecipeBucket(recipe=strong, band=band, hash=hashes[band])
+               for band in range(5)])
+        with mock.patch.object(duplicates, 'MAX_CANDIDATES', 1):
+            self.assertEqual(duplicates.candidates({None: signature}),
+                             {None: [strong.pk]})
+        self.assertEqual(duplicates.candidates({None: signature}),
+                         {None: [strong.pk, weak.pk]})
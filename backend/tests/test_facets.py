@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from tests.utils import LOCMEM, make_recipe, make_tag, make_user
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class FacetsTest(TestCase):
+    url = '/api/recipes/'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        author = make_user('author')
+        lunch = make_tag('Обед', 'lunch')
+        dinner = make_tag('Ужин', 'dinner')
+        make_tag('Завтрак', 'breakfast')
+        make_recipe(author, name='Суп', cooking_time=10, tags=[lunch])
+        make_recipe(author, name='Плов', cooking_time=45,
+                    tags=[lunch, dinner])
+        make_recipe(author, name='Рагу', cooking_time=180, tags=[dinner])
+        make_recipe(author, name='Скрытый', cooking_time=10, tags=[lunch],
+                    is_hidden=True)
+
+    def facets(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def tag_counts(self, data):
+        return {tag['slug']: tag['count'] for tag in data['facets']['tags']}
+
+    def histogram(self, data):
+        return [bucket['count'] for bucket in data['facets']['cooking_time']]
+
+    def test_counts(self):
+        data = self.facets(facets='tags,cooking_time')
+        self.assertEqual(data['count'], 3)
+        self.assertEqual(self.tag_counts(data),
+                         {'lunch': 2, 'dinner': 2, 'breakfast': 0})
+        self.assertEqual(data['facets']['cooking_time'][0],
+                         {'min': 1, 'max': 15, 'count': 1})
+        self.assertEqual(data['facets']['cooking_time'][-1],
+                         {'min': 121, 'max': None, 'count': 1})
+        self.assertEqual(self.histogram(data), [1, 0, 1, 0, 1])
+
+    def test_facet_ignores_its_own_filter(self):
+        data = self.facets(facets='tags,cooking_time', tags='dinner',
+                           cooking_time_max=60)
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(self.tag_counts(data),
+                         {'lunch': 2, 'dinner': 1, 'breakfast': 0})
+        self.assertEqual(self.histogram(data), [0, 0, 1, 0, 1])
+
+    def test_cooking_time_filter(self):
+        data = self.facets(cooking_time_min=11, cooking_time_max=120)
+        self.assertEqual([recipe['name'] for recipe in data['results']],
+                         ['Плов'])
+        self.assertNotIn('facets', data)
+
+    def test_invalid_parameters(self):
+        for params in ({'facets': 'author'},
+                       {'cooking_time_min': 'ten'}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_etag_follows_counts(self):
+        etag = self.client.get(self.url, {'facets': 'tags'})['ETag']
+        self.assertNotEqual(self.client.get(self.url)['ETag'], etag)
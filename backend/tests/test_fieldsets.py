@@ -0,0 +1,77 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from api.fieldsets import COMPACT_OMIT, DEFAULT_FIELDS
+from tests.utils import (
+    LOCMEM,
+    make_ingredient,
+    make_recipe,
+    make_tag,
+    make_user
+)
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class FieldsetsTest(TestCase):
+    list_url = '/api/recipes/'
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(make_user('reader'))
+        self.recipe = make_recipe(
+            make_user('author'), ingredients=[(make_ingredient('Соль'), 5)],
+            tags=[make_tag('Обед', 'lunch')])
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def keys(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        return list((data['results'][0] if 'results' in data else data))
+
+    def count_queries(self, **params):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.list_url, params)
+        return len(queries)
+
+    def test_defaults(self):
+        self.assertEqual(self.keys(self.url), list(DEFAULT_FIELDS))
+        self.assertEqual(
+            self.keys(self.list_url),
+            [field for field in DEFAULT_FIELDS if field not in COMPACT_OMIT])
+
+    def test_fields_omit_and_expand(self):
+        self.assertEqual(self.keys(self.list_url, fields='name,image'),
+                         ['id', 'name', 'image'])
+        self.assertNotIn('author', self.keys(self.url, omit='author'))
+        self.assertEqual(
+            self.keys(self.list_url, expand='ingredients,views')[-1],
+            'views')
+        self.assertIn('ingredients',
+                      self.keys(self.list_url, expand='ingredients'))
+        self.assertEqual(self.keys(self.url, fields='views', omit='views'),
+                         ['id', 'views'])
+
+    def test_unknown_field(self):
+        for params in ({'fields': 'password'}, {'omit': 'id,secret'},
+                       {'expand': 'email'}):
+            with self.subTest(params=params):
+                response = self.client.get(self.list_url, params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_unselected_relations_are_not_loaded(self):
+        self.assertLess(self.count_queries(fields='name'),
+                        self.count_queries(expand='ingredients'))
+
+    def test_anonymous_cache_keeps_fieldsets_apart(self):
+        anonymous = APIClient()
+        full = anonymous.get(self.list_url).json()['results'][0]
+        short = anonymous.get(
+            self.list_url, {'fields': 'name'}).json()['results'][0]
+        self.assertEqual(short, {'id': self.recipe.pk, 'name': 'Суп'})
+        self.assertIn('author', full)
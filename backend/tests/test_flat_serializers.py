@@ -0,0 +1,107 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIRequestFactory
+
+from api.fieldsets import DEFAULT_FIELDS
+from api.flat_serializers import (
+    fragment_key,
+    render_recipes,
+    user_flags_key
+)
+from api.serializers import RecipeSerializer
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscription
+from tests.utils import (
+    LOCMEM,
+    make_ingredient,
+    make_recipe,
+    make_tag,
+    make_user
+)
+
+ROW_FIELDS = ('id', 'updated_at', 'views')
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class RenderRecipesTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('reader')
+        self.author = make_user('author')
+        self.soup = make_recipe(
+            self.author, ingredients=[(make_ingredient('Соль'), 5)],
+            tags=[make_tag('Обед', 'lunch')])
+        self.pie = make_recipe(self.author, name='Пирог')
+        self.request = self.make_request(self.user)
+
+    def make_request(self, user):
+        request = APIRequestFactory().get('/api/recipes/')
+        request.user = user
+        return request
+
+    def rows(self, *recipes):
+        rows = {row[0]: row
+                for row in Recipe.objects.values_list(*ROW_FIELDS)}
+        return [rows[recipe.pk] for recipe in recipes]
+
+    def test_matches_model_serializer(self):
+        Favorite.objects.create(user=self.user, recipe=self.soup)
+        Subscription.objects.create(user=self.user, author=self.author)
+        expected = RecipeSerializer(
+            self.soup, context={'request': self.request}).data
+        self.assertEqual(
+            render_recipes(self.rows(self.soup), self.request)[0],
+            dict(expected))
+
+    def test_second_render_is_cached(self):
+        rows = self.rows(self.soup, self.pie)
+        first = render_recipes(rows, self.request)
+        with self.assertNumQueries(0):
+            self.assertEqual(render_recipes(rows, self.request), first)
+        self.assertEqual([payload['name'] for payload in first],
+                         ['Суп', 'Пирог'])
+
+    def test_flags_do_not_leak_into_fragments(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.soup)
+        rows = self.rows(self.soup)
+        self.assertTrue(
+            render_recipes(rows, self.request)[0]['is_in_shopping_cart'])
+        fragment = cache.get(
+            fragment_key(self.request, *rows[0][:2], DEFAULT_FIELDS))
+        self.assertFalse(fragment['is_in_shopping_cart'])
+        other = render_recipes(rows, self.make_request(make_user('other')))
+        self.assertFalse(other[0]['is_in_shopping_cart'])
+        anonymous = render_recipes(rows, self.make_request(AnonymousUser()))
+        self.assertFalse(anonymous[0]['is_in_shopping_cart'])
+
+    def test_flag_changes_reset_user_flags(self):
+        rows = self.rows(self.soup)
+        render_recipes(rows, self.request)
+        self.assertIsNotNone(cache.get(user_flags_key(self.user.pk)))
+        Favorite.objects.create(user=self.user, recipe=self.soup)
+        self.assertIsNone(cache.get(user_flags_key(self.user.pk)))
+        self.assertTrue(render_recipes(rows, self.request)[0]['is_favorited'])
+
+    def test_updated_recipe_is_rendered_again(self):
+        render_recipes(self.rows(self.soup), self.request)
+        self.soup.name = 'Борщ'
+        self.soup.save()
+        payload = render_recipes(self.rows(self.soup), self.request)[0]
+        self.assertEqual(payload['name'], 'Борщ')
+
+    def test_views_and_missing_recipes(self):
+        fields = ('id', 'name', 'views')
+        rows = self.rows(self.soup, self.pie)
+        render_recipes(rows, self.request, fields)
+        soup_row = (rows[0][0], rows[0][1], 42)
+        self.pie.delete()
+        payloads = render_recipes([soup_row, rows[1]], self.request, fields)
+        self.assertEqual(payloads, [{'id': self.soup.pk, 'name': 'Суп',
+                                     'views': 42},
+                                    {'id': rows[1][0], 'name': 'Пирог',
+                                     'views': 0}])
+        cache.clear()
+        payloads = render_recipes([soup_row, rows[1]], self.request, fields)
+        self.assertEqual([payload['id'] for payload in payloads],
+                         [self.soup.pk])
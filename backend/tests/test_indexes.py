@@ -0,0 +1,48 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from recipes import indexes
+from recipes.models import User
+from tests.utils import LOCMEM, make_user
+
+
+class PrefixIndexesTest(TestCase):
+
+    def test_model_state_does_not_depend_on_database(self):
+        self.assertEqual(User._meta.indexes, [])
+
+    def test_skipped_outside_postgres(self):
+        with self.assertNumQueries(0):
+            indexes.create_prefix_indexes(using='default')
+
+    def test_created_on_postgres(self):
+        fake = mock.MagicMock(vendor='postgresql')
+        fake.ops.quote_name = connection.ops.quote_name
+        cursor = fake.cursor.return_value.__enter__.return_value
+        with mock.patch.object(indexes, 'connections', {'default': fake}):
+            indexes.create_prefix_indexes(using='default')
+        statements = [call.args[0] for call in cursor.execute.call_args_list]
+        self.assertEqual(len(statements), 3)
+        self.assertIn('CREATE INDEX IF NOT EXISTS user_username_prefix',
+                      statements[0])
+        self.assertIn('(UPPER("username") text_pattern_ops)', statements[0])
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class UserSearchTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        make_user('anna', first_name='Anna', last_name='Smith')
+        make_user('boris', first_name='Boris', last_name='Anderson')
+        make_user('victor', first_name='Victor', last_name='Brown')
+
+    def test_search_by_name_prefix_ignores_case(self):
+        response = APIClient().get('/api/users/', {'search': 'AN'})
+        self.assertEqual(response.status_code, 200)
+        usernames = {user['username'] for user in response.json()['results']}
+        self.assertEqual(usernames, {'anna', 'boris'})
@@ -0,0 +1,94 @@
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.constants import MEAL_PLAN_BULK_MAX
+from recipes.models import MealPlanEntry, ShoppingCart
+from tests.utils import LOCMEM, make_ingredient, make_recipe, make_user
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class MealPlanTest(TestCase):
+    url = '/api/meal-plan/'
+    list_url = '/api/meal-plan/download_shopping_list/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('cook')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.flour = make_ingredient('Мука')
+        self.soup = make_recipe(self.user, ingredients=[(self.flour, 200)])
+        self.pie = make_recipe(self.user, name='Пирог',
+                               ingredients=[(self.flour, 500)])
+
+    def plan(self, *entries):
+        return self.client.post(self.url, [
+            {'recipe': recipe.pk, 'day': day, **extra}
+            for recipe, day, extra in entries
+        ], format='json')
+
+    def test_bulk_add_and_list(self):
+        response = self.plan((self.soup, '2026-03-01', {}),
+                             (self.soup, '2026-03-02', {'servings': '2.5'}))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual([entry['servings'] for entry in response.json()],
+                         ['1.00', '2.50'])
+        self.assertEqual(response.json()[0]['recipe']['name'], 'Суп')
+        response = self.client.get(self.url, {'start': '2026-03-02'})
+        days = [entry['day'] for entry in response.json()['results']]
+        self.assertEqual(days, ['2026-03-02'])
+
+    def test_invalid_entries_create_nothing(self):
+        response = self.plan((self.soup, '2026-03-01', {}),
+                             (self.soup, '2026-03-01', {'servings': '0.1'}))
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(self.url, [
+            {'recipe': 999, 'day': '2026-03-01'}], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MealPlanEntry.objects.exists())
+
+    def test_batch_size_is_limited(self):
+        response = self.plan(
+            *[(self.soup, '2026-03-01', {})] * (MEAL_PLAN_BULK_MAX + 1))
+        self.assertEqual(response.status_code, 400)
+
+    def test_bad_period(self):
+        response = self.client.get(
+            self.url, {'start': '2026-03-02', 'end': '2026-03-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_delete_only_own_entries(self):
+        ids = [entry['id'] for entry in self.plan(
+            (self.soup, '2026-03-01', {}), (self.pie, '2026-03-01', {})
+        ).json()]
+        other = MealPlanEntry.objects.create(
+            user=make_user('other'), recipe=self.soup, day='2026-03-01')
+        response = self.client.delete(
+            self.url, {'ids': [ids[0], other.pk]}, format='json')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            list(MealPlanEntry.objects.values_list('pk', flat=True)
+                 .order_by('pk')), [ids[1], other.pk])
+        response = self.client.delete(
+            self.url, {'ids': 'all'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_shopping_list_scales_servings(self):
+        self.plan((self.soup, '2026-03-01', {'servings': 2}),
+                  (self.pie, '2026-03-02', {'servings': '0.5'}),
+                  (self.pie, '2026-04-01', {}))
+        response = self.client.get(
+            self.list_url, {'start': '2026-03-01', 'end': '2026-03-31'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content.decode(), 'Мука (г) - 650')
+
+    def test_shopping_list_can_include_cart(self):
+        self.plan((self.soup, '2026-03-01', {}))
+        ShoppingCart.objects.create(user=self.user, recipe=self.pie)
+        response = self.client.get(self.list_url, {'include_cart': 'true'})
+        self.assertEqual(response.content.decode(), 'Мука (г) - 700')
+
+    def test_requires_authentication(self):
+        self.assertEqual(APIClient().get(self.url).status_code, 401)
+        self.assertEqual(APIClient().get(self.list_url).status_code, 401)
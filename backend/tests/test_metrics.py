@@ -0,0 +1,93 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from api import metrics
+from api.middleware import MetricsMiddleware
+
+
+def run_queries(count):
+    with connection.cursor() as cursor:
+        for _ in range(count):
+            cursor.execute('SELECT 1')
+
+
+@override_settings(METRICS_ENABLED=True)
+class MetricsMiddlewareTest(SimpleTestCase):
+    databases = {'default'}
+
+    def setUp(self):
+        connection_created.connect(metrics.install_counter)
+        self.addCleanup(connection_created.disconnect, metrics.install_counter)
+        # Тестовое соединение открыто до подключения сигнала.
+        metrics.install_counter(connection=connection)
+        for name in ('REQUEST_LATENCY', 'DB_QUERIES'):
+            patcher = mock.patch.object(metrics, name, create=True)
+            setattr(self, name.lower(), patcher.start())
+            self.addCleanup(patcher.stop)
+        self.request = RequestFactory().get('/api/recipes/')
+        self.request.resolver_match = mock.Mock(view_name='recipes-list')
+
+    def observed_queries(self):
+        self.db_queries.labels.assert_called_once_with('recipes-list', 'GET')
+        return self.db_queries.labels.return_value.observe.call_args.args[0]
+
+    def test_sync_request(self):
+        def view(request):
+            run_queries(2)
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(view)
+        self.assertFalse(iscoroutinefunction(middleware))
+        middleware(self.request)
+        self.assertEqual(self.observed_queries(), 2)
+        self.request_latency.labels.return_value.observe.assert_called_once()
+
+    def test_async_request_counts_queries_in_worker_threads(self):
+        async def view(request):
+            await sync_to_async(run_queries)(1)
+            await sync_to_async(run_queries, thread_sensitive=False)(2)
+            return HttpResponse()
+
+        middleware = MetricsMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        async_to_sync(middleware)(self.request)
+        self.assertEqual(self.observed_queries(), 3)
+
+    def test_queries_outside_request_are_not_counted(self):
+        run_queries(1)
+        self.assertIsNone(metrics.QUERIES.get())
+
+
+class MetricsViewTest(SimpleTestCase):
+
+    def setUp(self):
+        patcher = mock.patch.multiple(
+            metrics, create=True, REGISTRY=mock.DEFAULT,
+            CONTENT_TYPE_LATEST='text/plain',
+            generate_latest=mock.Mock(return_value=b'metrics'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.factory = RequestFactory()
+
+    def get(self, **headers):
+        return metrics.metrics_view(self.factory.get('/metrics', **headers))
+
+    @override_settings(METRICS_TOKEN='')
+    def test_denied_without_configured_token(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(
+            self.get(HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_requires_token(self):
+        self.assertEqual(self.get().status_code, 403)
+        self.assertEqual(
+            self.get(HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.get(HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'metrics')
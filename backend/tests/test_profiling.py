@@ -0,0 +1,108 @@
+import json
+import pstats
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import profiling
+from tests.utils import LOCMEM, make_recipe, make_user
+
+
+class ProfilingTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        overrides = override_settings(
+            CACHES=LOCMEM, THROTTLE_ENABLED=False, PROFILING_ENABLED=True,
+            PROFILING_DIR=directory, PROFILING_MAX_CAPTURES=2)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        make_recipe(make_user('author'))
+        self.staff = self.client_for(make_user('admin', is_staff=True))
+        self.user = self.client_for(make_user('reader'))
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}')
+        return client
+
+
+class ProfilingMiddlewareTest(ProfilingTestCase):
+
+    def test_cprofile_capture(self):
+        response = self.staff.get('/api/recipes/', HTTP_X_PROFILE='cprofile')
+        self.assertEqual(response.status_code, 200)
+        capture_id = response['X-Profile-Id']
+        meta = profiling.metadata(capture_id)
+        self.assertEqual((meta['mode'], meta['path'], meta['status']),
+                         ('cprofile', '/api/recipes/', 200))
+        path, _ = profiling.capture_path(capture_id)
+        self.assertGreater(pstats.Stats(str(path)).total_calls, 0)
+
+    def test_sample_capture(self):
+        with override_settings(PROFILING_SAMPLE_INTERVAL=0.0001):
+            response = self.staff.get('/api/recipes/',
+                                      HTTP_X_PROFILE='sample')
+        path, meta = profiling.capture_path(response['X-Profile-Id'])
+        self.assertEqual(meta['mode'], 'sample')
+        data = json.loads(path.read_text())
+        profile = data['profiles'][0]
+        self.assertEqual(len(profile['samples']), len(profile['weights']))
+        self.assertEqual(data['name'], '/api/recipes/')
+
+    def test_query_parameter(self):
+        response = self.staff.get('/api/recipes/', {'_profile': 1})
+        self.assertIn('X-Profile-Id', response)
+
+    def test_not_profiled(self):
+        for client, headers in (
+                (self.user, {'HTTP_X_PROFILE': 'cprofile'}),
+                (APIClient(), {'HTTP_X_PROFILE': 'cprofile'}),
+                (self.staff, {'HTTP_X_PROFILE': 'unknown'}),
+                (self.staff, {})):
+            response = client.get('/api/recipes/', **headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(profiling.captures(), [])
+
+    def test_old_captures_are_removed(self):
+        ids = [
+            self.staff.get('/api/recipes/', HTTP_X_PROFILE='1')[
+                'X-Profile-Id']
+            for _ in range(3)
+        ]
+        self.assertEqual(profiling.captures(), ids[:0:-1])
+        self.assertEqual(profiling.capture_path(ids[0]), (None, None))
+        files = list(profiling.capture_dir().iterdir())
+        self.assertEqual(len(files), 4)
+
+
+class ProfileEndpointsTest(ProfilingTestCase):
+
+    def test_list_and_download(self):
+        capture_id = self.staff.get(
+            '/api/recipes/', HTTP_X_PROFILE='sample')['X-Profile-Id']
+        listing = self.staff.get('/api/admin/profiles/').json()
+        self.assertEqual([meta['id'] for meta in listing], [capture_id])
+        response = self.staff.get(f'/api/admin/profiles/{capture_id}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('speedscope.json', response['Content-Disposition'])
+        response.close()
+
+    def test_missing_or_malformed_capture(self):
+        for capture_id in ('123', '..', 'abc'):
+            self.assertEqual(self.staff.get(
+                f'/api/admin/profiles/{capture_id}/').status_code, 404)
+
+    def test_staff_only(self):
+        self.assertEqual(
+            self.user.get('/api/admin/profiles/').status_code, 403)
+        self.assertEqual(
+            self.user.get('/api/admin/profiles/1/').status_code, 403)
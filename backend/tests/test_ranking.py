@@ -0,0 +1,129 @@
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api import ranking
+from api.ranking import ScoreUpdater, cap_ranges, split_ranges
+from recipes.models import Favorite, RecipeScore, ScoreWatermark, ShoppingCart
+from tests.utils import LOCMEM, make_recipe, make_user
+
+
+class RangesTest(SimpleTestCase):
+
+    def test_split_removes_found_ids(self):
+        self.assertEqual(
+            split_ranges([[1, 10, 5], [20, 20, 6]], [1, 4, 5, 10, 20, 30]),
+            [[2, 3, 5], [6, 9, 5]])
+
+    def test_cap_keeps_newest(self):
+        ranges = [[pk * 10, pk * 10 + 1, pk] for pk in range(5)]
+        with mock.patch.object(ranking, 'MAX_PENDING_RANGES', 2):
+            self.assertEqual(cap_ranges(ranges), ranges[-2:])
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class ScoreUpdaterTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author')
+        self.reader = make_user('reader')
+        self.recipe = make_recipe(self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def run_updater(self, **kwargs):
+        return ScoreUpdater().run(**kwargs)
+
+    def popular(self, recipe=None):
+        return RecipeScore.objects.get(recipe=recipe or self.recipe).popular
+
+    def test_counts_new_additions(self):
+        Favorite.objects.create(user=self.reader, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        self.assertEqual(self.run_updater(), 2)
+        self.assertEqual(self.popular(), 2)
+        self.assertEqual(self.run_updater(), 0)
+        self.assertEqual(self.popular(), 2)
+
+    def test_add_remove_loop_does_not_inflate_popular(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        for _ in range(3):
+            self.assertEqual(self.client.post(url).status_code, 201)
+            self.assertEqual(self.client.delete(url).status_code, 204)
+        self.run_updater()
+        self.assertEqual(self.popular(), 0)
+        self.client.post(url)
+        self.run_updater()
+        self.assertEqual(self.popular(), 1)
+        self.client.delete(url)
+        self.run_updater()
+        self.assertEqual(self.popular(), 0)
+
+    def test_late_committed_row_is_counted_once(self):
+        other = make_user('other')
+        Favorite.objects.create(pk=10, user=self.reader, recipe=self.recipe)
+        self.run_updater()
+        watermark = ScoreWatermark.objects.get(source='favorite')
+        self.assertEqual(watermark.last_id, 10)
+        self.assertEqual([item[:2] for item in watermark.pending], [[1, 9]])
+
+        Favorite.objects.create(pk=5, user=other, recipe=self.recipe)
+        self.run_updater()
+        self.assertEqual(self.popular(), 2)
+        watermark.refresh_from_db()
+        self.assertEqual([item[:2] for item in watermark.pending],
+                         [[1, 4], [6, 9]])
+        self.assertEqual(self.run_updater(), 0)
+
+    def test_id_jump_is_stored_as_one_range(self):
+        Favorite.objects.create(
+            pk=10 ** 12, user=self.reader, recipe=self.recipe)
+        self.run_updater()
+        pending = ScoreWatermark.objects.get(source='favorite').pending
+        self.assertEqual([item[:2] for item in pending], [[1, 10 ** 12 - 1]])
+
+    def test_expired_gaps_are_dropped(self):
+        ScoreWatermark.objects.create(
+            source='favorite', last_id=10,
+            pending=[[1, 9, time.time() - ranking.LATE_COMMIT_TIMEOUT - 1]])
+        self.run_updater()
+        self.assertEqual(
+            ScoreWatermark.objects.get(source='favorite').pending, [])
+
+    def test_old_rows_leave_no_gap(self):
+        favorite = Favorite.objects.create(
+            pk=10, user=self.reader, recipe=self.recipe)
+        Favorite.objects.filter(pk=favorite.pk).update(
+            created_at=timezone.now() - timedelta(days=1))
+        self.run_updater()
+        self.assertEqual(
+            ScoreWatermark.objects.get(source='favorite').pending, [])
+
+    def test_missing_recipe_is_skipped(self):
+        updater = ScoreUpdater()
+        updater.touched = {self.recipe.pk, self.recipe.pk + 1000}
+        updater.write()
+        self.assertEqual(
+            list(RecipeScore.objects.values_list('recipe_id', flat=True)),
+            [self.recipe.pk])
+
+    def test_ordering_by_popular_and_trending(self):
+        other = make_recipe(self.author, name='Каша')
+        Favorite.objects.create(user=self.reader, recipe=other)
+        self.run_updater()
+        for ordering in ('popular', 'trending'):
+            response = self.client.get('/api/recipes/',
+                                       {'ordering': ordering})
+            ids = [item['id'] for item in response.json()['results']]
+            self.assertEqual(ids, [other.pk, self.recipe.pk])
+
+    def test_unknown_ordering_is_rejected(self):
+        response = self.client.get('/api/recipes/', {'ordering': 'name'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('popular', response.json()['ordering'][0])
@@ -0,0 +1,175 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+import orjson
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.recipe_io import RecipeImporter, export_recipes
+from recipes.models import Recipe
+from tests.utils import (
+    LOCMEM,
+    make_ingredient,
+    make_recipe,
+    make_tag,
+    make_user
+)
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class RecipeIOTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author')
+        self.salt = make_ingredient('Соль')
+        self.milk = make_ingredient('Молоко', 'мл')
+        self.tag = make_tag('Обед', 'lunch')
+        self.recipe = make_recipe(
+            self.author, ingredients=[(self.salt, 5), (self.milk, 200)],
+            tags=[self.tag])
+
+    def line(self, **kwargs):
+        data = {
+            'name': 'Каша', 'text': 'Сварить', 'cooking_time': 20,
+            'author': self.author.email, 'tags': ['lunch'],
+            'ingredients': [{'name': 'Молоко', 'measurement_unit': 'мл',
+                             'amount': 300}],
+            **kwargs,
+        }
+        return orjson.dumps(data) + b'\n'
+
+    def test_round_trip(self):
+        exported = list(export_recipes(chunk_size=1))
+        data = orjson.loads(exported[0])
+        self.assertEqual(data['author'], 'author@example.com')
+        self.assertEqual(data['tags'], ['lunch'])
+        self.recipe.delete()
+
+        importer = RecipeImporter()
+        self.assertEqual(importer.run(exported), 1)
+        recipe = Recipe.objects.get()
+        self.assertEqual(
+            (recipe.name, recipe.short_link, recipe.image.name,
+             recipe.pub_date.isoformat()),
+            (data['name'], data['short_link'], data['image'],
+             data['pub_date']))
+        self.assertEqual(
+            sorted(recipe.recipe_ingredients.values_list(
+                'ingredient__name', 'amount')),
+            [('Молоко', 200), ('Соль', 5)])
+        self.assertEqual(list(recipe.tags.values_list('slug', flat=True)),
+                         ['lunch'])
+
+    def test_hidden_recipes_are_not_exported(self):
+        make_recipe(self.author, name='Скрытый', is_hidden=True)
+        names = [orjson.loads(line)['name'] for line in export_recipes()]
+        self.assertEqual(names, ['Суп'])
+
+    def test_invalid_lines_are_reported_and_skipped(self):
+        lines = [
+            self.line(),
+            b'{not json\n',
+            b'\n',
+            self.line(tags=['missing']),
+            self.line(tags=[]),
+            self.line(ingredients=[{'name': 'Сахар',
+                                    'measurement_unit': 'г',
+                                    'amount': 1}]),
+            self.line(ingredients=[
+                {'name': 'Соль', 'measurement_unit': 'г', 'amount': 1},
+                {'name': 'Соль', 'measurement_unit': 'г', 'amount': 2}]),
+            self.line(cooking_time=0),
+            self.line(cooking_time=True),
+            self.line(author='nobody@example.com'),
+            self.line(name=''),
+            b'[]\n',
+            self.line(name='Блины'),
+        ]
+        importer = RecipeImporter(batch_size=3)
+        self.assertEqual(importer.run(lines), 2)
+        self.assertEqual(importer.failed, 10)
+        self.assertEqual([number for number, _ in importer.errors],
+                         [2, 4, 5, 6, 7, 8, 9, 10, 11, 12])
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('name', flat=True)),
+            ['Блины', 'Каша', 'Суп'])
+
+    def test_taken_short_link_is_replaced(self):
+        importer = RecipeImporter()
+        importer.run([self.line(short_link=self.recipe.short_link),
+                      self.line(short_link='same'),
+                      self.line(short_link='same')])
+        links = list(Recipe.objects.values_list('short_link', flat=True))
+        self.assertEqual(len(set(links)), 4)
+        self.assertIn('same', links)
+
+    def test_import_invalidates_cached_list(self):
+        anonymous = APIClient()
+        self.assertEqual(anonymous.get('/api/recipes/').json()['count'], 1)
+        RecipeImporter().run([self.line()])
+        self.assertEqual(anonymous.get('/api/recipes/').json()['count'], 2)
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class RecipeIOEndpointsTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author')
+        make_recipe(self.author, ingredients=[(make_ingredient('Соль'), 5)],
+                    tags=[make_tag('Обед', 'lunch')])
+        self.admin = APIClient()
+        self.admin.force_authenticate(make_user('admin', is_staff=True))
+        self.user = APIClient()
+        self.user.force_authenticate(self.author)
+        self.line = orjson.dumps({
+            'name': 'Каша', 'text': 'Сварить', 'cooking_time': 20,
+            'author': self.author.email, 'tags': ['lunch'],
+            'ingredients': [{'name': 'Соль', 'measurement_unit': 'г',
+                             'amount': 1}],
+        }) + b'\n'
+
+    def test_only_staff(self):
+        self.assertEqual(
+            self.user.get('/api/admin/recipes/export/').status_code, 403)
+        self.assertEqual(
+            self.user.post('/api/admin/recipes/import/').status_code, 403)
+
+    def test_export_streams_jsonl(self):
+        response = self.admin.get('/api/admin/recipes/export/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([orjson.loads(line)['name'] for line in lines],
+                         ['Суп'])
+
+    def test_import_body(self):
+        response = self.admin.generic(
+            'POST', '/api/admin/recipes/import/', self.line + b'oops\n',
+            content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['created'], 1)
+        self.assertEqual(response.json()['failed'], 1)
+        self.assertEqual(response.json()['errors'][0]['line'], 2)
+
+    def test_import_requires_file_in_multipart(self):
+        response = self.admin.post(
+            '/api/admin/recipes/import/', {}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+
+    def test_commands(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'recipes.jsonl')
+        call_command('export_recipes', output=path, stderr=StringIO())
+        Recipe.objects.all().delete()
+        stdout = StringIO()
+        call_command('import_recipes', path, stdout=stdout,
+                     stderr=StringIO())
+        self.assertIn('Загружено рецептов: 1', stdout.getvalue())
+        self.assertEqual(Recipe.objects.get().name, 'Суп')
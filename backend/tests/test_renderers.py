@@ -0,0 +1,25 @@
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+
+from api.renderers import ORJSONRenderer
+
+
+class ORJSONRendererTest(SimpleTestCase):
+
+    def test_matches_drf_output(self):
+        data = {
+            'utc': datetime(2026, 1, 2, 3, 4, 5, 123456, tzinfo=timezone.utc),
+            'local': datetime(2026, 1, 2, 3, 4, 5,
+                              tzinfo=timezone(timedelta(hours=3))),
+            'naive': datetime(2026, 1, 2, 3, 4, 5),
+            'date': date(2026, 1, 2),
+            'time': time(1, 2, 3, 456789),
+            'amount': Decimal('1.50'),
+            'text': 'строка\u2028с\u2029разделителями',
+            1: [1, 2.5, None, {'nested': True}],
+        }
+        self.assertEqual(ORJSONRenderer().render(data),
+                         JSONRenderer().render(data))
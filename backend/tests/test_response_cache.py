@@ -0,0 +1,130 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import cache as response_cache
+from api.cache import (
+    acquire,
+    background_request,
+    bump_version,
+    finish_refresh,
+    lock_key,
+    response_key
+)
+from tests.utils import LOCMEM, make_recipe, make_user
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class ResponseCacheTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.author = make_user('author')
+        self.recipe = make_recipe(self.author)
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+        self.anonymous = APIClient()
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def test_deleted_recipe_is_not_served_from_cache(self):
+        self.assertEqual(self.anonymous.get(self.url).status_code, 200)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.anonymous.get(self.url).status_code, 404)
+
+    @override_settings(RESPONSE_CACHE_TIMEOUT=0)
+    def test_deleted_recipe_is_not_served_stale(self):
+        self.assertEqual(self.anonymous.get(self.url).status_code, 200)
+        self.assertEqual(self.client.delete(self.url).status_code, 204)
+        self.assertEqual(self.anonymous.get(self.url).status_code, 404)
+
+    def test_refresh_of_missing_object_deletes_entry(self):
+        response = self.anonymous.get(self.url)
+        key = response_key(response.wsgi_request)
+        self.assertIsNotNone(cache.get(key))
+        response.status_code = 404
+        finish_refresh(key, time.time_ns(), response)
+        self.assertIsNone(cache.get(key))
+
+    def test_background_request_drops_credentials(self):
+        request = self.anonymous.get(
+            self.url, HTTP_AUTHORIZATION='Token x',
+            HTTP_IF_NONE_MATCH='"x"').wsgi_request
+        fresh = background_request(request)
+        self.assertEqual(fresh.get_full_path(), request.get_full_path())
+        self.assertNotIn('HTTP_AUTHORIZATION', fresh.META)
+        self.assertNotIn('HTTP_IF_NONE_MATCH', fresh.META)
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False,
+                   RESPONSE_CACHE_TIMEOUT=60, RESPONSE_CACHE_HARD_TIMEOUT=600,
+                   RESPONSE_CACHE_STALE_IF_ERROR=600,
+                   RESPONSE_CACHE_LOCK_WAIT=0.1)
+class StaleWhileRevalidateTest(TestCase):
+    url = '/api/recipes/'
+
+    def setUp(self):
+        cache.clear()
+        make_recipe(make_user('author'))
+        self.client = APIClient()
+        self.key = response_key(self.client.get(self.url).wsgi_request)
+        patcher = mock.patch.object(response_cache, 'refresh_in_background')
+        self.refresh = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def age_entry(self, seconds):
+        entry = cache.get(self.key)
+        entry['stored_at'] -= seconds
+        cache.set(self.key, entry)
+        return entry
+
+    def test_stale_entry_is_served_and_refreshed_once(self):
+        entry = self.age_entry(120)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+            self.client.get(self.url)
+        self.assertEqual(response.content, entry['content'])
+        self.refresh.assert_called_once()
+        key, version, render = self.refresh.call_args.args
+        self.assertEqual(key, self.key)
+        finish_refresh(key, version, render())
+        self.assertGreater(cache.get(self.key)['stored_at'],
+                           entry['stored_at'])
+
+    def test_conditional_request_does_not_refresh(self):
+        etag = self.age_entry(120)['headers']['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.refresh.assert_not_called()
+
+    def test_expired_entry_is_computed(self):
+        entry = self.age_entry(600)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.refresh.assert_not_called()
+        self.assertGreater(cache.get(self.key)['stored_at'],
+                           entry['stored_at'])
+        self.assertIsNone(cache.get(lock_key(self.key)))
+
+    def test_old_entry_is_served_only_on_database_error(self):
+        entry = cache.get(self.key)
+        bump_version()
+        with mock.patch('api.views.render_recipes',
+                        side_effect=OperationalError):
+            response = self.client.get(self.url)
+            self.assertEqual(response.content, entry['content'])
+            cache.clear()
+            with self.assertRaises(OperationalError):
+                self.client.get(self.url)
+        self.assertIsNone(cache.get(lock_key(self.key)))
+
+    def test_request_without_lock_waits_then_computes(self):
+        cache.delete(self.key)
+        acquire(self.key)
+        started = time.monotonic()
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+        self.assertIsNotNone(cache.get(self.key))
+        self.assertTrue(cache.get(lock_key(self.key)))
@@ -0,0 +1,67 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api.shopping_list import aggregate, render
+from recipes.models import ShoppingCart
+from tests.utils import LOCMEM, make_ingredient, make_recipe, make_user
+
+
+class AggregateTest(SimpleTestCase):
+
+    def test_volume_alone_keeps_its_unit(self):
+        self.assertEqual(aggregate([('молоко', 'мл', 300)]),
+                         [('молоко', 'мл', '300')])
+
+    def test_volume_is_converted_to_mass_of_same_product(self):
+        self.assertEqual(
+            aggregate([('молоко', 'мл', 300), ('молоко', 'г', 100)]),
+            [('молоко', 'г', '409')])
+
+    def test_units_of_one_dimension_are_summed(self):
+        self.assertEqual(
+            aggregate([('мука', 'г', 700), ('мука', 'кг', 0.5),
+                       ('вода', 'стакан', 1), ('вода', 'мл', 50)]),
+            [('вода', 'мл', '300'), ('мука', 'кг', '1.2')])
+
+    def test_incompatible_units_stay_separate(self):
+        self.assertEqual(
+            aggregate([('лук', 'пучок', 1), ('лук', 'шт.', 2),
+                       ('лук', 'пучок', 2), ('соль', 'по вкусу', 1)]),
+            [('лук', 'шт.', '2'), ('лук', 'пучок', '3'),
+             ('соль', 'по вкусу', None)])
+
+    def test_empty_cart(self):
+        self.assertEqual(aggregate([]), [])
+
+    def test_render(self):
+        self.assertEqual(
+            render([('мука', 'г', '700'), ('соль', 'по вкусу', None)]),
+            'мука (г) - 700\nсоль (по вкусу)')
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class DownloadShoppingCartTest(TestCase):
+    url = '/api/recipes/download_shopping_cart/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('cook')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_sums_recipes_in_cart(self):
+        milk = make_ingredient('Молоко', 'мл')
+        flour = make_ingredient('Мука', 'г')
+        for amount in (200, 100):
+            recipe = make_recipe(
+                self.user, ingredients=[(milk, amount), (flour, 600)])
+            ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertEqual(response.content.decode(),
+                         'Молоко (мл) - 300\nМука (кг) - 1.2')
+
+    def test_requires_authentication(self):
+        self.assertEqual(APIClient().get(self.url).status_code, 401)
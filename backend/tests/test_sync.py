@@ -0,0 +1,114 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from api.deletion import schedule_deletion
+from api.sync import make_token
+from recipes.models import Favorite, ShoppingCart, Subscription, SyncTombstone
+from tests.utils import LOCMEM, make_recipe, make_user
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False,
+                   SYNC_TOMBSTONE_TTL=3600)
+class SyncTest(TestCase):
+    url = '/api/sync/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('reader')
+        self.author = make_user('author')
+        self.soup = make_recipe(self.author)
+        self.pie = make_recipe(self.author, name='Пирог')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        Favorite.objects.create(user=self.user, recipe=self.soup)
+        ShoppingCart.objects.create(user=self.user, recipe=self.pie)
+        Subscription.objects.create(user=self.user, author=self.author)
+        self.age_rows(timedelta(hours=1))
+
+    def age_rows(self, delta):
+        for model in (Favorite, ShoppingCart, Subscription):
+            for row in model.objects.all():
+                model.objects.filter(pk=row.pk).update(
+                    created_at=row.created_at - delta)
+        for row in SyncTombstone.objects.all():
+            SyncTombstone.objects.filter(pk=row.pk).update(
+                changed_at=row.changed_at - delta)
+
+    def sync(self, token=None):
+        response = self.client.get(
+            self.url, {'token': token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def ids(self, data, key):
+        return [item['id'] for item in data[key]['added']]
+
+    def test_full_state(self):
+        data = self.sync()
+        self.assertTrue(data['reset'])
+        self.assertEqual(self.ids(data, 'favorites'), [self.soup.pk])
+        self.assertEqual(self.ids(data, 'shopping_cart'), [self.pie.pk])
+        self.assertEqual(data['subscriptions']['added'][0]['username'],
+                         'author')
+        self.assertEqual(data['favorites']['removed'], [])
+
+    def test_changes_after_token(self):
+        token = self.sync()['token']
+        Favorite.objects.filter(user=self.user).delete()
+        Favorite.objects.create(user=self.user, recipe=self.pie)
+        Subscription.objects.filter(user=self.user).delete()
+        data = self.sync(token)
+        self.assertFalse(data['reset'])
+        self.assertEqual(self.ids(data, 'favorites'), [self.pie.pk])
+        self.assertEqual(data['favorites']['removed'], [self.soup.pk])
+        self.assertEqual(self.ids(data, 'shopping_cart'), [])
+        self.assertEqual(data['subscriptions']['removed'], [self.author.pk])
+
+    def test_re_added_item_is_not_removed(self):
+        token = self.sync()['token']
+        Favorite.objects.filter(user=self.user).delete()
+        Favorite.objects.create(user=self.user, recipe=self.soup)
+        data = self.sync(token)
+        self.assertEqual(self.ids(data, 'favorites'), [self.soup.pk])
+        self.assertEqual(data['favorites']['removed'], [])
+
+    def test_hidden_recipe_and_author_are_removed(self):
+        token = self.sync()['token']
+        schedule_deletion(self.author)
+        data = self.sync(token)
+        self.assertEqual(data['favorites']['removed'], [self.soup.pk])
+        self.assertEqual(data['shopping_cart']['removed'], [self.pie.pk])
+        self.assertEqual(data['subscriptions']['removed'], [self.author.pk])
+        self.assertEqual(self.ids(self.sync(), 'favorites'), [])
+
+    def test_old_token_resets(self):
+        token = make_token(self.user, timezone.now() - timedelta(hours=2))
+        data = self.sync(token)
+        self.assertTrue(data['reset'])
+        self.assertEqual(self.ids(data, 'favorites'), [self.soup.pk])
+
+    def test_invalid_token(self):
+        other = make_token(make_user('other'), timezone.now())
+        for token in ('garbage', other):
+            with self.subTest(token=token):
+                response = self.client.get(self.url, {'token': token})
+                self.assertEqual(response.status_code, 400)
+
+    def test_requires_authentication(self):
+        self.assertEqual(APIClient().get(self.url).status_code, 401)
+
+    def test_prune_expired_tombstones(self):
+        Favorite.objects.filter(user=self.user).delete()
+        self.age_rows(timedelta(hours=2))
+        ShoppingCart.objects.filter(user=self.user).delete()
+        stdout = StringIO()
+        call_command('prune_sync_tombstones', stdout=stdout)
+        self.assertEqual(
+            list(SyncTombstone.objects.values_list('kind', flat=True)),
+            [SyncTombstone.SHOPPING_CART])
@@ -0,0 +1,113 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api import tasks
+from recipes.models import Task
+
+CALLS = []
+
+
+@tasks.task
+def remember(value):
+    CALLS.append(value)
+    return value * 2
+
+
+@tasks.task(max_attempts=2)
+def explode():
+    raise ValueError('boom')
+
+
+@override_settings(TASKS_EAGER=False, TASKS_TIMEOUT=600,
+                   TASKS_MAX_ATTEMPTS=3, TASKS_RETRY_BACKOFF=10)
+class TaskQueueTest(TestCase):
+
+    def setUp(self):
+        CALLS.clear()
+
+    def expire(self, task):
+        """Делает задание брошенным: начато раньше TASKS_TIMEOUT."""
+        Task.objects.filter(pk=task.pk).update(
+            started_at=timezone.now() - timedelta(seconds=601))
+
+    def test_delay_and_run(self):
+        queued = remember.delay(21)
+        self.assertEqual((queued.status, queued.attempts), (Task.QUEUED, 0))
+        self.assertEqual(queued.max_attempts, 3)
+        [task] = tasks.claim()
+        self.assertEqual((task.status, task.attempts), (Task.RUNNING, 1))
+        self.assertEqual(tasks.claim(), [])
+        self.assertTrue(tasks.execute(task))
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.result), (Task.DONE, 42))
+        self.assertEqual(CALLS, [21])
+
+    def test_future_task_is_not_claimed(self):
+        task = remember.delay(1)
+        Task.objects.filter(pk=task.pk).update(
+            run_at=timezone.now() + timedelta(hours=1))
+        self.assertEqual(tasks.claim(), [])
+
+    def test_failure_is_retried_then_failed(self):
+        explode.delay()
+        [task] = tasks.claim()
+        self.assertFalse(tasks.execute(task))
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.QUEUED)
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertIn('ValueError: boom', task.error)
+
+        Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+        [task] = tasks.claim()
+        self.assertEqual(task.attempts, 2)
+        self.assertFalse(tasks.execute(task))
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertIsNotNone(task.finished_at)
+
+    def test_abandoned_task_is_reclaimed_until_max_attempts(self):
+        task = explode.delay()
+        for attempt in (1, 2):
+            [task] = tasks.claim()
+            self.assertEqual(task.attempts, attempt)
+            self.expire(task)
+        self.assertEqual(tasks.claim(), [])
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+
+    def test_stale_worker_cannot_overwrite_new_attempt(self):
+        remember.delay(1)
+        [stale] = tasks.claim()
+        self.expire(stale)
+        [current] = tasks.claim()
+        self.assertEqual(current.attempts, 2)
+
+        with self.assertLogs('api.tasks', 'WARNING'):
+            tasks.execute(stale)
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.RUNNING, 2))
+
+        tasks.execute(current)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.DONE)
+
+    def test_stale_worker_cannot_revive_failed_task(self):
+        explode.delay()
+        for _ in range(2):
+            [stale] = tasks.claim()
+            self.expire(stale)
+        tasks.claim()
+        with self.assertLogs('api.tasks', 'WARNING'):
+            tasks.execute(stale)
+        self.assertEqual(Task.objects.get().status, Task.FAILED)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager_runs_inline_and_raises(self):
+        task = remember.delay(5)
+        self.assertEqual((task.status, task.result), (Task.DONE, 10))
+        with self.assertRaises(ValueError):
+            explode.delay()
+        self.assertEqual(
+            Task.objects.get(name=explode.name).status, Task.FAILED)
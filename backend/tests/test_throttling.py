@@ -0,0 +1,79 @@
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api import async_views
+from api.throttling import STORAGES, MemoryBuckets
+from tests.utils import LOCMEM, make_user
+
+BUCKETS = {'anon': (2, 0.001), 'user': (5, 0.001)}
+REST_FRAMEWORK = {**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=True,
+                   THROTTLE_STORAGE='memory', THROTTLE_BUCKETS=BUCKETS)
+class ThrottleTest(TestCase):
+    url = '/api/ingredients/'
+
+    def setUp(self):
+        cache.clear()
+        STORAGES['memory'].buckets.clear()
+        self.client = APIClient()
+
+    def get(self, forwarded_for):
+        return self.client.get(self.url, HTTP_X_FORWARDED_FOR=forwarded_for)
+
+    def test_bucket_runs_out(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+    @override_settings(REST_FRAMEWORK=REST_FRAMEWORK)
+    def test_clients_behind_proxy_get_own_buckets(self):
+        for _ in range(2):
+            self.assertEqual(self.get('10.0.0.1').status_code, 200)
+        self.assertEqual(self.get('10.0.0.1').status_code, 429)
+        self.assertEqual(self.get('10.0.0.2').status_code, 200)
+
+    @override_settings(REST_FRAMEWORK=REST_FRAMEWORK)
+    def test_forged_forwarded_for_does_not_reset_bucket(self):
+        # nginx дописывает реальный адрес в конец заголовка клиента.
+        statuses = [
+            self.get(f'192.168.0.{number}, 10.0.0.1').status_code
+            for number in range(3)
+        ]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    def test_async_view_throttles_token_user_as_user(self):
+        user = make_user('reader')
+        token = Token.objects.create(user=user)
+        request = RequestFactory().get(
+            self.url, HTTP_AUTHORIZATION=f'Token {token.key}')
+        async_to_sync(async_views.ingredient_list)(request)
+        self.assertEqual(request.rate_limit[0], BUCKETS['user'][0])
+        self.assertIn(f'user:{user.pk}', STORAGES['memory'].buckets)
+
+
+class MemoryBucketsTest(TestCase):
+
+    def test_prunes_at_most_once_per_interval(self):
+        buckets = MemoryBuckets(max_keys=2, prune_interval=60)
+        with mock.patch.object(
+                buckets, 'prune', wraps=buckets.prune) as prune:
+            for number in range(10):
+                buckets.take(f'anon:{number}', 1, 10, 0.001)
+        self.assertEqual(prune.call_count, 1)
+        self.assertEqual(len(buckets.buckets), 10)
+
+    def test_prune_drops_full_buckets(self):
+        buckets = MemoryBuckets(max_keys=1, prune_interval=0)
+        buckets.take('anon:1', 0, 10, 1)
+        buckets.take('anon:2', 1, 10, 1)
+        self.assertEqual(list(buckets.buckets), ['anon:2'])
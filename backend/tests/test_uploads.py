@@ -0,0 +1,194 @@
+import io
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from PIL import Image
+from rest_framework.test import APIClient
+
+from api import uploads
+from recipes.models import Recipe, Upload
+from tests.utils import LOCMEM, make_ingredient, make_tag, make_user
+
+
+def png(size=(64, 64)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class UploadTestCase(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        overrides = override_settings(
+            CACHES=LOCMEM, THROTTLE_ENABLED=False,
+            UPLOAD_TEMP_DIR=os.path.join(self.temp_dir, 'uploads'),
+            MEDIA_ROOT=os.path.join(self.temp_dir, 'media'),
+            UPLOAD_MAX_SIZE=100_000, UPLOAD_MAX_OPEN=2,
+            UPLOAD_MAX_USER_BYTES=150_000)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = make_user('cook')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, body, size=None):
+        headers = {} if size is None else {'HTTP_UPLOAD_LENGTH': str(size)}
+        return self.client.generic(
+            'POST', '/api/uploads/', body, content_type='image/png',
+            **headers)
+
+    def send(self, token, body, start, size):
+        end = start + len(body) - 1
+        return self.client.generic(
+            'PATCH', f'/api/uploads/{token}/', body,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{end}/{size}')
+
+    def files(self):
+        return sorted(os.listdir(settings.UPLOAD_TEMP_DIR))
+
+
+class ResumableUploadTest(UploadTestCase):
+
+    def test_single_request(self):
+        response = self.start(png())
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()['completed'])
+        self.assertEqual(Upload.objects.get().extension, 'png')
+
+    def test_multipart(self):
+        file = io.BytesIO(png())
+        file.name = 'photo.png'
+        response = self.client.post(
+            '/api/uploads/', {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(response.json()['completed'])
+
+    def test_parts_are_joined_in_order(self):
+        content = png()
+        size, middle = len(content), len(content) // 2
+        token = self.start(content[:middle], size).json()['token']
+        status = self.client.get(f'/api/uploads/{token}/').json()
+        self.assertEqual((status['offset'], status['completed']),
+                         (middle, False))
+
+        response = self.send(token, content[middle:], middle, size)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['completed'])
+        upload = Upload.objects.get()
+        self.assertEqual(self.files(), [str(upload.token)])
+        with open(uploads.path(upload), 'rb') as file:
+            self.assertEqual(file.read(), content)
+
+    def test_wrong_offset_is_conflict(self):
+        content = png()
+        token = self.start(content[:10], len(content)).json()['token']
+        response = self.send(token, content[20:], 20, len(content))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Upload.objects.get().received, 10)
+
+    def test_stale_part_is_rejected_after_streaming(self):
+        content = png()
+        upload = uploads.create(self.user, len(content))
+        uploads.append(upload, io.BytesIO(content[:10]), 0, 10)
+        with self.assertRaises(uploads.UploadConflict):
+            uploads.append(upload, io.BytesIO(content[:10]), 0, 10)
+        upload.refresh_from_db()
+        self.assertEqual(upload.received, 10)
+        self.assertEqual(len(self.files()), 2)
+
+    def test_bad_content_range(self):
+        token = self.start(b'', 100).json()['token']
+        response = self.client.generic(
+            'PATCH', f'/api/uploads/{token}/', b'x' * 10,
+            HTTP_CONTENT_RANGE='bytes 0-9/200')
+        self.assertEqual(response.status_code, 400)
+
+    def test_not_an_image_is_discarded(self):
+        response = self.start(b'not an image')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Upload.objects.exists())
+        self.assertEqual(self.files(), [])
+
+    def test_other_users_upload_is_not_found(self):
+        token = self.start(b'', 100).json()['token']
+        other = APIClient()
+        other.force_authenticate(make_user('other'))
+        self.assertEqual(
+            other.get(f'/api/uploads/{token}/').status_code, 404)
+
+
+class UploadLimitsTest(UploadTestCase):
+
+    def test_file_too_large(self):
+        self.assertEqual(self.start(b'', 100_001).status_code, 413)
+
+    def test_part_beyond_declared_size(self):
+        token = self.start(b'', 10).json()['token']
+        self.assertEqual(self.send(token, b'x' * 20, 0, 10).status_code, 413)
+        self.assertEqual(Upload.objects.get().received, 0)
+
+    def test_open_uploads_per_user(self):
+        for _ in range(2):
+            self.assertEqual(self.start(b'', 100).status_code, 201)
+        self.assertEqual(self.start(b'', 100).status_code, 429)
+        other = APIClient()
+        other.force_authenticate(make_user('other'))
+        self.assertEqual(
+            other.generic('POST', '/api/uploads/', b'',
+                          content_type='image/png',
+                          HTTP_UPLOAD_LENGTH='100').status_code, 201)
+
+    def test_total_bytes_per_user(self):
+        self.assertEqual(self.start(b'', 100_000).status_code, 201)
+        self.assertEqual(self.start(b'', 60_000).status_code, 413)
+        self.assertEqual(self.start(b'', 50_000).status_code, 201)
+
+
+class UploadTokenTest(UploadTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.salt = make_ingredient('Соль')
+        self.tag = make_tag('Обед', 'lunch')
+
+    def payload(self, **kwargs):
+        return {
+            'ingredients': [{'id': self.salt.pk, 'amount': 5}],
+            'tags': [self.tag.pk],
+            'name': 'Суп', 'text': 'Сварить', 'cooking_time': 10,
+            **kwargs,
+        }
+
+    def test_token_is_used_once(self):
+        token = self.start(png()).json()['token']
+        response = self.client.post(
+            '/api/recipes/', self.payload(image=token), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Recipe.objects.get().image.name.endswith('.png'))
+        self.assertFalse(Upload.objects.exists())
+        self.assertEqual(self.files(), [])
+
+    def test_token_survives_validation_error(self):
+        token = self.start(png()).json()['token']
+        response = self.client.post(
+            '/api/recipes/', self.payload(image=token, cooking_time=0),
+            format='json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            '/api/recipes/', self.payload(image=token), format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_unfinished_or_foreign_token_is_rejected(self):
+        token = self.start(b'', 100).json()['token']
+        response = self.client.post(
+            '/api/recipes/', self.payload(image=token), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('image', response.json())
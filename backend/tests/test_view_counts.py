@@ -0,0 +1,82 @@
+import os
+import random
+
+from django.core.cache import cache
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings
+)
+from rest_framework.test import APIClient
+
+from api import view_counts
+from api.view_counts import HyperLogLog, ViewCounter
+from tests.utils import LOCMEM, make_recipe, make_user
+
+
+class HyperLogLogTest(SimpleTestCase):
+
+    def test_small_sets_are_exact(self):
+        sketch = HyperLogLog()
+        for value in [1, 2, 3, 2, 1]:
+            sketch.add(value << 20)
+        self.assertEqual(sketch.count(), 3)
+
+    def test_large_sets_are_estimated(self):
+        sketch = HyperLogLog()
+        generator = random.Random(1)
+        values = [generator.getrandbits(64) for _ in range(20000)]
+        for value in values + values[:5000]:
+            sketch.add(value)
+        self.assertAlmostEqual(sketch.count(), 20000, delta=20000 * 0.06)
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False)
+class ViewCounterTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.recipe = make_recipe(make_user('author'))
+        self.counter = ViewCounter()
+        # Поток записи не запускается: flush вызывается вручную.
+        self.counter.pid = os.getpid()
+        self.factory = RequestFactory()
+
+    def visit(self, address, agent='test'):
+        self.counter.record(self.recipe.pk, self.factory.get(
+            '/', REMOTE_ADDR=address, HTTP_USER_AGENT=agent))
+
+    def test_repeated_visits_count_once(self):
+        for address in ['10.0.0.1', '10.0.0.1', '10.0.0.2']:
+            self.visit(address)
+        self.counter.flush()
+        self.visit('10.0.0.2')
+        self.visit('10.0.0.3')
+        self.counter.flush()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.views, 3)
+
+    def test_flush_without_views_does_not_query(self):
+        with self.assertNumQueries(0):
+            self.counter.flush()
+
+    def test_flush_in_other_process_is_noop(self):
+        self.visit('10.0.0.1')
+        self.counter.pid = None
+        with self.assertNumQueries(0):
+            self.counter.flush()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.views, 0)
+
+    def test_only_successful_responses_are_counted(self):
+        client = APIClient()
+        recorded = []
+        view_counts.counter, original = self.counter, view_counts.counter
+        self.counter.record = lambda pk, request: recorded.append(pk)
+        try:
+            client.get(f'/api/recipes/{self.recipe.pk}/')
+            client.get('/api/recipes/999999/')
+        finally:
+            view_counts.counter = original
+        self.assertEqual(recorded, [self.recipe.pk])
@@ -0,0 +1,70 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from api import warmup
+from api.cache import short_link_key
+from recipes.models import RecipeScore
+from tests.utils import LOCMEM, make_recipe, make_user
+
+
+@override_settings(CACHES=LOCMEM, THROTTLE_ENABLED=False,
+                   WARMUP_ENABLED=True, ALLOWED_HOSTS=['testserver'],
+                   WARMUP_URLS=['/api/tags/', '/api/recipes/'])
+class WarmUpTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        for name, value in (('_ready', False), ('connections', mock.Mock())):
+            patcher = mock.patch.object(warmup, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.author = make_user('author')
+        self.recipe = make_recipe(self.author)
+
+    def readiness(self):
+        return self.client.get('/health/ready/').status_code
+
+    def test_not_ready_until_warmed_up(self):
+        self.assertEqual(self.readiness(), 503)
+        warmup.warm_up()
+        self.assertEqual(self.readiness(), 200)
+
+    @override_settings(WARMUP_ENABLED=False)
+    def test_ready_without_warmup(self):
+        self.assertEqual(self.readiness(), 200)
+
+    def test_responses_are_cached_for_traffic(self):
+        warmup.warm_up()
+        with self.assertNumQueries(0):
+            response = APIClient().get('/api/recipes/')
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_failed_warmup_still_becomes_ready(self):
+        with mock.patch.object(warmup, 'warm_urls',
+                               side_effect=RuntimeError), \
+                self.assertLogs('api.warmup', 'ERROR'):
+            warmup.warm_up()
+        self.assertEqual(self.readiness(), 200)
+
+    def test_error_response_is_logged(self):
+        with self.assertLogs('api.warmup', 'WARNING') as logs:
+            warmup.warm_urls(['/api/recipes/999/'])
+        self.assertIn('404', logs.output[0])
+
+    def test_popular_short_links_are_primed(self):
+        popular = make_recipe(self.author, name='Каша')
+        RecipeScore.objects.create(recipe=popular, popular=5)
+        make_recipe(self.author, name='Скрытый', is_hidden=True)
+        warmup.prime_short_links(1)
+        self.assertEqual(cache.get(short_link_key(popular.short_link)),
+                         popular.pk)
+        self.assertIsNone(cache.get(short_link_key(self.recipe.short_link)))
+
+    @override_settings(ALLOWED_HOSTS=['.example.com', '*', 'food.example'])
+    def test_warm_host_skips_wildcards(self):
+        self.assertEqual(warmup.warm_host(), 'food.example')
+        with self.settings(ALLOWED_HOSTS=['*']):
+            self.assertEqual(warmup.warm_host(), 'localhost')
@@ -0,0 +1,31 @@
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag, User
+
+LOCMEM = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_user(username, **kwargs):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='x',
+        **kwargs)
+
+
+def make_recipe(author, name='Суп', ingredients=(), tags=(), **kwargs):
+    """Рецепт с ингредиентами [(ингредиент, количество)] и тегами."""
+    recipe = Recipe.objects.create(
+        author=author, name=name, text=kwargs.pop('text', 'Сварить'),
+        cooking_time=kwargs.pop('cooking_time', 10),
+        image='recipes/soup.png', **kwargs)
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in ingredients)
+    recipe.tags.set(tags)
+    return recipe
+
+
+def make_ingredient(name, unit='г'):
+    return Ingredient.objects.create(name=name, measurement_unit=unit)
+
+
+def make_tag(name, slug):
+    return Tag.objects.create(name=name, slug=slug)